@@ -0,0 +1,138 @@
+"""Banco de rendimiento del flujo completo sobre un inventario sintético.
+
+Mide tiempo de pared y memoria máxima (``tracemalloc``) de cada fase:
+recopilación equivalente a ``main()``, ``_build_report_data``,
+``build_text_summary``, creación del gráfico y el renderizado de cada
+plantilla. Cada resultado se añade como una línea JSON junto al commit actual
+para poder comparar ejecuciones::
+
+    python benchmarks/bench_pipeline.py --hosts 10 100 1000 --output bench.jsonl
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import svg_charts  # noqa: E402
+from synthetic_inventory import generate_inventory, use_synthetic_vim  # noqa: E402
+
+TEMPLATES = [
+    'template.html',
+    'template_a.html',
+    'template_a_detailed.html',
+    'template_full.html',
+    'template_full_es.html',
+]
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+
+def _measure(func):
+    """Run ``func`` returning ``(result, seconds, peak_kb)``."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024
+
+
+def run(hosts, vms_per_host, datastores, perf_samples, latency):
+    """Ejecuta todas las fases para un tamaño de inventario."""
+    inventory = generate_inventory(
+        hosts=hosts, vms_per_host=vms_per_host,
+        datastores_per_cluster=datastores, perf_samples=perf_samples,
+        latency=latency,
+    )
+    results = []
+
+    def record(phase, seconds, peak_kb):
+        results.append({
+            'phase': phase,
+            'seconds': round(seconds, 4),
+            'peak_kb': round(peak_kb, 1),
+        })
+
+    with use_synthetic_vim(), tempfile.TemporaryDirectory() as out_dir:
+        checker = inventory.checker()
+        (hosts_data, all_vms, summary), secs, peak = _measure(checker.collect)
+        record('collect', secs, peak)
+
+        _, secs, peak = _measure(lambda: checker._build_report_data(hosts_data, all_vms, chart=None))
+        record('build_report_data', secs, peak)
+
+        _, secs, peak = _measure(lambda: checker.build_text_summary(hosts_data, summary))
+        record('build_text_summary', secs, peak)
+
+        svg_charts.cache.clear()
+        charts, secs, peak = _measure(lambda: checker._create_chart_svg(hosts_data))
+        record('create_chart', secs, peak)
+
+        original_chart = checker._create_chart_svg
+        checker._create_chart_svg = lambda data: charts
+        try:
+            for template in TEMPLATES:
+                output = os.path.join(out_dir, template)
+                _, secs, peak = _measure(lambda: checker.generate_report(
+                    hosts_data, all_vms, output, template_file=template
+                ))
+                record(f'render:{template}', secs, peak)
+        finally:
+            checker._create_chart_svg = original_chart
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the health check pipeline')
+    parser.add_argument('--hosts', type=int, nargs='+', default=[10, 100, 1000],
+                        help='inventory sizes (number of hosts) to benchmark')
+    parser.add_argument('--vms-per-host', type=int, default=20)
+    parser.add_argument('--datastores', type=int, default=4,
+                        help='datastores per cluster')
+    parser.add_argument('--perf-samples', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='latency injected in every synthetic vCenter call')
+    parser.add_argument('--output', help='append JSON lines with the results to this file')
+    args = parser.parse_args()
+
+    # Keep the AI sections out of the measurements
+    os.environ.pop('OPENAI_API_KEY', None)
+    os.environ['OPENAI_CONFIG_FILE'] = os.path.join(ROOT, 'benchmarks', 'no-openai-config.json')
+
+    commit = _commit()
+    for hosts in args.hosts:
+        for row in run(hosts, args.vms_per_host, args.datastores,
+                       args.perf_samples, args.latency_ms / 1000):
+            row.update({
+                'commit': commit,
+                'hosts': hosts,
+                'vms_per_host': args.vms_per_host,
+                'latency_ms': args.latency_ms,
+            })
+            line = json.dumps(row)
+            print(line)
+            if args.output:
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Banco del transporte SOAP contra un endpoint local.
+
+Levanta un servidor HTTP en un hilo que responde a cada POST con un
+``RetrievePropertiesExResponse`` sintético del tamaño de un inventario grande
+(con el ancho de banda opcionalmente limitado a ``--mbps``) y mide, para cada
+combinación de compresión (gzip/identity) y conexión (keep-alive/una conexión
+por llamada), los bytes transferidos y el tiempo total de ``--calls``
+peticiones. Los resultados se añaden como líneas JSON
+junto al commit actual::
+
+    python benchmarks/bench_transport.py --vms 20000 --calls 20 --output bench.jsonl
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from transport import TransportConfig  # noqa: E402
+
+_OBJECT = (
+    '<returnval><obj type="VirtualMachine">vm-{i}</obj>'
+    '<propSet><name>name</name><val xsi:type="xsd:string">vm-{i:05d}</val></propSet>'
+    '<propSet><name>runtime.powerState</name>'
+    '<val xsi:type="VirtualMachinePowerState">poweredOn</val></propSet>'
+    '<propSet><name>summary.quickStats.overallCpuUsage</name>'
+    '<val xsi:type="xsd:int">{cpu}</val></propSet>'
+    '<propSet><name>summary.quickStats.guestMemoryUsage</name>'
+    '<val xsi:type="xsd:int">{mem}</val></propSet>'
+    '<propSet><name>guest.toolsRunningStatus</name>'
+    '<val xsi:type="xsd:string">guestToolsRunning</val></propSet>'
+    '</returnval>'
+)
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+
+def retrieve_properties_response(vms):
+    """Cuerpo SOAP de un ``RetrievePropertiesEx`` con ``vms`` máquinas."""
+    objects = ''.join(
+        _OBJECT.format(i=i, cpu=(i * 37) % 4000, mem=(i * 53) % 16384) for i in range(vms)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        '<soapenv:Body><RetrievePropertiesExResponse xmlns="urn:vim25"><returnval>'
+        f'{objects}</returnval></RetrievePropertiesExResponse></soapenv:Body>'
+        '</soapenv:Envelope>'
+    ).encode('utf-8')
+
+
+def start_server(body, mbps=0.0):
+    """Arranca el endpoint falso y devuelve ``(server, port)``.
+
+    ``mbps`` limita el ancho de banda de las respuestas para simular la red
+    hasta vCenter (0: sin límite).
+    """
+    compressed = gzip.compress(body, compresslevel=6)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            gzipped = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+            payload = compressed if gzipped else body
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/xml; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            if gzipped:
+                self.send_header('Content-Encoding', 'gzip')
+            self.end_headers()
+            if not mbps:
+                self.wfile.write(payload)
+                return
+            chunk = 64 * 1024
+            for i in range(0, len(payload), chunk):
+                self.wfile.write(payload[i:i + chunk])
+                time.sleep(len(payload[i:i + chunk]) * 8 / (mbps * 1e6))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def run(port, calls, compression, keep_alive):
+    """Ejecuta ``calls`` peticiones y devuelve bytes recibidos y tiempos."""
+    config = TransportConfig(compression=compression)
+    headers = dict(config.headers(), **{'Content-Type': 'text/xml'})
+    request = b'<RetrievePropertiesEx/>'
+    received = 0
+    connections = 0
+    conn = None
+    start = time.perf_counter()
+    for _ in range(calls):
+        if conn is None or not keep_alive:
+            if conn is not None:
+                conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            connections += 1
+        conn.request('POST', '/sdk', body=request, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        received += len(data)
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+    conn.close()
+    elapsed = time.perf_counter() - start
+    return {
+        'compression': 'gzip' if compression else 'identity',
+        'keep_alive': keep_alive,
+        'calls': calls,
+        'connections': connections,
+        'bytes': received,
+        'bytes_per_call': received // calls,
+        'seconds': round(elapsed, 4),
+        'ms_per_call': round(elapsed * 1000 / calls, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SOAP transport options')
+    parser.add_argument('--vms', type=int, default=20000,
+                        help='virtual machines in each synthetic response')
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--mbps', type=float, default=0.0,
+                        help='bandwidth of the simulated link (0: unlimited loopback)')
+    parser.add_argument('--output', help='append JSON lines with the results to this file')
+    args = parser.parse_args()
+
+    body = retrieve_properties_response(args.vms)
+    server, port = start_server(body, args.mbps)
+    commit = _commit()
+    try:
+        for compression in (False, True):
+            for keep_alive in (False, True):
+                row = run(port, args.calls, compression, keep_alive)
+                row.update({'commit': commit, 'vms': args.vms, 'mbps': args.mbps,
+                            'uncompressed_bytes': len(body)})
+                line = json.dumps(row)
+                print(line)
+                if args.output:
+                    with open(args.output, 'a', encoding='utf-8') as f:
+                        f.write(line + '\n')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Plan de recopilación derivado de las plantillas del informe.
+
+Algunas comprobaciones leen propiedades de vSphere que solo aparecen en
+ciertas plantillas: las NIC físicas (``config.network.pnic``), el firmware
+(``hardware.biosInfo``/``hardware.systemInfo``), el modelo de CPU o el estado de
+IPv6. :func:`plan_for_templates` analiza el código de las plantillas que se
+van a renderizar y obtiene qué campos del registro de cada host usan:
+
+* referencias directas como ``host.best_practice.firmware``;
+* bucles ``host.performance.items()``, teniendo en cuenta los filtros
+  ``if k in [...]`` / ``if k not in [...]``;
+* variables de contexto calculadas a partir de esos campos
+  (``networks_count`` cuenta las NIC, ``indicators`` incluye IPv6) y las
+  secciones de IA que los reciben.
+
+Los campos opcionales que ninguna plantilla usa no se recopilan y las
+comprobaciones se ahorran la lectura de las propiedades correspondientes.
+:meth:`CollectionPlan.summary` informa de las propiedades omitidas y de las
+idas y vueltas a vCenter ahorradas. Un campo omitido no aparece en el registro
+del host y los indicadores lo muestran como desconocido (``Unknown``), nunca
+como un valor sano.
+"""
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# record field -> vSphere property paths it is built from
+OPTIONAL_FIELDS = {
+    'performance.network': ('config.network.pnic',),
+    'performance.firmware': ('hardware.biosInfo', 'hardware.systemInfo'),
+    'best_practice.cpu_model': ('hardware.cpuPkg',),
+    'best_practice.memory_total_gb': ('hardware.memorySize',),
+    'best_practice.network': ('config.network.pnic',),
+    'best_practice.firmware': ('hardware.biosInfo', 'hardware.systemInfo'),
+    'security.ipv6_enabled': ('config.network.ipv6Enabled',),
+}
+
+# template variables derived from optional fields (see ``_build_report_data``
+# and ``report_pipeline.AI_SECTIONS``); the whole-report AI sections send every
+# host record to the model
+VARIABLE_FIELDS = {
+    'networks_count': ('best_practice.network',),
+    'indicators': ('security.ipv6_enabled',),
+    'security_text': ('security.ipv6_enabled',),
+    **{name: tuple(OPTIONAL_FIELDS)
+       for name in ('executive_summary', 'recommendations', 'conclusions', 'glossary')},
+}
+
+# fields behind the key indicators of ``build_text_summary``, the text sent to
+# the model for ``--detailed-report``
+DETAILED_REPORT_FIELDS = VARIABLE_FIELDS['indicators']
+
+_GROUPS = ('security', 'performance', 'best_practice')
+_ATTR_RE = re.compile(r'\b(%s)\.(\w+)' % '|'.join(_GROUPS))
+_ITEMS_RE = re.compile(
+    r'\b(%s)\.items\(\)(?:\s+if\s+\w+\s+(not\s+)?in\s+[\[(]([^\])]*)[\])])?' % '|'.join(_GROUPS)
+)
+_WORD_RE = re.compile(r'\w+')
+
+
+def used_fields(source):
+    """Campos opcionales que usa el código de una plantilla."""
+    used = set()
+    for group, key in _ATTR_RE.findall(source):
+        if key != 'items':
+            used.add(f'{group}.{key}')
+    for group, negated, listed in _ITEMS_RE.findall(source):
+        keys = set(_WORD_RE.findall(listed))
+        for field in OPTIONAL_FIELDS:
+            field_group, key = field.split('.', 1)
+            if field_group != group:
+                continue
+            if not listed or (key in keys) != bool(negated):
+                used.add(field)
+    for variable, fields in VARIABLE_FIELDS.items():
+        if re.search(r'\b%s\b' % variable, source):
+            used.update(fields)
+    return used & set(OPTIONAL_FIELDS)
+
+
+class CollectionPlan:
+    """Campos opcionales que se recopilan y ahorro conseguido.
+
+    Parameters
+    ----------
+    skip : iterable of str, optional
+        Campos de :data:`OPTIONAL_FIELDS` que no se recopilan. Sin ellos el
+        plan es completo.
+    templates : iterable of str, optional
+        Plantillas de las que se ha derivado el plan (solo informativo).
+    """
+
+    def __init__(self, skip=(), templates=()):
+        unknown = set(skip) - set(OPTIONAL_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown optional fields: {', '.join(sorted(unknown))}")
+        self.skipped = frozenset(skip)
+        self.templates = tuple(templates)
+        self._lock = threading.Lock()
+        self._saved = {}
+
+    @property
+    def full(self):
+        return not self.skipped
+
+    def wants(self, *fields):
+        """``True`` si se recopila alguno de ``fields``."""
+        return any(field not in self.skipped for field in fields)
+
+    def skip_read(self, check, prop):
+        """Anota que ``check`` no ha leído la propiedad ``prop`` de un objeto."""
+        with self._lock:
+            key = (check, prop)
+            self._saved[key] = self._saved.get(key, 0) + 1
+
+    def summary(self):
+        """Propiedades omitidas e idas y vueltas ahorradas por comprobación."""
+        by_check = {}
+        for (check, prop), count in sorted(self._saved.items()):
+            by_check.setdefault(check, {})[prop] = count
+        kept = {p for f in OPTIONAL_FIELDS if f not in self.skipped for p in OPTIONAL_FIELDS[f]}
+        return {
+            'templates': list(self.templates),
+            'skipped_fields': sorted(self.skipped),
+            'skipped_properties': sorted({p for f in self.skipped for p in OPTIONAL_FIELDS[f]} - kept),
+            'round_trips_saved': sum(self._saved.values()),
+            'by_check': by_check,
+        }
+
+
+def _template_loads(path):
+    """``True`` si Jinja2 puede cargar y compilar la plantilla ``path``."""
+    try:
+        import jinja2
+    except ImportError:
+        logger.warning("Jinja2 not available; the default report reads every property")
+        return False
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.dirname(path)))
+    try:
+        env.get_template(os.path.basename(path))
+    except Exception as exc:
+        logger.warning("Template %s does not load (%s); the default report reads every property",
+                       path, exc)
+        return False
+    return True
+
+
+def plan_for_templates(template_paths, extra_fields=()):
+    """Devuelve el :class:`CollectionPlan` mínimo para ``template_paths``.
+
+    ``extra_fields`` son campos que se recopilan aunque ninguna plantilla los
+    use (p. ej. :data:`DETAILED_REPORT_FIELDS`). Si alguna plantilla no puede
+    leerse o Jinja2 no la carga se devuelve un plan completo, ya que en su
+    lugar se genera el informe por defecto, que muestra todos los campos.
+    """
+    used = set(extra_fields)
+    for path in template_paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+        except OSError as exc:
+            logger.warning("Cannot analyse %s (%s); collecting every property", path, exc)
+            return CollectionPlan()
+        if not _template_loads(path):
+            return CollectionPlan()
+        used |= used_fields(source)
+    names = [os.path.basename(p) for p in template_paths]
+    return CollectionPlan(set(OPTIONAL_FIELDS) - used, names)
@@ -0,0 +1,106 @@
+"""Datos embebidos del informe compacto (``template_compact.html``).
+
+Las filas de hosts, VMs y datastores no se expanden en HTML con Jinja2: se
+guardan una sola vez como JSON por columnas, comprimido con gzip y codificado
+en base64 dentro de la página. El navegador las descomprime con
+``DecompressionStream`` y las muestra con tablas virtualizadas (solo se crean
+las filas visibles), con ordenación y filtro. La cabecera con las puntuaciones
+se sigue renderizando en el servidor a partir de ``_build_report_data``.
+"""
+
+import base64
+import gzip
+import json
+
+VM_COLUMNS = [
+    ('name', 'VM'),
+    ('host', 'Host'),
+    ('power_state', 'Estado'),
+    ('num_cpu', 'vCPU'),
+    ('mem_config_gb', 'RAM (GB)'),
+    ('cpu_ready_ms', 'CPU Ready (ms)'),
+    ('cpu_usage_pct', 'CPU (%)'),
+    ('mem_usage_pct', 'RAM (%)'),
+    ('iops', 'IOPS'),
+    ('net_throughput_kbps', 'Red (KB/s)'),
+    ('disk_free_pct', 'Disco libre (%)'),
+    ('has_snapshot', 'Snapshot'),
+    ('tools_status', 'VMware Tools'),
+]
+HOST_COLUMNS = [
+    ('name', 'Host'),
+    ('cluster', 'Clúster'),
+    ('version', 'Versión'),
+    ('cpu_usage_pct', 'CPU (%)'),
+    ('memory_usage_pct', 'RAM (%)'),
+    ('num_vms', 'VMs'),
+    ('cpu_cores', 'Núcleos'),
+    ('avg_cpu_ready_ms', 'CPU Ready medio (ms)'),
+    ('ssh', 'SSH'),
+]
+DATASTORE_COLUMNS = [
+    ('name', 'Datastore'),
+    ('capacity_gb', 'Capacidad (GB)'),
+    ('free_gb', 'Libre (GB)'),
+    ('usage_pct', 'Uso (%)'),
+]
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def _table(columns, rows):
+    return {'columns': [label for _, label in columns], 'rows': rows}
+
+
+def build_payload(hosts_data, vm_data):
+    """Devuelve las tablas ``vms``, ``hosts`` y ``datastores`` por columnas."""
+    host_rows = []
+    vm_rows = []
+    datastores = {}
+    vm_host = {}
+    for host in hosts_data:
+        perf = host.get('performance', {})
+        security = host.get('security', {})
+        record = {
+            'name': host.get('name'),
+            'cluster': (host.get('cluster') or {}).get('name'),
+            'version': security.get('version'),
+            'num_vms': len(host.get('vms', [])),
+            'ssh': bool(security.get('services', {}).get('ssh')),
+        }
+        host_rows.append([
+            _cell(record[key] if key in record else perf.get(key)) for key, _ in HOST_COLUMNS
+        ])
+        for vm in host.get('vms', []):
+            vm_host[vm['name']] = host.get('name')
+        for ds in perf.get('datastores', []):
+            if isinstance(ds, dict) and ds.get('name') not in datastores:
+                datastores[ds.get('name')] = [_cell(ds.get(key)) for key, _ in DATASTORE_COLUMNS]
+    for vm in vm_data:
+        metrics = vm['metrics']
+        vm_rows.append([
+            vm['name'] if key == 'name' else
+            vm_host.get(vm['name']) if key == 'host' else
+            _cell(metrics.get(key))
+            for key, _ in VM_COLUMNS
+        ])
+    return {
+        'vms': _table(VM_COLUMNS, vm_rows),
+        'hosts': _table(HOST_COLUMNS, host_rows),
+        'datastores': _table(DATASTORE_COLUMNS, list(datastores.values())),
+    }
+
+
+def encode_payload(payload):
+    """Serializa ``payload`` como JSON compacto, gzip y base64."""
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.b64encode(gzip.compress(raw, compresslevel=9, mtime=0)).decode('ascii')
+
+
+def decode_payload(text):
+    """Inverse of :func:`encode_payload`."""
+    return json.loads(gzip.decompress(base64.b64decode(text)).decode('utf-8'))
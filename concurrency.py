@@ -0,0 +1,217 @@
+"""Control adaptativo de la concurrencia de la recopilación.
+
+Recopilar varios hosts en paralelo acorta la ejecución, pero cada hilo añade
+carga a vCenter, que comparte con el resto de automatizaciones.
+:class:`AdaptiveLimiter` regula cuántos hosts se recopilan a la vez con un
+esquema AIMD (incremento aditivo, reducción multiplicativa):
+
+* observa la latencia y los fallos de cada ida y vuelta SOAP (a través de
+  ``SoapCallStats.listeners``);
+* cada ``window`` llamadas compara la latencia media con la mejor observada
+  (o con ``latency_target``) y la tasa de fallos con ``fault_threshold``;
+* si vCenter se degrada multiplica el límite por ``decrease`` y registra un
+  evento de estrangulamiento; si está sano lo incrementa en uno, hasta
+  ``max_workers``.
+
+Además impone un máximo absoluto de llamadas por segundo
+(``max_calls_per_second``) que se aplica antes de cada llamada
+(``SoapCallStats.gates``), independientemente del límite de concurrencia.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_EVENTS = 50
+# Latency changes smaller than this are noise, not a slower vCenter
+LATENCY_SLACK = 0.005
+
+
+def parse_rate_limits(values, target):
+    """Obtiene el límite de llamadas por segundo de ``target``.
+
+    ``values`` admite ``N`` (cualquier vCenter) y ``VCENTER=N``; gana la
+    entrada específica del vCenter.
+    """
+    default = None
+    for value in values or []:
+        name, sep, rate = value.rpartition('=')
+        try:
+            rate = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid calls-per-second limit '{value}'; "
+                             "expected N or VCENTER=N") from None
+        if not sep:
+            default = rate
+        elif name == target:
+            return rate
+    return default
+
+
+class AdaptiveLimiter:
+    """Límite AIMD de hosts recopilados en paralelo.
+
+    Parameters
+    ----------
+    max_workers : int
+        Máximo de hosts en paralelo (``--workers``).
+    min_workers : int, optional
+        El límite nunca baja de este valor.
+    max_calls_per_second : float, optional
+        Máximo de llamadas SOAP por segundo.
+    latency_target : float, optional
+        Latencia media (s) a partir de la cual se reduce el límite. Por
+        defecto ``latency_tolerance`` veces la mejor media observada (y al
+        menos :data:`LATENCY_SLACK` más).
+    latency_tolerance : float, optional
+        Degradación admitida respecto a la mejor latencia observada.
+    fault_threshold : float, optional
+        Fracción de llamadas con fallo que provoca una reducción.
+    window : int, optional
+        Llamadas entre dos ajustes del límite.
+    decrease : float, optional
+        Factor aplicado al límite al reducirlo.
+    """
+
+    def __init__(self, max_workers, min_workers=1, max_calls_per_second=None,
+                 latency_target=None, latency_tolerance=2.0, fault_threshold=0.05,
+                 window=20, decrease=0.5):
+        self.max_workers = max(1, int(max_workers))
+        self.min_workers = max(1, min(int(min_workers), self.max_workers))
+        self.max_calls_per_second = max_calls_per_second or None
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.fault_threshold = fault_threshold
+        self.window = window
+        self.decrease = decrease
+        # Start low and ramp up while vCenter stays healthy
+        self.limit = float(min(self.max_workers, max(self.min_workers, 2)))
+        self._cond = threading.Condition()
+        self._rate_lock = threading.Lock()
+        self._next_call = 0.0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.faults = 0
+        self._window_calls = 0
+        self._window_faults = 0
+        self._window_latency = 0.0
+        self.baseline = None
+        self.last_latency = None
+        self.increases = 0
+        self.decreases = 0
+        self.events = []
+        self.rate_waits = 0
+        self.rate_wait_s = 0.0
+
+    def attach(self, stats):
+        """Recibe la latencia de cada llamada de ``stats`` y limita su ritmo."""
+        if self.record not in stats.listeners:
+            stats.listeners.append(self.record)
+        if self.max_calls_per_second and self.wait_for_call not in stats.gates:
+            stats.gates.append(self.wait_for_call)
+        return self
+
+    # -- work slots ------------------------------------------------------
+    @contextlib.contextmanager
+    def slot(self):
+        """Bloquea hasta que el límite actual admite otro host en curso."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    # -- calls-per-second ceiling ----------------------------------------
+    def wait_for_call(self):
+        """Espera el turno de la siguiente llamada según ``max_calls_per_second``."""
+        interval = 1.0 / self.max_calls_per_second
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_call)
+            self._next_call = start + interval
+        delay = start - now
+        if delay > 0:
+            with self._cond:
+                self.rate_waits += 1
+                self.rate_wait_s += delay
+            time.sleep(delay)
+
+    # -- feedback --------------------------------------------------------
+    def record(self, latency, fault=None):
+        """Anota una llamada y ajusta el límite al completar cada ventana."""
+        with self._cond:
+            self.calls += 1
+            self._window_calls += 1
+            self._window_latency += latency
+            if fault is not None:
+                self.faults += 1
+                self._window_faults += 1
+            if self._window_calls >= self.window:
+                self._adjust()
+
+    def _adjust(self):
+        mean = self._window_latency / self._window_calls
+        fault_rate = self._window_faults / self._window_calls
+        self._window_calls = self._window_faults = 0
+        self._window_latency = 0.0
+        self.last_latency = mean
+        if self.baseline is None or mean < self.baseline:
+            self.baseline = mean
+        target = self.latency_target or max(self.baseline * self.latency_tolerance,
+                                            self.baseline + LATENCY_SLACK)
+        reason = None
+        if fault_rate > self.fault_threshold:
+            reason = f'fault rate {fault_rate:.0%}'
+        elif mean > target:
+            reason = f'latency {mean * 1000:.1f} ms > {target * 1000:.1f} ms'
+        previous = self.limit
+        if reason:
+            if self.in_flight > int(self.limit):
+                # Hosts started before the last decrease are still running;
+                # wait until it takes effect before backing off again
+                return
+            self.limit = max(float(self.min_workers), self.limit * self.decrease)
+            self.decreases += 1
+            if int(self.limit) < int(previous):
+                self._event('throttle', previous, reason)
+        elif self.limit < self.max_workers:
+            self.limit = min(float(self.max_workers), self.limit + 1)
+            self.increases += 1
+            self._cond.notify_all()
+
+    def _event(self, kind, previous, reason):
+        event = {'time': round(time.time(), 3), 'event': kind, 'from': int(previous),
+                 'to': int(self.limit), 'reason': reason}
+        logger.info("Collection concurrency %d -> %d (%s)", event['from'], event['to'], reason)
+        self.events.append(event)
+        del self.events[:-MAX_EVENTS]
+
+    def summary(self):
+        """Estado del limitador para el resumen de la ejecución."""
+        with self._cond:
+            return {
+                'concurrency': int(self.limit),
+                'max_workers': self.max_workers,
+                'min_workers': self.min_workers,
+                'peak_in_flight': self.peak_in_flight,
+                'calls': self.calls,
+                'faults': self.faults,
+                'baseline_latency_ms': None if self.baseline is None else round(self.baseline * 1000, 2),
+                'last_latency_ms': None if self.last_latency is None else round(self.last_latency * 1000, 2),
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'throttle_events': list(self.events),
+                'max_calls_per_second': self.max_calls_per_second,
+                'rate_waits': self.rate_waits,
+                'rate_wait_s': round(self.rate_wait_s, 3),
+            }
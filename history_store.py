@@ -0,0 +1,266 @@
+"""Histórico local de ejecuciones en SQLite.
+
+Cada ejecución añade (nunca modifica) las métricas de hosts, VMs y datastores y
+las puntuaciones por categoría de ``_build_report_data``. Las inserciones se
+hacen por lotes dentro de una única transacción y cada tabla tiene un índice
+``(entidad, ts)`` para que las series de tendencia se lean con ``LIMIT`` sin
+cargar todo el histórico. :meth:`HistoryStore.apply_retention` agrega a una
+muestra diaria los datos antiguos y elimina los que superan la retención; el
+índice ``(ts)`` de cada tabla evita que lo haga recorriendo la tabla entera.
+Cada fila guarda el vCenter de la ejecución, de modo que una misma base de
+datos puede compartirse entre varios vCenter sin mezclar sus tendencias.
+"""
+
+import sqlite3
+import time
+
+HOST_COLUMNS = ('cpu_usage_pct', 'memory_usage_pct', 'cpu_usage', 'memory_usage',
+                'avg_cpu_ready_ms', 'num_vms')
+VM_COLUMNS = ('cpu_ready_ms', 'cpu_usage_pct', 'mem_usage_pct', 'iops',
+              'net_throughput_kbps', 'ballooned_memory_mb', 'disk_free_pct')
+DATASTORE_COLUMNS = ('capacity_gb', 'free_gb', 'usage_pct')
+
+# table -> (entity column, metric columns)
+TABLES = {
+    'host_metrics': ('host', HOST_COLUMNS),
+    'vm_metrics': ('vm', VM_COLUMNS),
+    'datastore_metrics': ('datastore', DATASTORE_COLUMNS),
+    'category_scores': ('category', ('score',)),
+}
+
+DAY = 86400
+
+
+class HistoryStore:
+    """Almacén SQLite de métricas por ejecución.
+
+    Parameters
+    ----------
+    path : str
+        Ruta de la base de datos (se crea si no existe).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, vcenter TEXT, '
+                'health_score REAL, hosts INTEGER, vms INTEGER, datastores INTEGER)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs (ts)')
+            for table, (entity, columns) in TABLES.items():
+                cols = ', '.join(f'{c} REAL' for c in columns)
+                self.conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    f'run_id INTEGER, ts REAL NOT NULL, vcenter TEXT, {entity} TEXT NOT NULL, '
+                    f'{cols}, downsampled INTEGER NOT NULL DEFAULT 0)'
+                )
+                self._add_vcenter_column(table)
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{table}_entity_ts ON {table} ({entity}, ts)'
+                )
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{table}_run ON {table} (run_id)'
+                )
+                # Range scans of apply_retention
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (ts)'
+                )
+
+    def _add_vcenter_column(self, table):
+        """Añade ``vcenter`` a las tablas creadas sin ella, con el de su ejecución."""
+        columns = {row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+        if 'vcenter' in columns:
+            return
+        self.conn.execute(f'ALTER TABLE {table} ADD COLUMN vcenter TEXT')
+        self.conn.execute(
+            f'UPDATE {table} SET vcenter = (SELECT vcenter FROM runs WHERE runs.id = run_id)'
+        )
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    # -- writing ---------------------------------------------------------
+    def record_run(self, hosts_data, vm_data, report_data=None, ts=None, vcenter=None):
+        """Guarda una ejecución y devuelve su identificador.
+
+        Parameters
+        ----------
+        hosts_data : list of dict
+            Registros de host de ``VMwareHealthCheck.collect``.
+        vm_data : list of dict
+            Lista plana de VMs.
+        report_data : dict, optional
+            Resultado de ``_build_report_data`` con las puntuaciones.
+        ts : float, optional
+            Marca de tiempo Unix; por defecto la actual.
+        vcenter : str, optional
+            Nombre del vCenter analizado.
+        """
+        ts = time.time() if ts is None else ts
+        report_data = report_data or {}
+
+        host_rows = []
+        datastore_rows = {}
+        for host in hosts_data:
+            perf = host.get('performance', {})
+            host_rows.append((host.get('name'),) + tuple(_value(perf.get(c)) for c in HOST_COLUMNS))
+            for ds in perf.get('datastores', []):
+                if isinstance(ds, dict) and ds.get('name') not in datastore_rows:
+                    datastore_rows[ds.get('name')] = (ds.get('name'),) + tuple(
+                        _value(ds.get(c)) for c in DATASTORE_COLUMNS
+                    )
+        vm_rows = [
+            (vm['name'],) + tuple(_value(vm['metrics'].get(c)) for c in VM_COLUMNS)
+            for vm in vm_data
+        ]
+        category_rows = [
+            (c['name'], _value(c.get('score'))) for c in report_data.get('categories', [])
+        ]
+
+        with self.conn:
+            cur = self.conn.execute(
+                'INSERT INTO runs (ts, vcenter, health_score, hosts, vms, datastores) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (ts, vcenter, _value(report_data.get('health_score')),
+                 len(hosts_data), len(vm_data), len(datastore_rows)),
+            )
+            run_id = cur.lastrowid
+            for table, rows in (
+                ('host_metrics', host_rows),
+                ('vm_metrics', vm_rows),
+                ('datastore_metrics', list(datastore_rows.values())),
+                ('category_scores', category_rows),
+            ):
+                entity, columns = TABLES[table]
+                names = ', '.join((entity,) + columns)
+                marks = ', '.join('?' * (len(columns) + 4))
+                self.conn.executemany(
+                    f'INSERT INTO {table} (run_id, ts, vcenter, {names}) VALUES ({marks})',
+                    ((run_id, ts, vcenter) + row for row in rows),
+                )
+        return run_id
+
+    def apply_retention(self, keep_days=365, downsample_after_days=30, now=None):
+        """Reduce el histórico antiguo.
+
+        Las filas con más de ``downsample_after_days`` se sustituyen por una
+        media diaria por vCenter y entidad y las de más de ``keep_days`` se eliminan.
+        El corte se alinea a medianoche (UTC, como los días de la media) para
+        que cada día se agregue una sola vez, con todas sus filas.
+        """
+        now = time.time() if now is None else now
+        cutoff = (now - downsample_after_days * DAY) // DAY * DAY
+        expire = now - keep_days * DAY
+        with self.conn:
+            for table, (entity, columns) in TABLES.items():
+                self.conn.execute(f'DELETE FROM {table} WHERE ts < ?', (expire,))
+                avgs = ', '.join(f'AVG({c})' for c in columns)
+                names = ', '.join(columns)
+                day = f'CAST(ts / {DAY} AS INTEGER)'
+                self.conn.execute(
+                    f'INSERT INTO {table} (run_id, ts, vcenter, {entity}, {names}, downsampled) '
+                    f'SELECT NULL, {day} * {DAY}, vcenter, {entity}, {avgs}, 1 FROM {table} '
+                    f'WHERE ts < ? AND downsampled = 0 GROUP BY vcenter, {entity}, {day}',
+                    (cutoff,),
+                )
+                self.conn.execute(
+                    f'DELETE FROM {table} WHERE ts < ? AND downsampled = 0', (cutoff,)
+                )
+            self.conn.execute('DELETE FROM runs WHERE ts < ?', (expire,))
+
+    # -- reading ---------------------------------------------------------
+    def runs(self, last_n=30, vcenter=None):
+        """Return the last ``last_n`` runs, oldest first.
+
+        With ``vcenter`` only the runs of that vCenter are returned.
+        """
+        where, params = _vcenter_filter(vcenter)
+        rows = self.conn.execute(
+            'SELECT id, ts, vcenter, health_score, hosts, vms, datastores FROM runs '
+            f'WHERE 1 {where} ORDER BY ts DESC LIMIT ?', params + (last_n,)
+        ).fetchall()
+        keys = ('id', 'ts', 'vcenter', 'health_score', 'hosts', 'vms', 'datastores')
+        return [dict(zip(keys, r)) for r in reversed(rows)]
+
+    def series(self, table, entity, metric, last_n=30, vcenter=None):
+        """Devuelve los últimos ``last_n`` puntos ``(ts, valor)`` de una entidad."""
+        entity_col, columns = TABLES[table]
+        if metric not in columns:
+            raise ValueError(f"Unknown metric '{metric}' for {table}")
+        where, params = _vcenter_filter(vcenter)
+        rows = self.conn.execute(
+            f'SELECT ts, {metric} FROM {table} WHERE {entity_col} = ? {where} '
+            'ORDER BY ts DESC LIMIT ?', (entity,) + params + (last_n,)
+        ).fetchall()
+        return list(reversed(rows))
+
+    def trends(self, last_n=30, datastores=None, top_datastores=5, vcenter=None):
+        """Series de tendencia para las plantillas.
+
+        Con ``vcenter`` solo se leen las ejecuciones de ese vCenter; sin él se
+        mezclan todas las de la base de datos.
+
+        Returns
+        -------
+        dict
+            ``runs`` (fecha, puntuación global, VMs), ``categories``
+            (puntuación por categoría) y ``datastores`` (uso de los datastores
+            más llenos o de los indicados), cada una con a lo sumo ``last_n``
+            puntos.
+        """
+        runs = self.runs(last_n, vcenter)
+        if not runs:
+            return {}
+        since = runs[0]['ts']
+        where, params = _vcenter_filter(vcenter)
+        categories = {}
+        for name, ts, score in self.conn.execute(
+            f'SELECT category, ts, score FROM category_scores WHERE ts >= ? {where} '
+            'ORDER BY category, ts', (since,) + params
+        ):
+            categories.setdefault(name, []).append({'date': _date(ts), 'value': score})
+        if datastores is None:
+            datastores = [r[0] for r in self.conn.execute(
+                'SELECT datastore FROM datastore_metrics WHERE run_id = ? '
+                'ORDER BY usage_pct DESC LIMIT ?', (runs[-1]['id'], top_datastores)
+            )]
+        datastore_series = {
+            name: [{'date': _date(ts), 'value': round(v or 0, 1)}
+                   for ts, v in self.series('datastore_metrics', name, 'usage_pct', last_n,
+                                            vcenter)]
+            for name in datastores
+        }
+        return {
+            'runs': [{'date': _date(r['ts']), 'health_score': r['health_score'], 'vms': r['vms']}
+                     for r in runs],
+            'categories': categories,
+            'datastores': datastore_series,
+        }
+
+
+def _vcenter_filter(vcenter):
+    """Condición SQL (``AND ...``) y parámetros para filtrar por vCenter."""
+    if vcenter is None:
+        return '', ()
+    return 'AND vcenter = ?', (vcenter,)
+
+
+def _value(value):
+    if isinstance(value, bool):
+        return int(value)
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(ts):
+    return time.strftime('%d-%m-%Y %H:%M', time.localtime(ts))
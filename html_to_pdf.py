@@ -1,22 +1,171 @@
+"""Conversión de informes HTML a PDF con WeasyPrint.
+
+Una conversión aislada se lanza como antes::
+
+    python html_to_pdf.py informe.html reporte.pdf
+
+Varios informes se convierten en paralelo con un pool de procesos; cada proceso
+crea una sola vez la configuración de fuentes, la hoja de estilos de impresión
+(``print.css``) y la caché de imágenes y las reutiliza para todos los
+documentos que convierte::
+
+    python html_to_pdf.py --workers 4 informe1.html informe2.html informe3.html
+
+``main()`` de ``vmware_healthcheck.py`` usa :func:`start_background_conversion`
+con ``--pdf`` para convertir el informe en segundo plano en cuanto se escribe.
+"""
+
 import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PRINT_CSS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'print.css')
+
+# Per-process font configuration, stylesheets and image cache
+_WORKER_STATE = None
+
+
+def _require_weasyprint():
+    try:
+        import weasyprint
+    except ImportError as exc:
+        raise SystemExit("weasyprint is required to convert HTML to PDF") from exc
+    return weasyprint
+
+
+def _font_configuration():
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+    except ImportError:  # WeasyPrint < 53
+        from weasyprint.fonts import FontConfiguration
+    return FontConfiguration()
+
 
-try:
-    from weasyprint import HTML
-except ImportError as exc:
-    raise SystemExit("weasyprint is required to convert HTML to PDF") from exc
+def _worker_state(print_css=PRINT_CSS):
+    """Devuelve (creándolo la primera vez) el estado compartido del proceso."""
+    global _WORKER_STATE
+    if _WORKER_STATE is None:
+        weasyprint = _require_weasyprint()
+        font_config = _font_configuration()
+        stylesheets = []
+        if print_css and os.path.isfile(print_css):
+            stylesheets.append(weasyprint.CSS(filename=print_css, font_config=font_config))
+        major = int(str(getattr(weasyprint, '__version__', '0')).split('.')[0] or 0)
+        _WORKER_STATE = {
+            'font_config': font_config,
+            'stylesheets': stylesheets,
+            'cache': {},
+            'cache_option': 'cache' if major >= 59 else 'image_cache',
+        }
+    return _WORKER_STATE
 
 
-def convert_html_to_pdf(html_path: str, pdf_path: str) -> None:
+def convert_html_to_pdf(html_path: str, pdf_path: str, print_css: str = PRINT_CSS) -> None:
     """Convert an HTML file to PDF using WeasyPrint."""
-    HTML(html_path).write_pdf(pdf_path)
+    weasyprint = _require_weasyprint()
+    state = _worker_state(print_css)
+    options = {state['cache_option']: state['cache']}
+    weasyprint.HTML(filename=html_path).write_pdf(
+        pdf_path,
+        stylesheets=state['stylesheets'],
+        font_config=state['font_config'],
+        **options,
+    )
+
+
+def _convert_job(job):
+    html_path, pdf_path = job
+    start = time.perf_counter()
+    try:
+        convert_html_to_pdf(html_path, pdf_path)
+    except (Exception, SystemExit) as exc:  # SystemExit: weasyprint missing
+        return {'html': html_path, 'pdf': pdf_path, 'seconds': time.perf_counter() - start,
+                'error': str(exc) or type(exc).__name__}
+    return {'html': html_path, 'pdf': pdf_path, 'seconds': time.perf_counter() - start,
+            'error': None}
+
+
+def pdf_path_for(html_path):
+    """Return ``html_path`` with a ``.pdf`` extension."""
+    return os.path.splitext(html_path)[0] + '.pdf'
+
+
+def convert_batch(jobs, workers=None):
+    """Convierte varios informes en paralelo.
+
+    Parameters
+    ----------
+    jobs : iterable of tuple
+        Pares ``(html, pdf)``.
+    workers : int, optional
+        Número de procesos; por defecto uno por CPU (sin superar el número de
+        informes). Con ``1`` la conversión se hace en el proceso actual.
+
+    Returns
+    -------
+    list of dict
+        Por informe: ``html``, ``pdf``, ``seconds`` y ``error`` (``None`` si
+        la conversión fue correcta), en el orden de ``jobs``.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        return [_convert_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_convert_job, jobs))
+
+
+def _convert_background(html_path, pdf_path):
+    result = _convert_job((html_path, pdf_path))
+    if result['error']:
+        logger.error("PDF conversion of %s failed: %s", html_path, result['error'])
+        raise SystemExit(1)
+
+
+def start_background_conversion(html_path, pdf_path=None):
+    """Lanza la conversión de ``html_path`` en un proceso independiente.
+
+    Devuelve el ``multiprocessing.Process`` iniciado (con el destino en
+    ``pdf_path``); ``exitcode`` es ``0`` cuando el PDF se ha escrito
+    correctamente.
+    """
+    pdf_path = pdf_path or pdf_path_for(html_path)
+    process = multiprocessing.Process(target=_convert_background, args=(html_path, pdf_path),
+                                      name='pdf-conversion', daemon=False)
+    process.pdf_path = pdf_path
+    process.start()
+    return process
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Convert HTML report to PDF")
-    parser.add_argument("html", help="Input HTML report")
-    parser.add_argument("output", nargs="?", default="report.pdf", help="PDF output path")
+    parser = argparse.ArgumentParser(description="Convert HTML reports to PDF")
+    parser.add_argument("inputs", nargs="+",
+                        help="HTML report(s); a single report may be followed by the PDF path")
+    parser.add_argument("--workers", type=int, help="number of conversion processes")
     args = parser.parse_args()
-    convert_html_to_pdf(args.html, args.output)
+    inputs = args.inputs
+    if len(inputs) == 2 and inputs[1].lower().endswith('.pdf'):
+        jobs = [(inputs[0], inputs[1])]
+    elif len(inputs) == 1:
+        jobs = [(inputs[0], "report.pdf")]
+    else:
+        jobs = [(path, pdf_path_for(path)) for path in inputs]
+    failed = False
+    for result in convert_batch(jobs, args.workers):
+        if result['error']:
+            failed = True
+            print(f"{result['html']}: {result['error']}")
+        else:
+            print(f"{result['html']} -> {result['pdf']} ({result['seconds']:.1f}s)")
+    if failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+"""Contabilidad de tokens, latencia y coste de las llamadas al modelo de IA."""
+
+import collections
+import contextlib
+import html
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Per-call records kept for the run summary; older calls only count in the totals
+DEFAULT_MAX_CALLS = 1000
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def usage_section(name):
+    """Atribuye a ``name`` las llamadas realizadas dentro del bloque."""
+    previous = getattr(_local, "section", None)
+    _local.section = name
+    try:
+        yield
+    finally:
+        _local.section = previous
+
+
+def current_section():
+    """Return the section set by :func:`usage_section` in this thread."""
+    return getattr(_local, "section", None)
+
+
+class LLMUsageTracker:
+    """Acumula métricas de cada llamada a ``fetch_completion``.
+
+    Los totales por sección se acumulan al registrar cada llamada; de las
+    llamadas solo se conservan las ``max_calls`` más recientes, de modo que el
+    modo planificado y el exportador no crecen sin límite.
+
+    Parameters
+    ----------
+    prompt_price_per_1k : float, optional
+        Precio por cada 1000 tokens de entrada.
+    completion_price_per_1k : float, optional
+        Precio por cada 1000 tokens generados.
+    max_calls : int, optional
+        Registros individuales que se conservan para :meth:`summary`.
+    """
+
+    def __init__(self, prompt_price_per_1k=0.0, completion_price_per_1k=0.0,
+                 max_calls=DEFAULT_MAX_CALLS):
+        self.prompt_price_per_1k = prompt_price_per_1k
+        self.completion_price_per_1k = completion_price_per_1k
+        self.calls = collections.deque(maxlen=max_calls)
+        self._totals = self._empty()
+        self._sections = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _price(name, value):
+        try:
+            price = float(value)
+        except (TypeError, ValueError):
+            price = -1
+        if price < 0:
+            logger.warning("Ignoring invalid %s %r", name, value)
+            return None
+        return price
+
+    def set_prices(self, prompt_price_per_1k=None, completion_price_per_1k=None):
+        """Update the prices used to estimate the cost of each call.
+
+        Invalid values (not a non-negative number) are logged and ignored.
+        """
+        if prompt_price_per_1k is not None:
+            price = self._price('prompt price per 1k tokens', prompt_price_per_1k)
+            if price is not None:
+                self.prompt_price_per_1k = price
+        if completion_price_per_1k is not None:
+            price = self._price('completion price per 1k tokens', completion_price_per_1k)
+            if price is not None:
+                self.completion_price_per_1k = price
+
+    @staticmethod
+    def _empty():
+        return {
+            'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'total_tokens': 0, 'latency_s': 0.0, 'retries': 0,
+            'cache_hits': 0, 'errors': 0,
+        }
+
+    def record(self, section, model, prompt_tokens=0, completion_tokens=0,
+               latency_s=0.0, retries=0, cache_hit=False, error=None):
+        """Registra una llamada al modelo."""
+        call = {
+            'section': section or 'unnamed',
+            'model': model,
+            'prompt_tokens': int(prompt_tokens or 0),
+            'completion_tokens': int(completion_tokens or 0),
+            'latency_s': round(latency_s, 4),
+            'retries': retries,
+            'cache_hit': cache_hit,
+            'error': error,
+        }
+        with self._lock:
+            self.calls.append(call)
+            for agg in (self._totals, self._sections.setdefault(call['section'], self._empty())):
+                agg['calls'] += 1
+                agg['prompt_tokens'] += call['prompt_tokens']
+                agg['completion_tokens'] += call['completion_tokens']
+                agg['total_tokens'] += call['prompt_tokens'] + call['completion_tokens']
+                agg['latency_s'] += call['latency_s']
+                agg['retries'] += call['retries']
+                agg['cache_hits'] += 1 if call['cache_hit'] else 0
+                agg['errors'] += 1 if call['error'] else 0
+        return call
+
+    def reset(self):
+        """Discard every recorded call."""
+        with self._lock:
+            self.calls.clear()
+            self._totals = self._empty()
+            self._sections = {}
+
+    def _cost(self, prompt_tokens, completion_tokens):
+        return (
+            prompt_tokens / 1000 * self.prompt_price_per_1k
+            + completion_tokens / 1000 * self.completion_price_per_1k
+        )
+
+    def summary(self):
+        """Devuelve los totales por sección y de toda la ejecución.
+
+        ``calls`` solo incluye las llamadas más recientes;
+        ``calls_dropped`` indica cuántas se contaron sin conservarse.
+        """
+        with self._lock:
+            calls = list(self.calls)
+            totals = dict(self._totals)
+            sections = {name: dict(agg) for name, agg in self._sections.items()}
+        for agg in [totals] + list(sections.values()):
+            agg['latency_s'] = round(agg['latency_s'], 4)
+            agg['cost'] = round(self._cost(agg['prompt_tokens'], agg['completion_tokens']), 6)
+        return {
+            'totals': totals,
+            'sections': sections,
+            'prices_per_1k': {
+                'prompt': self.prompt_price_per_1k,
+                'completion': self.completion_price_per_1k,
+            },
+            'calls': calls,
+            'calls_dropped': totals['calls'] - len(calls),
+        }
+
+    def html_footer(self):
+        """Genera una tabla HTML con el consumo por sección."""
+        data = self.summary()
+        rows = []
+        for name, agg in sorted(data['sections'].items()):
+            rows.append(
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{:.2f}</td>"
+                "<td>{}</td><td>{}</td><td>{:.4f}</td></tr>".format(
+                    html.escape(name), agg['calls'], agg['prompt_tokens'],
+                    agg['completion_tokens'], agg['latency_s'], agg['retries'],
+                    agg['cache_hits'], agg['cost'],
+                )
+            )
+        t = data['totals']
+        rows.append(
+            "<tr><th>Total</th><th>{}</th><th>{}</th><th>{}</th><th>{:.2f}</th>"
+            "<th>{}</th><th>{}</th><th>{:.4f}</th></tr>".format(
+                t['calls'], t['prompt_tokens'], t['completion_tokens'],
+                t['latency_s'], t['retries'], t['cache_hits'], t['cost'],
+            )
+        )
+        return (
+            "<div class='llm-usage'><h2>Consumo de IA</h2><table>"
+            "<tr><th>Sección</th><th>Llamadas</th><th>Tokens entrada</th>"
+            "<th>Tokens salida</th><th>Latencia (s)</th><th>Reintentos</th>"
+            "<th>Caché</th><th>Coste</th></tr>"
+            + "".join(rows)
+            + "</table></div>"
+        )
+
+
+tracker = LLMUsageTracker()
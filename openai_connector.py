@@ -2,9 +2,22 @@
 
 import os
 import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 import openai
 
+from llm_usage import tracker as usage_tracker, current_section
+
 _DEFAULT_MODEL = None
+_MAX_RETRIES = 2
+_RETRY_BACKOFF = 1.0
+# In-memory LRU of responses; bounded so that --schedule and the exporter
+# do not keep every completion of every run
+_COMPLETION_CACHE_SIZE = 128
+_COMPLETION_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
 
 
 def apply_azure_env_vars(force=False, verbose=False):
@@ -83,6 +96,10 @@ def configure_openai(api_key=None, api_type=None, api_base=None, api_version=Non
 
     global _DEFAULT_MODEL
     _DEFAULT_MODEL = model or os.getenv("OPENAI_MODEL") or cfg.get("model")
+    usage_tracker.set_prices(
+        os.getenv("OPENAI_PROMPT_PRICE_PER_1K") or cfg.get("prompt_price_per_1k"),
+        os.getenv("OPENAI_COMPLETION_PRICE_PER_1K") or cfg.get("completion_price_per_1k"),
+    )
     if verbose:
         print(f"API type: {openai.api_type}")
         if openai.api_type == "azure":
@@ -93,10 +110,47 @@ def configure_openai(api_key=None, api_type=None, api_base=None, api_version=Non
             print(f"Modelo: {_DEFAULT_MODEL}")
 
 
-def fetch_completion(messages, model=None):
-    """Envía las ``messages`` al servicio configurado y devuelve la respuesta."""
+def clear_completion_cache():
+    """Vacía la caché de respuestas en memoria."""
+    with _CACHE_LOCK:
+        _COMPLETION_CACHE.clear()
+
+
+def _retryable_errors():
+    """Return the transient ``openai`` exceptions worth retrying."""
+    errors = getattr(openai, "error", None)
+    names = ("RateLimitError", "APIConnectionError", "Timeout",
+             "ServiceUnavailableError", "APIError")
+    return tuple(getattr(errors, n) for n in names if hasattr(errors, n))
+
+
+def _extract_usage(response):
+    """Return ``(prompt_tokens, completion_tokens)`` from a response."""
+    try:
+        usage = response.get("usage")
+    except AttributeError:
+        usage = getattr(response, "usage", None)
+    if not usage:
+        return 0, 0
+    try:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    except AttributeError:
+        return (getattr(usage, "prompt_tokens", 0),
+                getattr(usage, "completion_tokens", 0))
+
+
+def fetch_completion(messages, model=None, section=None, use_cache=True):
+    """Envía las ``messages`` al servicio configurado y devuelve la respuesta.
+
+    Cada llamada queda registrada en :data:`llm_usage.tracker` con los tokens
+    consumidos, la latencia, los reintentos y si se sirvió desde la caché. Si
+    no se indica ``section`` se usa la activa en :func:`llm_usage.usage_section`.
+    Con ``use_cache`` las respuestas se guardan en una caché LRU en memoria de
+    como mucho ``_COMPLETION_CACHE_SIZE`` entradas.
+    """
     if model is None:
         model = _DEFAULT_MODEL or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    section = section or current_section()
     params = {"messages": messages}
     api_type = getattr(openai, "api_type", "openai")
     if api_type == "azure":
@@ -108,5 +162,47 @@ def fetch_completion(messages, model=None):
             params["model"] = model
     else:
         params["model"] = model
-    response = openai.ChatCompletion.create(**params)
-    return response["choices"][0]["message"]["content"]
+
+    key = hashlib.sha256(
+        json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    if use_cache:
+        with _CACHE_LOCK:
+            cached = _COMPLETION_CACHE.get(key)
+            if cached is not None:
+                _COMPLETION_CACHE.move_to_end(key)
+        if cached is not None:
+            usage_tracker.record(section, model, cache_hit=True)
+            return cached
+
+    retryable = _retryable_errors()
+    retries = 0
+    start = time.perf_counter()
+    while True:
+        try:
+            response = openai.ChatCompletion.create(**params)
+            break
+        except retryable as exc:
+            if retries >= _MAX_RETRIES:
+                usage_tracker.record(section, model, latency_s=time.perf_counter() - start,
+                                     retries=retries, error=str(exc))
+                raise
+            retries += 1
+            time.sleep(_RETRY_BACKOFF * 2 ** (retries - 1))
+        except Exception as exc:
+            usage_tracker.record(section, model, latency_s=time.perf_counter() - start,
+                                 retries=retries, error=str(exc))
+            raise
+    latency = time.perf_counter() - start
+
+    prompt_tokens, completion_tokens = _extract_usage(response)
+    usage_tracker.record(section, model, prompt_tokens, completion_tokens,
+                         latency, retries=retries)
+    content = response["choices"][0]["message"]["content"]
+    if use_cache:
+        with _CACHE_LOCK:
+            _COMPLETION_CACHE[key] = content
+            _COMPLETION_CACHE.move_to_end(key)
+            while len(_COMPLETION_CACHE) > _COMPLETION_CACHE_SIZE:
+                _COMPLETION_CACHE.popitem(last=False)
+    return content
@@ -3,6 +3,7 @@
 from typing import Optional
 
 from openai_connector import configure_openai, fetch_completion
+from llm_usage import usage_section
 
 
 def generate_detailed_report(summary: str, api_key: str, model: str,
@@ -55,4 +56,5 @@ def generate_detailed_report(summary: str, api_key: str, model: str,
         }
     ]
 
-    return fetch_completion(messages, model)
+    with usage_section("detailed_report"):
+        return fetch_completion(messages, model)
@@ -0,0 +1,221 @@
+"""Medición de tiempos y memoria por fase de la ejecución.
+
+:class:`PhaseProfiler` registra, para cada fase (conexión, enumeración de
+hosts, comprobaciones por host, rendimiento de VMs, agregación, gráfico, IA y
+renderizado), el tiempo de pared, el tiempo de CPU y el pico de memoria medido
+con ``tracemalloc``. Las fases que se repiten (una por host, por ejemplo) se
+acumulan. Opcionalmente se captura un perfil ``cProfile`` de toda la ejecución.
+
+El tiempo de CPU es el del hilo que ejecuta la fase (``time.thread_time``),
+ya que la recopilación en paralelo y los productores del informe ejecutan
+fases en varios hilos a la vez. ``tracemalloc`` en cambio mide todo el
+proceso: el pico de una fase que se solapa con fases de otros hilos incluye
+su memoria, por lo que se cuenta en ``peak_overlapped`` y el resumen incluye
+además el pico de toda la ejecución (``peak_kb``). ``cProfile`` solo perfila
+el hilo que llama a :meth:`PhaseProfiler.start` (el principal); el trabajo de
+los hilos de recopilación e IA no aparece en ``cprofile_top``.
+"""
+
+import contextlib
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+
+def profiled_phase(name):
+    """Decorate a ``VMwareHealthCheck`` method so it is measured as ``name``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.phase(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class NullProfiler:
+    """Profiler que no mide nada; es el valor por defecto."""
+
+    enabled = False
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+
+class PhaseProfiler:
+    """Acumula tiempos y memoria por fase.
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        Activa ``tracemalloc`` para medir el pico de memoria de cada fase.
+    cprofile : bool, optional
+        Captura además un perfil ``cProfile`` entre :meth:`start` y :meth:`stop`.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory=True, cprofile=False):
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profile = None
+        self._started_tracing = False
+        self._start_wall = None
+        self._total_wall = None
+        # Threads with an open phase, and a counter bumped whenever one starts
+        self._busy_threads = {}
+        self._overlap_epoch = 0
+        self._run_peak = 0
+        if cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+
+    def start(self):
+        """Start memory tracing and, if requested, ``cProfile``."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self._profile is not None:
+            self._profile.enable()
+        self._start_wall = time.perf_counter()
+        return self
+
+    def stop(self):
+        """Stop every collector started by :meth:`start`."""
+        if self._start_wall is not None:
+            self._total_wall = time.perf_counter() - self._start_wall
+        if self._profile is not None:
+            self._profile.disable()
+        if tracemalloc.is_tracing():
+            self._note_run_peak()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _note_run_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            self._run_peak = max(self._run_peak, peak)
+        return peak
+
+    def _enter_thread(self):
+        """Register an open phase of this thread; ``True`` if others are open."""
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._busy_threads.get(ident, 0)
+            if not depth:
+                self._overlap_epoch += 1
+            self._busy_threads[ident] = depth + 1
+            return len(self._busy_threads) > 1, self._overlap_epoch
+
+    def _leave_thread(self):
+        """Unregister an open phase; ``True`` if other threads have open phases."""
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._busy_threads.pop(ident) - 1
+            if depth:
+                self._busy_threads[ident] = depth
+            return len(self._busy_threads) > (1 if depth else 0), self._overlap_epoch
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Mide el bloque como la fase ``name``."""
+        stack = self._stack()
+        shared, epoch = self._enter_thread()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            peak = self._note_run_peak()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            if not shared:
+                # The peak is process-wide: only reset it when no other
+                # thread is measuring a phase
+                tracemalloc.reset_peak()
+        entry = {
+            'name': name,
+            'wall': time.perf_counter(),
+            'cpu': time.thread_time(),
+            'peak': 0,
+            'children': 0.0,
+        }
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - entry['wall']
+            cpu = time.thread_time() - entry['cpu']
+            peak = max(entry['peak'], self._note_run_peak()) if tracing else 0
+            stack.pop()
+            still_shared, end_epoch = self._leave_thread()
+            # Another thread opened a phase meanwhile, or one was already open
+            overlapped = shared or still_shared or end_epoch != epoch
+            parent = stack[-1]['name'] if stack else None
+            if stack:
+                stack[-1]['children'] += wall
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            self._add(name, parent, wall, wall - entry['children'], cpu, peak, overlapped)
+
+    def _add(self, name, parent, wall, self_wall, cpu, peak, overlapped=False):
+        with self._lock:
+            agg = self.phases.setdefault(name, {
+                'count': 0, 'wall_s': 0.0, 'self_wall_s': 0.0, 'cpu_s': 0.0,
+                'max_wall_s': 0.0, 'peak_kb': 0.0, 'peak_overlapped': 0, 'parents': [],
+            })
+            agg['count'] += 1
+            agg['peak_overlapped'] += 1 if overlapped else 0
+            agg['wall_s'] += wall
+            agg['self_wall_s'] += self_wall
+            agg['cpu_s'] += cpu
+            agg['max_wall_s'] = max(agg['max_wall_s'], wall)
+            agg['peak_kb'] = max(agg['peak_kb'], peak / 1024)
+            if parent and parent not in agg['parents']:
+                agg['parents'].append(parent)
+
+    def summary(self, top_functions=25):
+        """Devuelve el perfil como diccionario serializable."""
+        with self._lock:
+            phases = {k: dict(v) for k, v in self.phases.items()}
+            run_peak = self._run_peak
+        for agg in phases.values():
+            for field in ('wall_s', 'self_wall_s', 'cpu_s', 'max_wall_s', 'peak_kb'):
+                agg[field] = round(agg[field], 4)
+        data = {
+            'total_wall_s': round(self._total_wall, 4) if self._total_wall is not None else None,
+            'peak_kb': round(run_peak / 1024, 4),
+            'phases': phases,
+        }
+        if self._profile is not None:
+            data['cprofile_top'] = self._top_functions(top_functions)
+        return data
+
+    def _top_functions(self, limit):
+        import pstats
+
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                'function': f'{filename}:{line}({func})',
+                'calls': nc,
+                'total_s': round(tt, 4),
+                'cumulative_s': round(ct, 4),
+            })
+        rows.sort(key=lambda r: r['cumulative_s'], reverse=True)
+        return rows[:limit]
+
+    def write_json(self, path):
+        """Write :meth:`summary` to ``path``; ``cProfile`` stats go to ``<path>.pstats``."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(path + '.pstats')
@@ -0,0 +1,225 @@
+"""Exportador de métricas en formato de texto de Prometheus.
+
+Las métricas se generan a partir del estado vivo de :mod:`scheduler`: cada vez
+que una familia de comprobaciones se refresca en segundo plano se reconstruye
+la respuesta completa y se guarda en memoria. Las peticiones a ``/metrics``
+solo devuelven esa copia, por lo que su latencia es constante y nunca generan
+llamadas a vCenter.
+"""
+
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 'unknown' marks indicators whose data was not collected (see
+# collection_plan); other states have no sample rather than a made-up value
+STATUS_VALUES = {'unknown': -1, 'ok': 0, 'warning': 1, 'critical': 2}
+
+HOST_METRICS = [
+    ('cpu_usage', 'vmware_host_cpu_usage_mhz', 'Host CPU usage in MHz'),
+    ('memory_usage', 'vmware_host_memory_usage_mb', 'Host memory usage in MB'),
+    ('cpu_usage_pct', 'vmware_host_cpu_usage_percent', 'Host CPU usage percentage'),
+    ('memory_usage_pct', 'vmware_host_memory_usage_percent', 'Host memory usage percentage'),
+    ('num_vms', 'vmware_host_vms', 'Virtual machines registered on the host'),
+    ('network_usage_kbps', 'vmware_host_network_usage_kbps', 'Host network usage in KB/s'),
+    ('cpu_cores', 'vmware_host_cpu_cores', 'Physical CPU cores'),
+    ('avg_cpu_ready_ms', 'vmware_host_avg_cpu_ready_ms', 'Average CPU ready of the host VMs in ms'),
+]
+
+VM_METRICS = [
+    ('cpu_ready_ms', 'vmware_vm_cpu_ready_ms', 'VM CPU ready in ms'),
+    ('iops', 'vmware_vm_iops', 'VM disk operations per second'),
+    ('net_throughput_kbps', 'vmware_vm_net_throughput_kbps', 'VM network throughput in KB/s'),
+    ('ballooned_memory_mb', 'vmware_vm_ballooned_memory_mb', 'VM ballooned memory in MB'),
+]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return 1 if value else 0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def sample(self, name, help_text, labels, value, kind='gauge'):
+        value = _number(value)
+        if value is None:
+            return
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f'# HELP {name} {help_text}')
+            self.lines.append(f'# TYPE {name} {kind}')
+        self.lines.append(f'{name}{labels} {value:g}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render_metrics(hosts_data, vm_data, report_data=None, extra=None):
+    """Genera el texto de exposición de Prometheus.
+
+    Parameters
+    ----------
+    hosts_data : list of dict
+        Registros de host con el formato de ``VMwareHealthCheck.collect``.
+    vm_data : list of dict
+        Lista plana de VMs; se usa si los hosts no incluyen ``vms``.
+    report_data : dict, optional
+        Resultado de ``_build_report_data`` para exportar puntuaciones e
+        indicadores de salud.
+    extra : dict, optional
+        Métricas adicionales ``nombre -> valor`` sin etiquetas.
+    """
+    out = _Writer()
+    hosts_with_vms = set()
+    datastores = {}
+    for host in hosts_data:
+        name = host.get('name')
+        perf = host.get('performance', {})
+        for key, metric, help_text in HOST_METRICS:
+            if key in perf:
+                out.sample(metric, help_text, _labels(host=name), perf[key])
+        for ds in perf.get('datastores', []):
+            if isinstance(ds, dict) and ds.get('name') not in datastores:
+                datastores[ds.get('name')] = ds
+        for vm in host.get('vms', []):
+            hosts_with_vms.add(vm['name'])
+            for key, metric, help_text in VM_METRICS:
+                out.sample(metric, help_text, _labels(vm=vm['name'], host=name),
+                           vm['metrics'].get(key) or 0)
+    for vm in vm_data or []:
+        if vm['name'] in hosts_with_vms:
+            continue
+        for key, metric, help_text in VM_METRICS:
+            out.sample(metric, help_text, _labels(vm=vm['name'], host=''),
+                       vm['metrics'].get(key) or 0)
+
+    for name, ds in sorted(datastores.items(), key=lambda kv: str(kv[0])):
+        labels = _labels(datastore=name)
+        out.sample('vmware_datastore_capacity_gb', 'Datastore capacity in GB', labels, ds.get('capacity_gb'))
+        out.sample('vmware_datastore_free_gb', 'Datastore free space in GB', labels, ds.get('free_gb'))
+        out.sample('vmware_datastore_usage_percent', 'Datastore usage percentage', labels, ds.get('usage_pct'))
+
+    if report_data:
+        out.sample('vmware_health_score', 'Overall health score (0-5)', '', report_data.get('health_score'))
+        for cat in report_data.get('categories', []):
+            out.sample('vmware_category_score', 'Category score (0-100)',
+                       _labels(category=cat['name']), cat['score'])
+        for ind in report_data.get('indicators', []):
+            out.sample('vmware_health_indicator',
+                       'Health indicator state (-1=unknown, 0=ok, 1=warning, 2=critical)',
+                       _labels(indicator=ind['label']), STATUS_VALUES.get(ind.get('status')))
+
+    for name, value in (extra or {}).items():
+        out.sample(name, name.replace('_', ' '), '', value)
+    return out.text()
+
+
+class MetricsExporter:
+    """Servidor HTTP que publica la última instantánea de métricas.
+
+    Parameters
+    ----------
+    scheduler : CollectionScheduler
+        Planificador que refresca el estado vivo en segundo plano.
+    address : str, optional
+        Dirección de escucha; por defecto solo local.
+    port : int, optional
+        Puerto de escucha (``0`` elige uno libre).
+    """
+
+    def __init__(self, scheduler, address='127.0.0.1', port=9272):
+        self.scheduler = scheduler
+        self.address = address
+        self.port = port
+        self.payload = None
+        self.refreshed_at = None
+        self._server = None
+        self._thread = None
+        previous = scheduler.on_refresh
+
+        def on_refresh(family, state):
+            if previous:
+                previous(family, state)
+            self.refresh()
+        scheduler.on_refresh = on_refresh
+
+    def refresh(self):
+        """Rebuild the cached payload from the scheduler state."""
+        state = self.scheduler.state
+        if not state.is_complete(self.scheduler.intervals):
+            return
+        start = time.perf_counter()
+        try:
+            hosts_data, all_vms, data = state.report_data(self.scheduler.checker)
+        except Exception as exc:
+            logger.error("Failed to build metrics snapshot: %s", exc)
+            return
+        self.refreshed_at = time.time()
+        extra = {
+            'vmware_exporter_last_refresh_timestamp_seconds': self.refreshed_at,
+            'vmware_exporter_refresh_duration_seconds': time.perf_counter() - start,
+        }
+        # Swapping the reference is atomic, scrapes never see a partial payload
+        self.payload = render_metrics(hosts_data, all_vms, data, extra).encode('utf-8')
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                payload = exporter.payload
+                if payload is None:
+                    self.send_error(503, 'No data collected yet')
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug("exporter: " + format, *args)
+
+        return Handler
+
+    def start(self):
+        """Start the background collection and the HTTP server."""
+        self._server = ThreadingHTTPServer((self.address, self.port), self._handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics-exporter', daemon=True)
+        self._thread.start()
+        self.scheduler.start()
+        logger.info("Serving metrics on http://%s:%d/metrics", self.address, self.port)
+        return self
+
+    def stop(self):
+        """Stop the HTTP server and the scheduler."""
+        self.scheduler.stop()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
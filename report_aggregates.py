@@ -0,0 +1,328 @@
+"""Agregados incrementales de las partes del informe.
+
+:class:`ReportAggregates` recibe los registros de host y de VM de uno en uno
+(:meth:`~ReportAggregates.add_host`, :meth:`~ReportAggregates.add_vm`) y
+mantiene sumas, indicadores booleanos y listados Top 10 acotados, de modo que
+al terminar la recopilación las partes del informe (resumen, puntuaciones,
+uso, indicadores y listados) se obtienen sin volver a recorrer los datos.
+
+Es la única implementación de esas partes: ``VMwareHealthCheck`` la alimenta
+con las listas completas (``_build_report_data``) y
+``streaming_report.StreamingReport`` con cada host en cuanto se recopila. El
+resultado es el mismo en ambos casos, también en el orden de los empates de
+los listados. Las VMs duplicadas y las copias de seguridad siguen viniendo de
+``VMwareHealthCheck.folder_inconsistencies`` y ``backup_config_check``, que
+:meth:`ReportAggregates.indicators` recibe ya calculadas.
+"""
+
+import datetime
+import heapq
+
+TOP_N = 10
+# Candidates buffered before folding them into a Top N list
+_FOLD_SIZE = 256
+_TOOLS_OK = (None, 'toolsOk', 'guestToolsRunning')
+
+
+def status_from_score(score):
+    if score >= 80:
+        return 'ok'
+    elif score >= 60:
+        return 'warning'
+    return 'critical'
+
+
+class TopN:
+    """Los ``n`` mayores (o menores) elementos vistos hasta ahora.
+
+    Equivale a ``sorted(items, key=key, reverse=largest)[:n]`` sobre todos los
+    elementos añadidos, incluido el orden de los empates.
+    """
+
+    def __init__(self, key, n=TOP_N, largest=True):
+        self.key = key
+        self.n = n
+        self.largest = largest
+        self._items = []
+        self._pending = []
+
+    def add(self, item):
+        self._pending.append(item)
+        if len(self._pending) >= _FOLD_SIZE:
+            self._fold()
+
+    def _fold(self):
+        select = heapq.nlargest if self.largest else heapq.nsmallest
+        # Items kept so far precede the pending ones, as in the full list
+        self._items = select(self.n, self._items + self._pending, key=self.key)
+        self._pending = []
+
+    def items(self):
+        if self._pending:
+            self._fold()
+        return list(self._items)
+
+
+class ReportAggregates:
+    """Estado acumulado de las partes de ``VMwareHealthCheck.REPORT_PARTS``."""
+
+    def __init__(self):
+        self.hosts = 0
+        self.vms = 0
+        # hosts
+        self.uptime_seconds = 0
+        self.alerts = 0
+        self.sla_violated = 0
+        self.datastores_count = 0
+        self.networks_count = 0
+        self.usage_sum = 0
+        self.usage_count = 0
+        self.insecure_hosts = 0
+        self.ha_all = True
+        self.drs_all = True
+        self.resource_pools = 0
+        self.zombie_vmdks = 0
+        self.ntp_ok = True
+        self.update_ok = True
+        self.storage_warn = False
+        self.ipv6_enabled = False
+        # hosts whose IPv6 state was not collected (see ``collection_plan``)
+        self.ipv6_unknown = 0
+        self.total_pcpu = 0
+        self.iscsi_rr = True
+        self.dns_ok = True
+        self.ssh = False
+        self.cpu_hosts = []
+        self.ram_hosts = []
+        self.datastore_usage = []
+        self.top_datastores = TopN(lambda x: x.get('capacity_gb') or 0)
+        # vms
+        self.cpu_ready_sum = 0
+        self.insecure_vms = 0
+        self.snapshots = False
+        self.tools_warning = False
+        self.ballooning = False
+        self.total_vcpu = 0
+        self.top_cpu_ready = TopN(lambda x: x['metrics'].get('cpu_ready_ms') or 0)
+        self.top_ram = TopN(lambda x: x['metrics'].get('mem_usage_pct') or 0)
+        self.top_iops = TopN(lambda x: x['metrics'].get('iops') or 0)
+        self.top_network = TopN(lambda x: x['metrics'].get('net_throughput_kbps') or 0)
+        self.top_disk_free = TopN(lambda x: x['free_pct'], largest=False)
+
+    @classmethod
+    def from_data(cls, hosts_data, vm_data):
+        """Agrega de una vez unas listas completas de hosts y VMs."""
+        aggregates = cls()
+        for host in hosts_data:
+            aggregates.add_host(host)
+        for vm in vm_data:
+            aggregates.add_vm(vm)
+        return aggregates
+
+    def add_host_record(self, host):
+        """Añade un registro de ``collect`` junto con sus VMs."""
+        self.add_host(host)
+        for vm in host.get('vms', []):
+            self.add_vm(vm)
+
+    def add_host(self, h):
+        self.hosts += 1
+        runtime = h.get('runtime', {})
+        perf = h.get('performance', {})
+        security = h.get('security', {})
+        services = security.get('services', {})
+        cluster = h.get('cluster', {})
+        datastores = perf.get('datastores', [])
+
+        self.uptime_seconds += runtime.get('uptime_seconds', 0)
+        self.alerts += runtime.get('alert_count', 0)
+        if runtime.get('sla_violations'):
+            self.sla_violated += 1
+        self.datastores_count += len(datastores)
+        self.networks_count += len(h.get('best_practice', {}).get('network', []))
+
+        for ds in datastores:
+            self.usage_sum += ds['usage_pct']
+            self.usage_count += 1
+            self.datastore_usage.append({'name': ds.get('name'), 'percent': int(ds.get('usage_pct', 0))})
+            self.top_datastores.add(ds)
+        if services.get('ssh'):
+            self.insecure_hosts += 1
+            self.ssh = True
+        if services.get('esxi_shell'):
+            self.insecure_hosts += 1
+        self.ha_all = self.ha_all and bool(cluster.get('ha_enabled'))
+        self.drs_all = self.drs_all and bool(cluster.get('drs_enabled'))
+        self.resource_pools += h.get('resource_pools', 0)
+        self.zombie_vmdks += h.get('zombie_vmdks', 0)
+        self.ntp_ok = self.ntp_ok and bool(h.get('ntp_ok'))
+        self.update_ok = self.update_ok and bool(h.get('update_ok', True))
+        self.storage_warn = self.storage_warn or bool(h.get('storage_warn'))
+        self.ipv6_enabled = self.ipv6_enabled or bool(security.get('ipv6_enabled'))
+        if 'ipv6_enabled' not in security:
+            self.ipv6_unknown += 1
+        self.total_pcpu += perf.get('cpu_cores', 0)
+        self.iscsi_rr = self.iscsi_rr and bool(h.get('iscsi_rr', True))
+        self.dns_ok = self.dns_ok and bool(h.get('dns_ok', True))
+
+        cpu_pct = perf.get('cpu_usage_pct', 0)
+        mem_pct = perf.get('memory_usage_pct', 0)
+        mem_used_gb = perf.get('memory_usage', 0) / 1024
+        self.cpu_hosts.append({'name': h.get('name'), 'percent': int(cpu_pct)})
+        self.ram_hosts.append({'name': h.get('name'), 'percent': int(mem_pct), 'value': f"{mem_used_gb:.1f}GB"})
+
+    def add_vm(self, vm):
+        self.vms += 1
+        metrics = vm['metrics']
+        self.cpu_ready_sum += metrics.get('cpu_ready_ms') or 0
+        if metrics.get('has_snapshot'):
+            self.insecure_vms += 1
+            self.snapshots = True
+        if metrics.get('tools_status') not in _TOOLS_OK:
+            self.insecure_vms += 1
+            self.tools_warning = True
+        if (metrics.get('ballooned_memory_mb') or 0) > 0:
+            self.ballooning = True
+        self.total_vcpu += metrics.get('num_cpu', 0)
+
+        if metrics.get('power_state') == 'poweredOn':
+            self.top_cpu_ready.add(vm)
+            self.top_ram.add(vm)
+            self.top_iops.add(vm)
+            self.top_network.add(vm)
+            free_pct = metrics.get('disk_free_pct')
+            if free_pct is not None:
+                self.top_disk_free.add({'name': vm['name'], 'free_pct': free_pct})
+
+    # -- report parts ----------------------------------------------------
+    @property
+    def avg_cpu_ready(self):
+        return self.cpu_ready_sum / self.vms if self.vms else 0
+
+    def summary(self, hosts_data, vm_data):
+        """Datos generales del entorno: tiempo activo, recuentos y fecha."""
+        avg_uptime_days = self.uptime_seconds / max(self.hosts, 1) / 86400
+        # Share of hosts without outages in the event window
+        sla = 100 * (1 - self.sla_violated / self.hosts) if self.hosts else 100
+        return {
+            'uptime': f"{int(avg_uptime_days)} días",
+            'alerts': self.alerts,
+            'sla': f"{round(sla, 1):g}%",
+            'hosts': hosts_data,
+            'vms': vm_data,
+            'datastores_count': self.datastores_count,
+            'networks_count': self.networks_count,
+            'report_date': datetime.datetime.utcnow().strftime('%d-%m-%Y'),
+        }
+
+    def scores(self):
+        """Puntuación por categoría y puntuación global."""
+        performance_score = max(0, 100 - min(self.avg_cpu_ready, 200) / 2)
+        avg_usage = self.usage_sum / self.usage_count if self.usage_count else 0
+        storage_score = max(0, 100 - avg_usage)
+        security_score = max(0, 100 - (self.insecure_hosts + self.insecure_vms) * 5)
+        if self.ha_all and self.drs_all:
+            availability_score = 100
+        elif self.ha_all or self.drs_all:
+            availability_score = 70
+        else:
+            availability_score = 40
+
+        categories = [
+            {'name': 'Rendimiento', 'score': int(performance_score), 'status': status_from_score(performance_score), 'icon': 'fa-solid fa-tachometer-alt'},
+            {'name': 'Almacenamiento', 'score': int(storage_score), 'status': status_from_score(storage_score), 'icon': 'fa-solid fa-hdd'},
+            {'name': 'Seguridad', 'score': int(security_score), 'status': status_from_score(security_score), 'icon': 'fa-solid fa-shield'},
+            {'name': 'Disponibilidad', 'score': int(availability_score), 'status': status_from_score(availability_score), 'icon': 'fa-solid fa-plug-circle-bolt'},
+        ]
+
+        avg_cat = sum(c['score'] for c in categories) / len(categories)
+        health_score = round(avg_cat / 20, 1)
+        if health_score >= 4.5:
+            health_state = 'optimal'
+            health_msg = 'Óptimo'
+        elif health_score >= 3:
+            health_state = 'warning'
+            health_msg = 'Estable con Advertencias'
+        else:
+            health_state = 'critical'
+            health_msg = 'Crítico'
+
+        return {
+            'health_score': health_score,
+            'health_state': health_state,
+            'health_message': health_msg,
+            'global_state': health_msg,
+            'categories': categories,
+        }
+
+    def usage(self):
+        """Barras de uso de CPU, RAM y datastores por host."""
+        return {'cpu_hosts': list(self.cpu_hosts), 'ram_hosts': list(self.ram_hosts),
+                'datastore_usage': list(self.datastore_usage)}
+
+    def indicators(self, licenses, folder_dups=(), backups=0):
+        """Indicadores de salud, riesgos y prioridades.
+
+        ``licenses`` son las licencias asignadas, que se consultan a vCenter;
+        ``folder_dups`` y ``backups`` son los resultados de
+        ``VMwareHealthCheck.folder_inconsistencies`` y
+        ``VMwareHealthCheck.backup_config_check``.
+        """
+        avg_ready = self.avg_cpu_ready
+        resource_pools = self.resource_pools
+        zombie_count = self.zombie_vmdks
+        cpu_ratio = self.total_vcpu / self.total_pcpu if self.total_pcpu else 0
+
+        cpu_status = 'ok' if avg_ready < 100 else 'warning' if avg_ready < 150 else 'critical'
+        ratio_status = 'ok' if cpu_ratio < 4 else 'warning' if cpu_ratio < 8 else 'critical'
+        if self.ipv6_enabled:
+            ipv6 = {'status': 'warning', 'text': 'Enabled'}
+        elif self.ipv6_unknown:
+            # Not collected for some host: "Disabled" would be a guess
+            ipv6 = {'status': 'unknown', 'text': 'Unknown'}
+        else:
+            ipv6 = {'status': 'ok', 'text': 'Disabled'}
+        ipv6 = {'icon': 'fa-solid fa-network-wired', 'label': 'IPv6', **ipv6}
+
+        indicators = [
+            {'icon': 'fa-solid fa-shield-halved', 'label': 'HA', 'status': 'ok' if self.ha_all else 'critical', 'text': 'Enabled' if self.ha_all else 'Disabled'},
+            {'icon': 'fa-solid fa-arrows-to-circle', 'label': 'DRS', 'status': 'ok' if self.drs_all else 'critical', 'text': 'Enabled' if self.drs_all else 'Disabled'},
+            {'icon': 'fa-solid fa-camera', 'label': 'Snapshots', 'status': 'warning' if self.snapshots else 'ok', 'text': 'Warning' if self.snapshots else 'OK'},
+            {'icon': 'fa-solid fa-wrench', 'label': 'VMware Tools', 'status': 'warning' if self.tools_warning else 'ok', 'text': 'Warning' if self.tools_warning else 'OK'},
+            {'icon': 'fa-solid fa-terminal', 'label': 'SSH', 'status': 'warning' if self.ssh else 'ok', 'text': 'Warning' if self.ssh else 'OK'},
+            {'icon': 'fa-solid fa-layer-group', 'label': 'Resource Pools', 'status': 'ok' if resource_pools else 'warning', 'text': resource_pools if resource_pools else 'None'},
+            {'icon': 'fa-solid fa-folder-tree', 'label': 'Folders', 'status': 'warning' if folder_dups else 'ok', 'text': f"{len(folder_dups)} dup" if folder_dups else 'OK'},
+            {'icon': 'fa-solid fa-skull-crossbones', 'label': 'Zombie VMDKs', 'status': 'critical' if zombie_count else 'ok', 'text': zombie_count if zombie_count else '0'},
+            {'icon': 'fa-solid fa-clock', 'label': 'NTP', 'status': 'ok' if self.ntp_ok else 'warning', 'text': 'Configured' if self.ntp_ok else 'Missing'},
+            {'icon': 'fa-solid fa-id-card', 'label': 'Licensing', 'status': 'ok' if licenses else 'critical', 'text': 'OK' if licenses else 'Missing'},
+            {'icon': 'fa-solid fa-floppy-disk', 'label': 'Backups', 'status': 'ok' if backups else 'warning', 'text': 'Configured' if backups else 'None'},
+            {'icon': 'fa-solid fa-microchip', 'label': 'CPU Ready', 'status': cpu_status, 'text': f"{int(avg_ready)}ms"},
+            {'icon': 'fa-solid fa-expand', 'label': 'Ballooning', 'status': 'warning' if self.ballooning else 'ok', 'text': 'Detected' if self.ballooning else 'None'},
+            {'icon': 'fa-solid fa-download', 'label': 'Updates', 'status': 'ok' if self.update_ok else 'warning', 'text': 'Compliant' if self.update_ok else 'Outdated'},
+            {'icon': 'fa-solid fa-database', 'label': 'Storage', 'status': 'critical' if self.storage_warn else 'ok', 'text': 'Full' if self.storage_warn else 'OK'},
+            ipv6,
+            {'icon': 'fa-solid fa-divide', 'label': 'vCPU/pCPU', 'status': ratio_status, 'text': f"{cpu_ratio:.1f}:1"},
+            {'icon': 'fa-solid fa-route', 'label': 'Round Robin', 'status': 'ok' if self.iscsi_rr else 'warning', 'text': 'OK' if self.iscsi_rr else 'Check'},
+            {'icon': 'fa-solid fa-globe', 'label': 'DNS', 'status': 'ok' if self.dns_ok else 'warning', 'text': 'OK' if self.dns_ok else 'Mismatch'},
+        ]
+
+        # Extract main risks and priorities from indicators
+        risks = [i['label'] for i in indicators if i.get('status') == 'critical']
+        priorities = [i['label'] for i in indicators if i.get('status') == 'warning']
+        return {
+            'indicators': indicators,
+            'risks': risks,
+            'priorities': priorities,
+            'key_risks': ', '.join(risks[:3]) if risks else 'Ninguno',
+        }
+
+    def top_lists(self):
+        """Listados Top 10 de VMs y datastores."""
+        return {
+            'top_cpu_ready': self.top_cpu_ready.items(),
+            'top_ram': self.top_ram.items(),
+            'datastores': self.top_datastores.items(),
+            'top_disk_free': self.top_disk_free.items(),
+            'top_iops': self.top_iops.items(),
+            'top_network': self.top_network.items(),
+        }
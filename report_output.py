@@ -0,0 +1,149 @@
+"""Escritura de los informes: minificado y copias precomprimidas.
+
+Antes de escribirse, el HTML renderizado se minifica de forma conservadora:
+se eliminan los comentarios, se colapsan los espacios y se compacta el CSS
+de los bloques ``<style>``. Se respetan ``<pre>``, ``<textarea>`` y
+``<script>``. Opcionalmente se escriben a la vez ``informe.html.gz`` y
+``informe.html.br`` (si está instalado ``brotli``) para servirlos directamente
+desde un servidor web (``gzip_static``/``brotli_static`` en nginx). El
+contenido se escribe por bloques en el archivo y en los compresores, sin
+construir en memoria las versiones comprimidas.
+"""
+
+import gzip
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+COMPRESSIONS = ('gz', 'br')
+
+_PROTECTED_RE = re.compile(
+    r'(<(pre|textarea|script|style)\b[^>]*>.*?</\2\s*>)', re.S | re.I
+)
+_COMMENT_RE = re.compile(r'<!--(?!\[if|<!).*?-->', re.S)
+_SPACE_RE = re.compile(r'\s+')
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON_RE = re.compile(r'(?<=[\w)%-])\s*:\s*(?=[^{};]*;|[^{};]*})')
+
+
+def minify_css(css):
+    """Elimina comentarios y espacios innecesarios de una hoja de estilos."""
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _SPACE_RE.sub(' ', css)
+    css = _CSS_PUNCT_RE.sub(r'\1', css)
+    css = _CSS_COLON_RE.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+
+def _minify_block(match):
+    block = match.group(1)
+    if match.group(2).lower() != 'style':
+        return block
+    open_end = block.index('>') + 1
+    close_start = block.lower().rindex('</style')
+    return block[:open_end] + minify_css(block[open_end:close_start]) + block[close_start:]
+
+
+def minify_html(html):
+    """Minifica ``html`` sin cambiar cómo se muestra.
+
+    Los espacios en blanco consecutivos se reducen a uno (no se eliminan entre
+    etiquetas, ya que pueden separar elementos en línea).
+    """
+    out = []
+    pos = 0
+    for match in _PROTECTED_RE.finditer(html):
+        text = _COMMENT_RE.sub('', html[pos:match.start()])
+        out.append(_SPACE_RE.sub(' ', text))
+        out.append(_minify_block(match))
+        pos = match.end()
+    out.append(_SPACE_RE.sub(' ', _COMMENT_RE.sub('', html[pos:])))
+    return ''.join(out).strip()
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        try:
+            import brotlicffi as brotli
+        except ImportError:
+            return None
+    return brotli
+
+
+class _BrotliWriter:
+    def __init__(self, path, brotli):
+        self._file = open(path, 'wb')
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=11)
+
+    def write(self, data):
+        self._file.write(self._compressor.process(data))
+
+    def close(self):
+        self._file.write(self._compressor.finish())
+        self._file.close()
+
+
+def _open_compressed(path, kind):
+    if kind == 'gz':
+        # mtime=0 keeps the file identical for identical reports
+        return gzip.GzipFile(filename='', mode='wb', fileobj=open(path, 'wb'),
+                             compresslevel=9, mtime=0)
+    brotli = _brotli()
+    if brotli is None:
+        logger.warning("brotli is not installed; %s.br not written", path[:-3])
+        return None
+    return _BrotliWriter(path, brotli)
+
+
+def write_html(path, html, minify=True, precompress=()):
+    """Escribe ``html`` en ``path`` y, si se indica, sus copias comprimidas.
+
+    Parameters
+    ----------
+    path : str
+        Archivo HTML de salida.
+    html : str or iterable of str
+        Documento completo o bloques (por ejemplo ``template.generate()``);
+        los bloques no se minifican.
+    minify : bool, optional
+        Aplica :func:`minify_html` si ``html`` es una cadena.
+    precompress : iterable of str, optional
+        Formatos de las copias: ``'gz'`` y/o ``'br'``.
+
+    Returns
+    -------
+    list of str
+        Rutas escritas.
+    """
+    if isinstance(html, str):
+        if minify:
+            html = minify_html(html)
+        chunks = (html[i:i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE))
+    else:
+        chunks = html
+    written = [path]
+    streams = []
+    try:
+        for kind in precompress:
+            stream = _open_compressed(f'{path}.{kind}', kind)
+            if stream is not None:
+                streams.append(stream)
+                written.append(f'{path}.{kind}')
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                data = chunk.encode('utf-8')
+                for stream in streams:
+                    stream.write(data)
+    finally:
+        for stream in streams:
+            fileobj = getattr(stream, 'fileobj', None)
+            stream.close()
+            if fileobj is not None:
+                fileobj.close()
+    return written
@@ -0,0 +1,353 @@
+"""Generación de informes como un grafo de productores de datos.
+
+Cada productor calcula un grupo de variables de plantilla (puntuaciones,
+indicadores, listados Top 10, gráfico, secciones de IA...) y declara de qué
+otros productores depende. Antes de renderizar se obtienen las variables que
+usa la plantilla a partir del AST de Jinja2 (``jinja2.meta``) y solo se
+ejecutan los productores que las proporcionan y sus dependencias; los que no
+dependen entre sí se ejecutan en paralelo en un pool de hilos. Así
+``template.html`` no construye indicadores (ni consulta licencias a vCenter) y
+``template_compact.html`` no genera ningún gráfico.
+
+Si el comprobador tiene una :class:`section_cache.SectionCache`, las
+secciones de IA y los gráficos SVG cuyos datos no han cambiado desde la
+ejecución anterior se reutilizan en lugar de generarse de nuevo.
+"""
+
+import contextlib
+import importlib
+import logging
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from section_cache import cached_section
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_RE = re.compile(r'\{\{(.*?)\}\}|\{%(.*?)%\}', re.S)
+_STRING_RE = re.compile(r'"[^"]*"|\'[^\']*\'')
+_FILTER_RE = re.compile(r'\|\s*\w+')
+_NAME_RE = re.compile(r'(?<![\w.])([A-Za-z_]\w*)')
+_KEYWORDS = {
+    'for', 'in', 'if', 'elif', 'else', 'endif', 'endfor', 'and', 'or', 'not', 'is',
+    'set', 'endset', 'true', 'false', 'none', 'True', 'False', 'None', 'loop',
+    'block', 'endblock', 'extends', 'include', 'import', 'from', 'macro',
+    'endmacro', 'call', 'endcall', 'raw', 'endraw', 'with', 'endwith', 'filter',
+    'endfilter', 'recursive', 'ignore', 'missing', 'context', 'without', 'as',
+}
+
+
+class Producer:
+    """Productor de variables de plantilla.
+
+    Parameters
+    ----------
+    name : str
+        Nombre del productor.
+    func : callable
+        Recibe un diccionario con las variables ya calculadas por sus
+        dependencias y devuelve un diccionario con las suyas.
+    provides : iterable of str
+        Variables que devuelve ``func``.
+    requires : iterable of str, optional
+        Nombres de los productores que deben ejecutarse antes.
+    phase : str, optional
+        Fase del perfil en la que se mide; ``None`` si ``func`` ya se mide.
+    """
+
+    def __init__(self, name, func, provides, requires=(), phase='aggregation'):
+        self.name = name
+        self.func = func
+        self.provides = tuple(provides)
+        self.requires = tuple(requires)
+        self.phase = phase
+
+
+def _regex_variables(source):
+    names = set()
+    for expr, stmt in _BLOCK_RE.findall(source):
+        text = _FILTER_RE.sub('', _STRING_RE.sub('', expr or stmt))
+        names.update(n for n in _NAME_RE.findall(text) if n not in _KEYWORDS)
+    return names
+
+
+def _template_source(env, template_file):
+    loader = env.loader
+    if hasattr(loader, 'get_source'):
+        try:
+            return loader.get_source(env, template_file)[0]
+        except Exception:
+            pass
+    paths = getattr(loader, 'searchpath', None) or []
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        candidate = os.path.join(path, template_file)
+        if os.path.isfile(candidate):
+            with open(candidate, encoding='utf-8') as f:
+                return f.read()
+    raise FileNotFoundError(template_file)
+
+
+def template_variables(env, template_file, _seen=None):
+    """Devuelve las variables de contexto que usa ``template_file``.
+
+    Se usa ``jinja2.meta.find_undeclared_variables`` siguiendo ``extends`` e
+    ``include``; si Jinja2 no ofrece ``meta`` se extraen con una expresión
+    regular de los bloques ``{{ }}`` y ``{% %}`` (puede incluir nombres de
+    más, nunca de menos). Devuelve ``None`` si la plantilla no puede leerse.
+    """
+    seen = _seen if _seen is not None else set()
+    if template_file in seen:
+        return set()
+    seen.add(template_file)
+    try:
+        source = _template_source(env, template_file)
+    except Exception:
+        return None
+    try:
+        from jinja2 import meta
+        ast = env.parse(source)
+    except Exception:
+        return _regex_variables(source)
+    names = set(meta.find_undeclared_variables(ast))
+    for child in meta.find_referenced_templates(ast):
+        if child is None:
+            return None  # dynamic include, the variables cannot be known
+        child_names = template_variables(env, child, seen)
+        if child_names is None:
+            return None
+        names |= child_names
+    return names
+
+
+class ReportPipeline:
+    """Ejecuta los productores necesarios para un conjunto de variables.
+
+    Si dos productores proporcionan la misma variable se usa el último
+    registrado, que debe depender del primero para que su valor prevalezca.
+    """
+
+    def __init__(self, producers, profiler=None, max_workers=None):
+        self.producers = {p.name: p for p in producers}
+        self.providers = {}
+        for producer in producers:
+            for var in producer.provides:
+                self.providers[var] = producer.name
+        self.profiler = profiler
+        self.max_workers = max_workers
+        self.ran = []
+
+    def resolve(self, variables):
+        """Nombres de los productores necesarios para ``variables`` (``None``: todos)."""
+        if variables is None:
+            return set(self.producers)
+        needed = {self.providers[v] for v in variables if v in self.providers}
+        stack = list(needed)
+        while stack:
+            for dep in self.producers[stack.pop()].requires:
+                if dep not in needed:
+                    needed.add(dep)
+                    stack.append(dep)
+        return needed
+
+    def _call(self, name, deps):
+        producer = self.producers[name]
+        phase = (self.profiler.phase(producer.phase) if self.profiler and producer.phase
+                 else contextlib.nullcontext())
+        with phase:
+            return producer.func(deps)
+
+    def run(self, variables=None, context=None, done=(), exclude=()):
+        """Devuelve el contexto con las variables de los productores ejecutados.
+
+        Parameters
+        ----------
+        variables : set of str, optional
+            Variables necesarias (``None``: todas).
+        context : dict, optional
+            Variables ya calculadas por los productores ``done`` en una
+            ejecución anterior (ver ``streaming_report.py``).
+        done : iterable of str, optional
+            Productores que no se vuelven a ejecutar.
+        exclude : iterable of str, optional
+            Productores que se dejan para una ejecución posterior.
+        """
+        done = set(done)
+        pending = self.resolve(variables) - done - set(exclude)
+        context = dict(context or {})
+        self.ran = []
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='report-producer') as pool:
+            running = {}
+            while pending or running:
+                for name in sorted(pending):
+                    if set(self.producers[name].requires) <= done:
+                        # Each producer gets its own snapshot of the context
+                        running[pool.submit(self._call, name, dict(context))] = name
+                        pending.discard(name)
+                if not running:
+                    raise ValueError(f"Unresolvable producer dependencies: {', '.join(sorted(pending))}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        context.update(future.result())
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    done.add(name)
+                    self.ran.append(name)
+        return context
+
+
+# -- producers of VMwareHealthCheck reports ---------------------------------
+
+SECURITY_LABELS = {'SSH', 'VMware Tools', 'Snapshots', 'Backups', 'Licensing', 'IPv6', 'DNS'}
+AVAILABILITY_LABELS = {'HA', 'DRS', 'NTP', 'Updates', 'Round Robin', 'vCPU/pCPU', 'Resource Pools'}
+
+
+def _score(deps, name):
+    for c in deps.get('categories', []):
+        if c.get('name') == name:
+            return c.get('score')
+    return 0
+
+
+def _performance_info(deps):
+    return {
+        'score': _score(deps, 'Rendimiento'),
+        'cpu_hosts': deps.get('cpu_hosts'),
+        'ram_hosts': deps.get('ram_hosts'),
+        'top_cpu_ready': deps.get('top_cpu_ready'),
+        'top_ram': deps.get('top_ram'),
+        'top_iops': deps.get('top_iops'),
+        'top_network': deps.get('top_network'),
+    }
+
+
+def _storage_info(deps):
+    return {
+        'score': _score(deps, 'Almacenamiento'),
+        'datastore_usage': deps.get('datastore_usage'),
+        'datastores': deps.get('datastores'),
+        'top_disk_free': deps.get('top_disk_free'),
+    }
+
+
+def _security_info(deps):
+    return {
+        'score': _score(deps, 'Seguridad'),
+        'indicators': [i for i in deps.get('indicators', []) if i.get('label') in SECURITY_LABELS],
+    }
+
+
+def _availability_info(deps):
+    return {
+        'score': _score(deps, 'Disponibilidad'),
+        'indicators': [i for i in deps.get('indicators', []) if i.get('label') in AVAILABILITY_LABELS],
+    }
+
+
+# variable -> (report_sections module, producers needed, prompt data builder)
+AI_SECTIONS = {
+    'performance_text': ('performance', ('scores', 'usage', 'top_lists'), _performance_info),
+    'storage_text': ('storage', ('scores', 'usage', 'top_lists'), _storage_info),
+    'security_text': ('security', ('scores', 'indicators'), _security_info),
+    'availability_text': ('availability', ('scores', 'indicators'), _availability_info),
+}
+
+# Sections whose prompt receives the whole report data (template_full*.html)
+AI_FULL_SECTIONS = {
+    'executive_summary': 'executive_summary',
+    'recommendations': 'recommendations',
+    'conclusions': 'conclusions',
+    'glossary': 'glossary',
+}
+
+
+def _ai_enabled(deps):
+    try:
+        from openai_connector import configure_openai
+        import openai
+
+        configure_openai()
+        return {'_ai_enabled': bool(getattr(openai, 'api_key', None))}
+    except Exception as exc:  # pragma: no cover - missing dependency or config
+        logger.error("OpenAI not available: %s", exc)
+        return {'_ai_enabled': False}
+
+
+def _ai_producer(variable, module_name, requires, info_builder, cache=None):
+    def produce(deps):
+        module = importlib.import_module(f'report_sections.{module_name}')
+        if not deps.get('_ai_enabled'):
+            return {variable: module.INTRO}
+        info = info_builder(deps)
+        try:
+            # The prompt is part of the payload so editing it regenerates the text
+            payload = {'prompt': module.PROMPT_TEMPLATE, 'data': info}
+            return {variable: cached_section(cache, variable, payload,
+                                             lambda: module.generate(info))}
+        except Exception as exc:  # pragma: no cover - external API
+            logger.error("Failed to generate %s section: %s", module_name, exc)
+            return {variable: module.INTRO}
+    return Producer(f'ai_{module_name}', produce, (variable,), ('openai',) + tuple(requires),
+                    phase='llm')
+
+
+def _chart_payload(hosts_data):
+    """Datos de los hosts que dibujan los gráficos SVG."""
+    rows = []
+    for h in hosts_data:
+        perf = h.get('performance', {})
+        rows.append([
+            h.get('name'), (h.get('cluster') or {}).get('name'),
+            perf.get('cpu_usage'), perf.get('memory_usage'),
+            [[ds.get('name'), ds.get('usage_pct')] for ds in perf.get('datastores', [])
+             if isinstance(ds, dict)],
+        ])
+    return rows
+
+
+def report_producers(checker, hosts_data, vm_data, trends=None):
+    """Productores de las plantillas de ``VMwareHealthCheck``."""
+    cache = getattr(checker, 'section_cache', None)
+    producers = []
+    part_keys = set()
+    for name, _, keys, requires in checker.REPORT_PARTS:
+        producers.append(Producer(
+            name, lambda deps, name=name: checker._report_part(name, hosts_data, vm_data, deps),
+            keys, requires,
+        ))
+        part_keys.update(keys)
+    all_parts = tuple(name for name, _, _, _ in checker.REPORT_PARTS)
+
+    def compact_payload(deps):
+        from compact_report import build_payload, encode_payload
+        return {'report_payload': encode_payload(build_payload(hosts_data, vm_data))}
+
+    producers += [
+        Producer('chart', lambda deps: {'chart': checker._create_chart(hosts_data)},
+                 ('chart',), phase=None),
+        Producer('chart_svg', lambda deps: cached_section(
+            cache, 'chart_svg', _chart_payload(hosts_data),
+            lambda: checker._create_chart_svg(hosts_data),
+        ),
+                 ('chart_svg', 'datastore_chart_svg', 'usage_histogram_svg'), phase=None),
+        Producer('trends', lambda deps: {'trends': trends or {}}, ('trends',), phase=None),
+        Producer('compact_payload', compact_payload, ('report_payload',)),
+        Producer('openai', _ai_enabled, ('_ai_enabled',), phase=None),
+    ]
+    for variable, (module_name, requires, info_builder) in AI_SECTIONS.items():
+        producers.append(_ai_producer(variable, module_name, requires, info_builder, cache))
+
+    def report_data(deps):
+        return {k: v for k, v in deps.items() if k in part_keys}
+
+    # Registered after 'texts' and depending on it, so the AI text wins
+    for variable, module_name in AI_FULL_SECTIONS.items():
+        producers.append(_ai_producer(variable, module_name, all_parts, report_data, cache))
+    return producers
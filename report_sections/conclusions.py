@@ -19,4 +19,4 @@ def generate(data, model=None):
         {"role": "system", "content": "Eres un experto en VMware. Debes redactar un informe profesional."},
         {"role": "user", "content": prompt},
     ]
-    return fetch_completion(messages, model)
+    return fetch_completion(messages, model, section="conclusions")
@@ -0,0 +1,102 @@
+"""Memoización de los datos derivados durante una ejecución.
+
+``build_text_summary``, ``generate_report``, el histórico y el informe
+multipágina parten de los mismos ``hosts_data``/``vm_data``. :class:`RunCache`
+guarda las partes de ``_build_report_data`` asociadas a la identidad de esos
+datos (el mismo objeto ``hosts_data``, el mismo número de hosts y de VMs y la
+misma versión de la caché) y las consultas globales a vCenter, como las
+licencias, que no dependen de los datos. Cualquier consumidor que reciba la
+misma recopilación reutiliza lo ya calculado.
+
+En el modo planificado los datos cambian sin que cambie el comprobador; el
+planificador llama a :meth:`RunCache.invalidate` tras cada refresco.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RunCache:
+    """Caché de datos derivados y consultas globales de una ejecución.
+
+    Los valores devueltos se comparten entre consumidores y no deben
+    modificarse.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._hosts = None
+        self._derived = {}
+        self._lookups = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _data_key(self, hosts_data, vm_data):
+        return (id(hosts_data), len(hosts_data), len(vm_data), self.version)
+
+    def derived(self, name, hosts_data, vm_data, compute):
+        """Devuelve ``compute()`` calculado una sola vez para estos datos.
+
+        Parameters
+        ----------
+        name : str
+            Nombre del valor derivado.
+        hosts_data : list of dict
+            Registros de host de los que se deriva el valor.
+        vm_data : list of dict
+            VMs de ``hosts_data``.
+        compute : callable
+            Función sin argumentos que calcula el valor.
+        """
+        key = self._data_key(hosts_data, vm_data)
+        with self._lock:
+            if self._key != key or self._hosts is not hosts_data:
+                # Other data: keep a reference so that its id is not reused
+                self._key = key
+                self._hosts = hosts_data
+                self._derived = {}
+            elif name in self._derived:
+                self.hits += 1
+                return self._derived[name]
+            self.misses += 1
+        # Computed outside the lock so independent values run in parallel
+        value = compute()
+        with self._lock:
+            if self._key == key:
+                self._derived[name] = value
+        return value
+
+    def lookup(self, name, compute):
+        """Devuelve ``compute()`` para una consulta que no depende de los datos."""
+        with self._lock:
+            if name in self._lookups:
+                self.hits += 1
+                return self._lookups[name]
+            self.misses += 1
+            version = self.version
+        value = compute()
+        with self._lock:
+            if self.version == version:
+                self._lookups[name] = value
+        return value
+
+    def invalidate(self, name=None):
+        """Descarta los valores derivados y la consulta ``name`` (todas si es ``None``).
+
+        Los valores derivados se descartan siempre, ya que pueden depender de
+        la consulta invalidada.
+        """
+        with self._lock:
+            if name is None:
+                self._lookups.clear()
+            else:
+                self._lookups.pop(name, None)
+            self._derived = {}
+            self._key = None
+            self._hosts = None
+            self.version += 1
+        logger.debug("Run cache invalidated (%s)", name or 'all')
@@ -0,0 +1,359 @@
+"""Comparación entre dos recopilaciones ("qué ha cambiado desde la semana pasada").
+
+Cada host, VM y datastore se reduce a una tupla con los campos que interesan a
+gestión del cambio (SSH, versión, snapshots, Tools, estado de energía, banda de
+ocupación del datastore...) y a una huella ``blake2b`` de esa tupla. Las
+instantáneas guardan solo estas huellas y valores, de modo que la comparación
+descarta en O(1) cada entidad sin cambios y solo examina campo a campo las que
+difieren. El resultado se muestra como texto o como un informe HTML compacto.
+
+Las instantáneas se guardan con ``--save-snapshot`` y se comparan con ``--diff``
+o directamente::
+
+    python run_diff.py semana_pasada.json.gz hoy.json.gz --output cambios.html
+"""
+
+import argparse
+import datetime
+import gzip
+import hashlib
+import html
+import json
+import sys
+
+SNAPSHOT_VERSION = 1
+
+# Fields included in each fingerprint: kind -> ((field, path), ...)
+HOST_FIELDS = (
+    ('version', ('security', 'version')),
+    ('lockdown_mode', ('security', 'lockdown_mode')),
+    ('ssh', ('security', 'services', 'ssh')),
+    ('esxi_shell', ('security', 'services', 'esxi_shell')),
+    ('ipv6_enabled', ('security', 'ipv6_enabled')),
+    ('ntp_ok', ('ntp_ok',)),
+    ('dns_ok', ('dns_ok',)),
+    ('update_ok', ('update_ok',)),
+    ('iscsi_rr', ('iscsi_rr',)),
+    ('ha_enabled', ('cluster', 'ha_enabled')),
+    ('drs_enabled', ('cluster', 'drs_enabled')),
+    ('bios_version', ('performance', 'firmware', 'bios_version')),
+    ('memory_total_gb', ('best_practice', 'memory_total_gb')),
+    ('zombie_vmdks', ('zombie_vmdks',)),
+)
+VM_FIELDS = ('power_state', 'has_snapshot', 'tools_status', 'num_cpu', 'mem_config_gb')
+DATASTORE_FIELDS = ('capacity_gb', 'usage_band')
+
+# Datastore usage thresholds (percent) that define the bands reported as changes
+USAGE_BANDS = ((90, 'critical'), (80, 'warning'))
+
+KINDS = ('host', 'vm', 'datastore')
+
+
+def usage_band(usage_pct):
+    """Devuelve ``ok``, ``warning`` o ``critical`` según la ocupación."""
+    for limit, band in USAGE_BANDS:
+        if (usage_pct or 0) >= limit:
+            return band
+    return 'ok'
+
+
+def fingerprint(values):
+    """Huella estable (entre procesos) de una tupla de valores."""
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _path(record, path):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+class Snapshot:
+    """Estado reducido de una recopilación.
+
+    Attributes
+    ----------
+    fields : dict
+        Campos comparados por tipo de entidad.
+    entities : dict
+        ``tipo -> nombre -> (huella, valores, info)``; ``info`` contiene datos
+        que se muestran pero no forman parte de la huella (host de la VM,
+        ocupación exacta del datastore).
+    """
+
+    def __init__(self, fields, entities, collected_at=None, source=None):
+        self.fields = fields
+        self.entities = entities
+        self.collected_at = collected_at
+        self.source = source
+
+    @classmethod
+    def from_collection(cls, hosts_data, vm_data=None, collected_at=None):
+        """Construye la instantánea a partir de los datos de ``collect``."""
+        host_names = [f for f, _ in HOST_FIELDS]
+        hosts, vms, datastores = {}, {}, {}
+        seen_vms = set()
+        for host in hosts_data:
+            name = host.get('name')
+            values = tuple(_path(host, path) for _, path in HOST_FIELDS)
+            hosts[name] = (fingerprint(values), values, {})
+            for vm in host.get('vms', []):
+                seen_vms.add(vm['name'])
+                vms[vm['name']] = _vm_entity(vm, name)
+            for ds in host.get('performance', {}).get('datastores', []):
+                if isinstance(ds, dict) and ds.get('name') not in datastores:
+                    datastores[ds.get('name')] = _datastore_entity(
+                        ds.get('capacity_gb'), ds.get('usage_pct')
+                    )
+        for vm in vm_data or []:
+            if vm['name'] not in seen_vms:
+                vms[vm['name']] = _vm_entity(vm, None)
+        return cls(
+            {'host': host_names, 'vm': list(VM_FIELDS), 'datastore': list(DATASTORE_FIELDS)},
+            {'host': hosts, 'vm': vms, 'datastore': datastores},
+            collected_at or datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        )
+
+    @classmethod
+    def from_history(cls, store, run=-1):
+        """Construye la instantánea de una ejecución del histórico.
+
+        Parameters
+        ----------
+        store : history_store.HistoryStore
+            Histórico abierto.
+        run : int, optional
+            Identificador de la ejecución o, si es negativo, posición desde la
+            última (``-1`` es la última).
+
+        El histórico solo guarda métricas, así que para hosts y VMs se compara
+        únicamente su presencia y para los datastores capacidad y ocupación.
+        """
+        if run < 0:
+            row = store.conn.execute(
+                'SELECT id, ts FROM runs ORDER BY ts DESC LIMIT 1 OFFSET ?', (-run - 1,)
+            ).fetchone()
+        else:
+            row = store.conn.execute('SELECT id, ts FROM runs WHERE id = ?', (run,)).fetchone()
+        if row is None:
+            raise LookupError(f'Run {run} not found in history')
+        run_id, ts = row
+        conn = store.conn
+        hosts = {
+            name: (fingerprint(()), (), {})
+            for (name,) in conn.execute('SELECT host FROM host_metrics WHERE run_id = ?', (run_id,))
+        }
+        vms = {
+            name: (fingerprint(()), (), {})
+            for (name,) in conn.execute('SELECT vm FROM vm_metrics WHERE run_id = ?', (run_id,))
+        }
+        datastores = {
+            name: _datastore_entity(capacity, usage)
+            for name, capacity, usage in conn.execute(
+                'SELECT datastore, capacity_gb, usage_pct FROM datastore_metrics WHERE run_id = ?',
+                (run_id,),
+            )
+        }
+        collected_at = datetime.datetime.utcfromtimestamp(ts).isoformat(timespec='seconds') + 'Z'
+        return cls({'host': [], 'vm': [], 'datastore': list(DATASTORE_FIELDS)},
+                   {'host': hosts, 'vm': vms, 'datastore': datastores},
+                   collected_at, source=f'history run {run_id}')
+
+    def save(self, path):
+        """Write the snapshot to ``path`` (gzip if it ends with ``.gz``)."""
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'collected_at': self.collected_at,
+            'fields': self.fields,
+            'entities': {
+                kind: {name: [fp, list(values), info] for name, (fp, values, info) in items.items()}
+                for kind, items in self.entities.items()
+            },
+        }
+        if path.endswith('.gz'):
+            f = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            f = open(path, 'w', encoding='utf-8')
+        with f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Read a snapshot written by :meth:`save`."""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        entities = {
+            kind: {name: (fp, tuple(values), info) for name, (fp, values, info) in items.items()}
+            for kind, items in data['entities'].items()
+        }
+        return cls(data['fields'], entities, data.get('collected_at'), source=path)
+
+
+def _vm_entity(vm, host):
+    metrics = vm['metrics']
+    values = tuple(metrics.get(f) for f in VM_FIELDS)
+    return fingerprint(values), values, {'host': host}
+
+
+def _datastore_entity(capacity_gb, usage_pct):
+    capacity = round(capacity_gb or 0, 1)
+    values = (capacity, usage_band(usage_pct))
+    return fingerprint(values), values, {'usage_pct': round(usage_pct or 0, 1)}
+
+
+def diff_snapshots(old, new):
+    """Compara dos instantáneas.
+
+    Returns
+    -------
+    dict
+        ``changes`` (lista de ``{kind, name, change, fields, info}`` donde
+        ``change`` es ``added``, ``removed`` o ``changed`` y ``fields`` la
+        lista de ``(campo, antes, después)``), ``counts`` por tipo y las fechas
+        de ambas instantáneas.
+    """
+    changes = []
+    counts = {}
+    for kind in KINDS:
+        before = old.entities.get(kind, {})
+        after = new.entities.get(kind, {})
+        old_fields = old.fields.get(kind, [])
+        new_fields = new.fields.get(kind, [])
+        same_fields = old_fields == new_fields
+        common = [f for f in new_fields if f in old_fields]
+        old_idx = [old_fields.index(f) for f in common]
+        new_idx = [new_fields.index(f) for f in common]
+        kind_counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+
+        for name, (fp, values, info) in after.items():
+            previous = before.get(name)
+            if previous is None:
+                changes.append({'kind': kind, 'name': name, 'change': 'added',
+                                'fields': [], 'info': info})
+                kind_counts['added'] += 1
+                continue
+            if same_fields and previous[0] == fp:
+                kind_counts['unchanged'] += 1
+                continue
+            fields = [
+                (f, previous[1][i], values[j])
+                for f, i, j in zip(common, old_idx, new_idx)
+                if previous[1][i] != values[j]
+            ]
+            if fields:
+                changes.append({'kind': kind, 'name': name, 'change': 'changed',
+                                'fields': fields, 'info': info,
+                                'previous_info': previous[2]})
+                kind_counts['changed'] += 1
+            else:
+                kind_counts['unchanged'] += 1
+        for name in before.keys() - after.keys():
+            changes.append({'kind': kind, 'name': name, 'change': 'removed',
+                            'fields': [], 'info': before[name][2]})
+            kind_counts['removed'] += 1
+        counts[kind] = kind_counts
+
+    order = {k: i for i, k in enumerate(KINDS)}
+    changes.sort(key=lambda c: (order[c['kind']], c['change'], str(c['name'])))
+    return {
+        'old': old.source or old.collected_at,
+        'old_collected_at': old.collected_at,
+        'new_collected_at': new.collected_at,
+        'counts': counts,
+        'changes': changes,
+    }
+
+
+def _describe(change):
+    parts = [f'{f}: {old!r} -> {new!r}' for f, old, new in change['fields']]
+    if change['kind'] == 'datastore' and change.get('previous_info'):
+        parts.append(f"usage_pct: {change['previous_info'].get('usage_pct')} -> "
+                     f"{change['info'].get('usage_pct')}")
+    elif change['kind'] == 'vm' and change['info'].get('host'):
+        parts.append(f"host: {change['info']['host']}")
+    return ', '.join(parts)
+
+
+def format_text(result):
+    """Resumen en texto de :func:`diff_snapshots`."""
+    lines = [f"Changes since {result['old_collected_at']} ({result['old']}):"]
+    for kind in KINDS:
+        c = result['counts'].get(kind, {})
+        lines.append(f"  {kind}: +{c.get('added', 0)} -{c.get('removed', 0)} "
+                     f"~{c.get('changed', 0)} ({c.get('unchanged', 0)} unchanged)")
+    symbols = {'added': '+', 'removed': '-', 'changed': '~'}
+    for change in result['changes']:
+        detail = _describe(change)
+        lines.append(f"{symbols[change['change']]} {change['kind']} {change['name']}"
+                     + (f": {detail}" if detail else ''))
+    return '\n'.join(lines)
+
+
+def render_html(result):
+    """Informe HTML compacto con los cambios."""
+    esc = html.escape
+    labels = {'host': 'Hosts', 'vm': 'Máquinas virtuales', 'datastore': 'Datastores'}
+    change_labels = {'added': 'Nuevo', 'removed': 'Eliminado', 'changed': 'Modificado'}
+    out = [
+        "<html><head><meta charset='utf-8'><title>VMware Health Check - Cambios</title>",
+        "<style>",
+        "body{font-family:Arial;margin:0;padding:0;display:flex;justify-content:center;}",
+        ".container{max-width:900px;width:100%;padding:20px;}",
+        "table{border-collapse:collapse;width:100%;margin-bottom:20px;}",
+        "th,td{border:1px solid #ccc;padding:4px;text-align:left;}h1,h2{color:#2c3e50;}",
+        ".added{color:#27ae60;}.removed{color:#c0392b;}.changed{color:#d35400;}",
+        "</style></head><body><div class='container'>",
+        "<h1>Cambios entre ejecuciones</h1>",
+        f"<p>{esc(str(result['old_collected_at']))} &rarr; {esc(str(result['new_collected_at']))}</p>",
+        "<table><tr><th></th><th>Nuevos</th><th>Eliminados</th><th>Modificados</th><th>Sin cambios</th></tr>",
+    ]
+    for kind in KINDS:
+        c = result['counts'].get(kind, {})
+        out.append(f"<tr><th>{labels[kind]}</th><td>{c.get('added', 0)}</td>"
+                   f"<td>{c.get('removed', 0)}</td><td>{c.get('changed', 0)}</td>"
+                   f"<td>{c.get('unchanged', 0)}</td></tr>")
+    out.append("</table>")
+    for kind in KINDS:
+        rows = [c for c in result['changes'] if c['kind'] == kind]
+        if not rows:
+            continue
+        out.append(f"<h2>{labels[kind]}</h2><table><tr><th>Nombre</th><th>Cambio</th><th>Detalle</th></tr>")
+        for c in rows:
+            out.append(f"<tr><td>{esc(str(c['name']))}</td>"
+                       f"<td class='{c['change']}'>{change_labels[c['change']]}</td>"
+                       f"<td>{esc(_describe(c))}</td></tr>")
+        out.append("</table>")
+    out.append("</div></body></html>")
+    return '\n'.join(out)
+
+
+def load_snapshot(source, history=None):
+    """Carga ``source``: un archivo de instantánea o ``history:N``."""
+    if source.startswith('history:'):
+        if history is None:
+            raise ValueError('history:N requires --history')
+        return Snapshot.from_history(history, int(source.split(':', 1)[1]))
+    return Snapshot.load(source)
+
+
+def main(argv=None):
+    """Compare two snapshot files from the command line."""
+    parser = argparse.ArgumentParser(description='Compare two health check snapshots')
+    parser.add_argument('old', help='previous snapshot')
+    parser.add_argument('new', help='current snapshot')
+    parser.add_argument('--output', help='write an HTML change report to this file')
+    args = parser.parse_args(argv)
+    result = diff_snapshots(Snapshot.load(args.old), Snapshot.load(args.new))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(render_html(result))
+    else:
+        print(format_text(result))
+    return result
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
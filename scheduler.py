@@ -0,0 +1,282 @@
+"""Recopilación continua con un intervalo de refresco por familia de comprobaciones.
+
+La configuración de seguridad cambia pocas veces al día mientras que el CPU
+Ready cambia cada minuto. :class:`CollectionScheduler` ejecuta cada familia de
+``VMwareHealthCheck.CHECK_FAMILIES`` (además de ``inventory`` y ``licensing``)
+según su propio intervalo y fusiona los resultados en un :class:`LiveState`,
+a partir del cual pueden generarse informes en cualquier momento sin lanzar
+una recopilación completa.
+"""
+
+import contextlib
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Retry delay in seconds after a failed refresh, doubled on each consecutive
+# failure and capped at the family's interval
+RETRY_DELAY = 30
+
+# Families refreshed for the whole vCenter rather than per host
+GLOBAL_FAMILIES = ('inventory', 'licensing')
+
+# Default refresh interval in seconds for each family
+DEFAULT_INTERVALS = {
+    'inventory': 3600,
+    'security': 3600,
+    'best_practice': 3600,
+    'licensing': 3600,
+    'performance': 300,
+    'vm_performance': 300,
+}
+
+
+def parse_intervals(values):
+    """Convierte opciones ``familia=segundos`` en un diccionario de intervalos."""
+    intervals = dict(DEFAULT_INTERVALS)
+    for value in values or []:
+        family, _, seconds = value.partition('=')
+        if family not in intervals or not seconds:
+            raise ValueError(f"Invalid interval '{value}'; expected FAMILY=SECONDS with "
+                             f"FAMILY in {', '.join(sorted(intervals))}")
+        intervals[family] = float(seconds)
+    return intervals
+
+
+class LiveState:
+    """Estado vivo de la infraestructura construido a partir de refrescos parciales."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.hosts = {}
+        # host name -> families merged into its record
+        self.host_families = {}
+        self.host_counts = {}
+        self.licenses = None
+        self.updated = {}
+        self.version = 0
+        self._snapshot = None
+
+    def merge_host(self, name, family, values):
+        """Fusiona en el registro de ``name`` las claves producidas por ``family``."""
+        with self._lock:
+            record = self.hosts.setdefault(name, {'name': name})
+            record.update(values)
+            self.host_families.setdefault(name, set()).add(family)
+            self.updated[family] = time.time()
+            self.version += 1
+
+    def set_inventory(self, counts):
+        """Replace the host list; ``counts`` maps host name to datastore/network counts."""
+        with self._lock:
+            for name in list(self.hosts):
+                if name not in counts:
+                    del self.hosts[name]
+                    self.host_families.pop(name, None)
+            self.host_counts = dict(counts)
+            self.updated['inventory'] = time.time()
+            self.version += 1
+
+    def set_licenses(self, licenses):
+        """Store the license keys returned by ``licensing_check``."""
+        with self._lock:
+            self.licenses = list(licenses)
+            self.updated['licensing'] = time.time()
+            self.version += 1
+
+    def is_complete(self, families):
+        """Return True once every host has data for all ``families``.
+
+        A per-host family counts only when it was merged into every host of
+        the inventory, so a host added later or whose refresh failed keeps
+        the state incomplete until it has been refreshed.
+        """
+        with self._lock:
+            if not self.hosts or not all(f in self.updated for f in families):
+                return False
+            per_host = set(families) - set(GLOBAL_FAMILIES)
+            names = self.host_counts or self.hosts
+            return all(per_host <= self.host_families.get(name, set()) for name in names)
+
+    def snapshot(self):
+        """Devuelve ``(hosts_data, all_vms, summary)`` con el estado actual.
+
+        Los datos se copian para que los informes no vean refrescos parciales.
+        Mientras no cambie :attr:`version` se devuelve la misma copia, de modo
+        que los informes y métricas generados entre dos refrescos comparten
+        los datos derivados de ``checker.cache``; no debe modificarse.
+        """
+        from vmware_healthcheck import VMwareHealthCheck
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == self.version:
+                return self._snapshot[1]
+            version = self.version
+            hosts_data = copy.deepcopy(list(self.hosts.values()))
+            counts = dict(self.host_counts)
+        all_vms = []
+        summary = {'hosts': len(hosts_data), 'vms': 0, 'datastores': 0, 'networks': 0}
+        for host in hosts_data:
+            vms = host.setdefault('vms', [])
+            if 'performance' in host:
+                host['performance']['avg_cpu_ready_ms'] = VMwareHealthCheck.avg_cpu_ready(vms)
+            for vm in vms:
+                all_vms.append({'name': vm['name'], 'metrics': vm['metrics']})
+            summary['vms'] += len(vms)
+            datastores, networks = counts.get(host['name'], (0, 0))
+            summary['datastores'] += datastores
+            summary['networks'] += networks
+        with self._lock:
+            self._snapshot = (version, (hosts_data, all_vms, summary))
+        return hosts_data, all_vms, summary
+
+    @contextlib.contextmanager
+    def _state_licenses(self, checker):
+        """Serve ``checker.licenses`` from the state while the block runs."""
+        previous = checker.licenses
+        if self.licenses is not None:
+            checker.licenses = self.licenses
+        try:
+            yield checker
+        finally:
+            checker.licenses = previous
+
+    def report_data(self, checker):
+        """Devuelve ``(hosts_data, all_vms, data)`` con ``_build_report_data`` del estado."""
+        hosts_data, all_vms, _ = self.snapshot()
+        with self._state_licenses(checker):
+            data = checker._build_report_data(hosts_data, all_vms, chart=None)
+        return hosts_data, all_vms, data
+
+    def generate_report(self, checker, output_file, **kwargs):
+        """Genera un informe HTML con el estado actual sin consultar vCenter."""
+        hosts_data, all_vms, _ = self.snapshot()
+        with self._state_licenses(checker):
+            checker.generate_report(hosts_data, all_vms, output_file, **kwargs)
+
+    def generate_reports(self, checker, outputs, **kwargs):
+        """Genera varios informes ``(plantilla, archivo)`` con el estado actual."""
+        hosts_data, all_vms, _ = self.snapshot()
+        with self._state_licenses(checker):
+            checker.generate_reports(hosts_data, all_vms, outputs, **kwargs)
+
+
+class CollectionScheduler:
+    """Planificador que refresca cada familia de comprobaciones por separado.
+
+    Parameters
+    ----------
+    checker : VMwareHealthCheck
+        Comprobador ya conectado.
+    intervals : dict, optional
+        Segundos entre refrescos por familia; ver :data:`DEFAULT_INTERVALS`.
+    state : LiveState, optional
+        Estado en el que se fusionan los resultados.
+    on_refresh : callable, optional
+        Función invocada con ``(family, state)`` tras cada refresco.
+    """
+
+    def __init__(self, checker, intervals=None, state=None, on_refresh=None):
+        self.checker = checker
+        self.intervals = dict(DEFAULT_INTERVALS)
+        self.intervals.update(intervals or {})
+        self.state = state or LiveState()
+        self.on_refresh = on_refresh
+        self.next_run = {family: 0.0 for family in self.intervals}
+        self.failures = {}
+        self._hosts = {}
+        self._counters = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, family):
+        """Ejecuta inmediatamente la familia ``family``."""
+        checker = self.checker
+        if family == 'inventory' or not self._hosts:
+            hosts = checker.get_hosts()
+            self._hosts = {h.name: h for h in hosts}
+            self.state.set_inventory({
+                name: (len(getattr(h, 'datastore', [])), len(getattr(h, 'network', [])))
+                for name, h in self._hosts.items()
+            })
+            self._counters = checker._build_perf_counter_map()
+            if family == 'inventory':
+                return
+        if family == 'licensing':
+            self.state.set_licenses(checker.licensing_check())
+            return
+        phase = 'vm_perf' if family == 'vm_performance' else 'host_checks'
+        for name, host in self._hosts.items():
+            try:
+                with checker.profiler.phase(phase):
+                    values = checker.collect_family(host, family, self._counters)
+            except Exception as exc:
+                logger.error("Failed to refresh %s on %s: %s", family, name, exc)
+                continue
+            self.state.merge_host(name, family, values)
+
+    def run_due(self, now=None):
+        """Refresca las familias vencidas y devuelve sus nombres.
+
+        Si el refresco de una familia falla (sesión caducada, corte de red...)
+        se registra el error y se reintenta tras :data:`RETRY_DELAY` segundos,
+        el doble en cada fallo consecutivo y como mucho su intervalo; las
+        demás familias y el bucle continúan.
+        """
+        now = time.monotonic() if now is None else now
+        due = sorted(
+            (f for f, t in self.next_run.items() if t <= now),
+            key=lambda f: f != 'inventory',
+        )
+        for family in due:
+            logger.info("Refreshing %s", family)
+            try:
+                self.refresh(family)
+            except Exception as exc:
+                failures = self.failures[family] = self.failures.get(family, 0) + 1
+                delay = min(self.intervals[family], RETRY_DELAY * 2 ** (failures - 1))
+                logger.error("Failed to refresh %s (%s); retrying in %ss", family, exc, delay)
+                self.next_run[family] = now + delay
+                continue
+            self.failures.pop(family, None)
+            # Licenses and report data derived from the previous state are stale
+            self.checker.cache.invalidate()
+            self.next_run[family] = now + self.intervals[family]
+            if self.on_refresh:
+                self.on_refresh(family, self.state)
+        return due
+
+    def run_forever(self, after_refresh=None):
+        """Refresca las familias vencidas hasta que se llame a :meth:`stop`.
+
+        Parameters
+        ----------
+        after_refresh : callable, optional
+            Se llama con ``time.monotonic()`` tras cada pasada (p. ej. para
+            regenerar el informe); puede devolver el instante en que quiere
+            volver a llamarse si es anterior al siguiente refresco.
+        """
+        while not self._stop.is_set():
+            self.run_due()
+            wake = min(self.next_run.values())
+            if after_refresh is not None:
+                wanted = after_refresh(time.monotonic())
+                if wanted is not None:
+                    wake = min(wake, wanted)
+            self._stop.wait(max(wake - time.monotonic(), 0.05))
+
+    def start(self):
+        """Run the scheduler in a daemon thread."""
+        self._thread = threading.Thread(target=self.run_forever, name='collection-scheduler',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the scheduler loop."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,103 @@
+"""Caché persistente de secciones del informe entre ejecuciones.
+
+Cada sección cacheable (los textos de IA y los gráficos SVG) se guarda junto
+con el hash SHA-256 de los datos de entrada con los que se generó. En la
+siguiente ejecución, si los datos de la sección producen el mismo hash se
+reutiliza el texto o fragmento guardado y no se vuelve a pedir a la IA ni a
+dibujar; solo se regeneran las secciones cuyos datos han cambiado. Se guarda
+una entrada por sección (la de la ejecución anterior), por lo que el archivo
+no crece con el tiempo.
+
+Del hash se excluyen valores que cambian en cada ejecución sin que cambie el
+entorno (:data:`VOLATILE_KEYS`), como el tiempo activo en segundos.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+VOLATILE_KEYS = frozenset({'uptime_seconds', 'boot_time', 'report_date'})
+
+
+def _stable(value):
+    if isinstance(value, dict):
+        return {k: _stable(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_stable(v) for v in value]
+    return value
+
+
+def payload_hash(payload):
+    """Hash SHA-256 de ``payload`` sin sus valores volátiles."""
+    text = json.dumps(_stable(payload), sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class SectionCache:
+    """Secciones generadas indexadas por nombre y hash de sus datos.
+
+    Parameters
+    ----------
+    path : str, optional
+        Archivo JSON donde se conservan las secciones entre ejecuciones; sin
+        él la caché solo dura lo que el proceso (modo planificado).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    stored = json.load(f)
+                if stored.get('version') == VERSION:
+                    self._entries = stored.get('sections', {})
+            except (OSError, ValueError) as exc:
+                logger.warning("Ignoring section cache %s: %s", path, exc)
+
+    def get_or_compute(self, name, payload, compute):
+        """Devuelve la sección ``name`` guardada o la calcula con ``compute()``.
+
+        El valor devuelto por ``compute`` debe poder serializarse a JSON. Si
+        ``compute`` lanza una excepción no se guarda nada.
+        """
+        digest = payload_hash(payload)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.get('hash') == digest:
+                self.hits += 1
+                return entry['value']
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[name] = {'hash': digest, 'value': value}
+        return value
+
+    def save(self):
+        """Escribe la caché en :attr:`path` (de forma atómica)."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {'version': VERSION, 'sections': dict(self._entries)}
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        return {'hits': self.hits, 'misses': self.misses, 'sections': len(self._entries)}
+
+
+def cached_section(cache, name, payload, compute):
+    """:meth:`SectionCache.get_or_compute` que admite ``cache=None``."""
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(name, payload, compute)
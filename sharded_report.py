@@ -0,0 +1,217 @@
+"""Informe dividido en varias páginas para inventarios muy grandes.
+
+En lugar de un único HTML con todos los hosts y VMs se genera un directorio
+con:
+
+* ``index.html``: puntuaciones, indicadores, listados Top 10 y la tabla de
+  clústeres con enlaces. Su tamaño no depende del número de VMs.
+* ``clusters/<clúster>.html``: hosts del clúster con enlaces a su detalle.
+* ``hosts/<host>.html``: detalle del host y tabla de sus VMs.
+
+Las páginas de clúster y de host se renderizan en paralelo con un pool de
+procesos; cada proceso crea su entorno Jinja2 una sola vez. La hoja de estilos
+se escribe una vez (``report.css``) y todas las páginas la enlazan.
+
+Las plantillas y la hoja de estilos se buscan primero en el directorio de
+``--template``; las que no estén allí se toman de las incluidas en el
+repositorio (:func:`asset_path`).
+"""
+
+import logging
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from report_output import minify_css, write_html
+
+logger = logging.getLogger(__name__)
+
+INDEX_TEMPLATE = 'template_shard_index.html'
+CLUSTER_TEMPLATE = 'template_shard_cluster.html'
+HOST_TEMPLATE = 'template_shard_host.html'
+STYLESHEET = 'shard_report.css'
+STANDALONE = 'Standalone'
+BUNDLED_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-process Jinja2 environment, keyed by template directory
+_ENV = {}
+
+
+def _environment(template_dir):
+    env = _ENV.get(template_dir)
+    if env is None:
+        import jinja2
+        env = _ENV[template_dir] = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(template_dir)
+        )
+    return env
+
+
+def asset_path(template_dir, name):
+    """Ruta de ``name`` en ``template_dir`` o, si no está, en :data:`BUNDLED_DIR`."""
+    if template_dir:
+        path = os.path.join(template_dir, name)
+        if os.path.exists(path):
+            return path
+        logger.info("%s not found in %s; using the bundled one", name, template_dir)
+    return os.path.join(BUNDLED_DIR, name)
+
+
+def _render_pages(template_dirs, jobs, minify=True, precompress=()):
+    """Render ``(template, context, path)`` jobs; returns the number of pages written.
+
+    ``template_dirs`` maps every template name to the directory it is loaded from.
+    """
+    for template_name, context, path in jobs:
+        env = _environment(template_dirs[template_name])
+        html_content = env.get_template(template_name).render(**context)
+        write_html(path, html_content, minify=minify, precompress=precompress)
+    return len(jobs)
+
+
+def _slugs(names):
+    """Assign a unique file name to every entity name."""
+    slugs = {}
+    used = set()
+    for name in names:
+        base = re.sub(r'[^A-Za-z0-9._-]+', '_', str(name)).strip('._') or 'item'
+        slug = base
+        n = 1
+        while slug.lower() in used:
+            n += 1
+            slug = f'{base}_{n}'
+        used.add(slug.lower())
+        slugs[name] = slug
+    return slugs
+
+
+def _host_row(host, href):
+    perf = host.get('performance', {})
+    security = host.get('security', {})
+    return {
+        'name': host.get('name'),
+        'href': href,
+        'cpu_pct': round(perf.get('cpu_usage_pct') or 0, 1),
+        'mem_pct': round(perf.get('memory_usage_pct') or 0, 1),
+        'num_vms': len(host.get('vms', [])),
+        'version': security.get('version'),
+        'ssh': bool(security.get('services', {}).get('ssh')),
+        'avg_cpu_ready_ms': round(perf.get('avg_cpu_ready_ms') or 0, 1),
+    }
+
+
+def group_by_cluster(hosts_data):
+    """Agrupa los hosts por el nombre de su clúster (``Standalone`` si no tienen)."""
+    clusters = {}
+    for host in hosts_data:
+        name = (host.get('cluster') or {}).get('name') or STANDALONE
+        clusters.setdefault(name, []).append(host)
+    return clusters
+
+
+def write_sharded_report(checker, hosts_data, vm_data, output_dir, template_dir=None,
+                         workers=None, trends=None, minify=True, precompress=()):
+    """Genera el informe multipágina en ``output_dir``.
+
+    Parameters
+    ----------
+    checker : VMwareHealthCheck
+        Comprobador usado para ``_build_report_data``.
+    hosts_data : list of dict
+        Registros de host de ``collect``.
+    vm_data : list of dict
+        Lista plana de VMs.
+    output_dir : str
+        Directorio de salida; se crea si no existe.
+    template_dir : str, optional
+        Directorio de las plantillas; por defecto el del script. Las que
+        falten en él se toman del directorio del script.
+    workers : int, optional
+        Procesos para las páginas de detalle; con ``1`` se renderizan en el
+        proceso actual.
+    trends : dict, optional
+        Tendencias del histórico para la página índice.
+    minify, precompress
+        Como en :func:`report_output.write_html`, para todas las páginas.
+
+    Returns
+    -------
+    str
+        Ruta de ``index.html``.
+    """
+    template_dirs = {name: os.path.dirname(asset_path(template_dir, name))
+                     for name in (INDEX_TEMPLATE, CLUSTER_TEMPLATE, HOST_TEMPLATE)}
+    os.makedirs(os.path.join(output_dir, 'clusters'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'hosts'), exist_ok=True)
+    stylesheet = os.path.join(output_dir, 'report.css')
+    source = asset_path(template_dir, STYLESHEET)
+    if minify:
+        with open(source, encoding='utf-8') as f:
+            css = minify_css(f.read())
+        write_html(stylesheet, css, minify=False, precompress=precompress)
+    else:
+        shutil.copyfile(source, stylesheet)
+
+    # The index only shows tables, so the matplotlib chart is not generated
+    data = checker._build_report_data(hosts_data, vm_data, chart=None)
+    clusters = group_by_cluster(hosts_data)
+    cluster_slugs = _slugs(clusters)
+    host_slugs = _slugs(h.get('name') for h in hosts_data)
+    common = {
+        'report_date': data['report_date'],
+        'health_score': data['health_score'],
+        'health_state': data['health_state'],
+        'health_message': data['health_message'],
+    }
+
+    jobs = []
+    cluster_rows = []
+    for name, hosts in clusters.items():
+        rows = [_host_row(h, f"../hosts/{host_slugs[h.get('name')]}.html") for h in hosts]
+        num_vms = sum(r['num_vms'] for r in rows)
+        cluster_rows.append({
+            'name': name,
+            'href': f'clusters/{cluster_slugs[name]}.html',
+            'hosts': len(rows),
+            'vms': num_vms,
+            'cpu_pct': round(sum(r['cpu_pct'] for r in rows) / len(rows), 1),
+            'mem_pct': round(sum(r['mem_pct'] for r in rows) / len(rows), 1),
+            'ha_enabled': all((h.get('cluster') or {}).get('ha_enabled') for h in hosts),
+            'drs_enabled': all((h.get('cluster') or {}).get('drs_enabled') for h in hosts),
+            'ssh_hosts': sum(1 for r in rows if r['ssh']),
+        })
+        jobs.append((CLUSTER_TEMPLATE, dict(common, cluster=cluster_rows[-1], hosts=rows),
+                     os.path.join(output_dir, 'clusters', f'{cluster_slugs[name]}.html')))
+        for host in hosts:
+            slug = host_slugs[host.get('name')]
+            jobs.append((HOST_TEMPLATE, dict(
+                common,
+                host=host,
+                cluster_name=name,
+                cluster_href=f'../clusters/{cluster_slugs[name]}.html',
+                vms=host.get('vms', []),
+            ), os.path.join(output_dir, 'hosts', f'{slug}.html')))
+
+    with checker.profiler.phase('render_write'):
+        _render_pages(template_dirs, [(INDEX_TEMPLATE, dict(
+            data,
+            hosts=len(hosts_data),
+            vms=len(vm_data),
+            clusters=sorted(cluster_rows, key=lambda c: str(c['name'])),
+            trends=trends or {},
+        ), os.path.join(output_dir, 'index.html'))], minify, precompress)
+
+        workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+        if workers == 1:
+            _render_pages(template_dirs, jobs, minify, precompress)
+        else:
+            # A few chunks per worker balance large and small hosts
+            size = max(1, len(jobs) // (workers * 4))
+            chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_render_pages, [template_dirs] * len(chunks), chunks,
+                              [minify] * len(chunks), [precompress] * len(chunks)))
+
+    logger.info("Sharded report written to %s (%d pages)", output_dir, len(jobs) + 1)
+    return os.path.join(output_dir, 'index.html')
@@ -0,0 +1,306 @@
+"""Grabación y reproducción del tráfico SOAP con vCenter.
+
+:class:`CassetteRecorder` se engancha a ``GetConnection`` del stub de pyVmomi y
+guarda cada petición y respuesta SOAP en un archivo *cassette* (JSON,
+comprimido con gzip si el nombre termina en ``.gz``). Antes de escribirlo se
+eliminan los valores de los elementos ``userName`` y ``password`` (``Login``,
+``UserSession``), el nombre del vCenter dentro de URLs y el valor de las
+cookies de sesión. No se sustituyen subcadenas sueltas: con el usuario
+``root`` una sustitución ingenua convertiría ``<rootFolder>`` en
+``<***Folder>`` y el cassette dejaría de poder deserializarse.
+
+:func:`replay_service_instance` construye un ``ServiceInstance`` cuyo stub
+responde desde el cassette, con latencia opcional por llamada, de modo que el
+flujo completo de ``main()`` puede repetirse y perfilarse sin acceso al
+entorno de producción.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+
+SCRUBBED = '***'
+CASSETTE_VERSION = 1
+
+_OPERATION_RE = re.compile(
+    r'<(?:\w+:)?Body[^>]*>\s*<(?:\w+:)?(\w+)[^>]*>\s*<_this[^>]*type="([^"]+)"[^>]*>([^<]*)</_this>',
+    re.S,
+)
+_CREDENTIAL_RE = re.compile(r'<((?:\w+:)?(?:userName|password))(\s[^>]*)?>[^<]*</\1>')
+_COOKIE_RE = re.compile(r'(vmware_soap_session=)(&quot;|"?)[^"&;\s<]+')
+
+
+class CassetteMiss(LookupError):
+    """La petición no se encuentra en el cassette."""
+
+
+def _text(data):
+    if data is None:
+        return ''
+    if isinstance(data, bytes):
+        return data.decode('utf-8', errors='replace')
+    return str(data)
+
+
+def _request_keys(body):
+    """Return ``(exact_key, operation_key)`` for a SOAP request body."""
+    exact = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    match = _OPERATION_RE.search(body)
+    operation = ':'.join(match.groups()) if match else None
+    return exact, operation
+
+
+class Cassette:
+    """Secuencia de interacciones SOAP grabadas.
+
+    Parameters
+    ----------
+    interactions : list of dict, optional
+        Interacciones ya grabadas.
+    meta : dict, optional
+        Metadatos del cassette (versión de la API, fecha de grabación y fin
+        de las ventanas de eventos consultadas, ``event_windows``).
+    loose : bool, optional
+        Si una petición no está grabada, sirve otra con la misma operación y
+        el mismo objeto (``_this``). Desactivado por defecto: todas las
+        llamadas al ``PropertyCollector`` comparten esa clave y se devolvería
+        la respuesta de otra petición.
+    """
+
+    def __init__(self, interactions=None, meta=None, loose=False):
+        self.interactions = interactions or []
+        self.meta = meta or {}
+        self.loose = loose
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._operation = {}
+        self._positions = {}
+        for item in self.interactions:
+            self._index(item)
+
+    def _index(self, item):
+        exact, operation = _request_keys(item['request'])
+        self._exact.setdefault(exact, []).append(item)
+        if operation:
+            self._operation.setdefault(operation, []).append(item)
+
+    def add(self, request, status, reason, body):
+        """Append an interaction."""
+        item = {'request': request, 'status': status, 'reason': reason, 'body': body}
+        with self._lock:
+            self.interactions.append(item)
+            self._index(item)
+
+    def match(self, request):
+        """Devuelve la respuesta grabada para ``request``.
+
+        Se busca una petición idéntica y, solo con :attr:`loose`, otra con la
+        misma operación y objeto (``_this``). Las peticiones repetidas se
+        sirven en el orden de grabación y, agotadas, se repite la última.
+
+        Raises
+        ------
+        CassetteMiss
+            Si la petición no está grabada.
+        """
+        exact, operation = _request_keys(request)
+        tables = [(self._exact, exact)]
+        if self.loose:
+            tables.append((self._operation, operation))
+        for table, key in tables:
+            items = table.get(key) if key else None
+            if items:
+                with self._lock:
+                    pos = self._positions.get(key, 0)
+                    self._positions[key] = pos + 1
+                return items[min(pos, len(items) - 1)]
+        raise CassetteMiss(operation or exact)
+
+    def save(self, path):
+        """Write the cassette to ``path``."""
+        data = {'version': CASSETTE_VERSION, 'meta': self.meta,
+                'interactions': self.interactions}
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path, loose=False):
+        """Read a cassette written by :meth:`save`."""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('interactions'), data.get('meta'), loose)
+
+
+class _RecordedResponse:
+    """Minimal ``http.client.HTTPResponse`` replacement backed by bytes."""
+
+    def __init__(self, status, reason, body, headers=None):
+        self.status = status
+        self.reason = reason
+        self._body = body
+        self._pos = 0
+        self._headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+    def read(self, amt=None):
+        if amt is None or amt < 0:
+            amt = len(self._body) - self._pos
+        chunk = self._body[self._pos:self._pos + amt]
+        self._pos += len(chunk)
+        return chunk
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def getheaders(self):
+        return list(self._headers.items())
+
+    def close(self):
+        pass
+
+
+class _RecordingConnection:
+    """Proxy over an HTTP connection that stores every exchange."""
+
+    def __init__(self, connection, recorder):
+        self._connection = connection
+        self._recorder = recorder
+        self._request = None
+
+    def request(self, method, url, body=None, headers=None, **kwargs):
+        self._request = body
+        return self._connection.request(method, url, body, headers or {}, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        response = self._connection.getresponse(*args, **kwargs)
+        body = response.read()
+        encoding = (response.getheader('Content-Encoding', 'identity') or 'identity').lower()
+        plain = gzip.decompress(body) if encoding == 'gzip' else body
+        self._recorder._record(self._request, response.status, response.reason, plain)
+        # Cookies and content encoding are not replayed; the body is plain text
+        headers = {'Content-Type': response.getheader('Content-Type', 'text/xml')}
+        return _RecordedResponse(response.status, response.reason, plain, headers)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class CassetteRecorder:
+    """Graba el tráfico SOAP de un stub de pyVmomi.
+
+    Parameters
+    ----------
+    host : str, optional
+        Nombre o IP del vCenter, que se sustituye por ``***`` en las URLs.
+    """
+
+    def __init__(self, host=None):
+        self.host = host
+        self._host_re = re.compile(
+            r'(\w+://(?:[^/@\s"<]*@)?)' + re.escape(host) + r'(?=[:/?#"\'<\s]|$)'
+        ) if host else None
+        self.cassette = Cassette(meta={
+            'recorded_at': datetime.datetime.utcnow().isoformat() + 'Z',
+        })
+
+    def scrub(self, text):
+        """Remove credentials, session cookies and the vCenter host from ``text``."""
+        text = _CREDENTIAL_RE.sub(lambda m: f'<{m.group(1)}{m.group(2) or ""}>{SCRUBBED}</{m.group(1)}>', text)
+        text = _COOKIE_RE.sub(lambda m: m.group(1) + m.group(2) + SCRUBBED, text)
+        if self._host_re is not None:
+            text = self._host_re.sub(lambda m: m.group(1) + SCRUBBED, text)
+        return text
+
+    def _record(self, request, status, reason, body):
+        self.cassette.add(self.scrub(_text(request)), status, reason, self.scrub(_text(body)))
+
+    def instrument(self, stub):
+        """Empieza a grabar las peticiones realizadas a través de ``stub``."""
+        self.cassette.meta['api_version'] = getattr(stub, 'version', None)
+        get_connection = stub.GetConnection
+
+        def recording_connection():
+            conn = get_connection()
+            if isinstance(conn, _RecordingConnection):
+                return conn
+            return _RecordingConnection(conn, self)
+
+        stub._cassette_originals = {'GetConnection': get_connection}
+        stub.GetConnection = recording_connection
+        if hasattr(stub, 'ReturnConnection'):
+            return_connection = stub.ReturnConnection
+            stub._cassette_originals['ReturnConnection'] = return_connection
+            # Pool the raw connection so it is not wrapped again on reuse
+            stub.ReturnConnection = lambda conn: return_connection(
+                getattr(conn, '_connection', conn)
+            )
+        return stub
+
+    def uninstrument(self, stub):
+        """Stop recording and restore ``stub``."""
+        for attr, original in getattr(stub, '_cassette_originals', {}).items():
+            setattr(stub, attr, original)
+        stub._cassette_originals = {}
+
+    def save(self, path):
+        """Write the recorded cassette to ``path``."""
+        self.cassette.save(path)
+
+
+class ReplayConnection:
+    """Conexión HTTP que responde desde un :class:`Cassette`.
+
+    Parameters
+    ----------
+    cassette : Cassette
+        Interacciones grabadas.
+    latency : float, optional
+        Segundos de espera añadidos a cada respuesta.
+    """
+
+    def __init__(self, cassette, latency=0.0):
+        self.cassette = cassette
+        self.latency = latency
+        self._item = None
+
+    def request(self, method, url, body=None, headers=None, **kwargs):
+        self._item = self.cassette.match(_text(body))
+
+    def getresponse(self, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        item = self._item
+        return _RecordedResponse(item['status'], item['reason'],
+                                 item['body'].encode('utf-8'),
+                                 {'Content-Type': 'text/xml; charset=utf-8'})
+
+    def close(self):
+        pass
+
+
+def replay_stub(stub, cassette, latency=0.0):
+    """Make ``stub`` answer every request from ``cassette``."""
+    stub.cassette = cassette
+    stub.GetConnection = lambda: ReplayConnection(cassette, latency)
+    stub.ReturnConnection = lambda conn: None
+    stub.DropConnections = lambda: None
+    return stub
+
+
+def replay_service_instance(path, latency=0.0, loose=False):
+    """Crea un ``vim.ServiceInstance`` servido desde el cassette ``path``.
+
+    ``loose`` activa la coincidencia por operación (ver :class:`Cassette`).
+    """
+    from pyVmomi import SoapStubAdapter, vim
+
+    cassette = Cassette.load(path, loose)
+    stub = SoapStubAdapter(host='replay.invalid',
+                           version=cassette.meta.get('api_version'))
+    replay_stub(stub, cassette, latency)
+    return vim.ServiceInstance('ServiceInstance', stub)
@@ -0,0 +1,269 @@
+"""Contadores de llamadas SOAP por comprobación y por tipo de objeto.
+
+:class:`SoapCallStats` envuelve ``InvokeMethod``/``InvokeAccessor`` del stub de
+pyVmomi (o del stub de :mod:`synthetic_inventory`) y atribuye cada ida y
+vuelta a la comprobación activa, fijada con :func:`check_scope` o con el
+decorador :func:`tracked_check`. Si el stub expone ``GetConnection`` también se
+cuentan los bytes enviados y recibidos.
+
+En pruebas permite fijar presupuestos de idas y vueltas::
+
+    stats = checker.instrument_soap()
+    checker.collect()
+    stats.assert_budget({'security_check': 10}, scale=len(hosts))
+"""
+
+import contextlib
+import functools
+import threading
+import time
+
+_local = threading.local()
+
+
+def current_check():
+    """Return the check name active in this thread."""
+    return getattr(_local, 'check', None)
+
+
+@contextlib.contextmanager
+def check_scope(name):
+    """Atribuye a ``name`` las llamadas SOAP realizadas dentro del bloque."""
+    previous = getattr(_local, 'check', None)
+    _local.check = name
+    try:
+        yield
+    finally:
+        _local.check = previous
+
+
+def tracked_check(func):
+    """Decorate a ``VMwareHealthCheck`` method so its calls are attributed to it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with check_scope(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class RoundTripBudgetExceeded(AssertionError):
+    """Se supera el número máximo de llamadas SOAP permitido."""
+
+
+def _mo_type(mo):
+    cls = type(mo)
+    return getattr(cls, '_wsdlName', cls.__name__)
+
+
+def _empty():
+    return {'calls': 0, 'bytes_sent': 0, 'bytes_received': 0, 'latency_s': 0.0, 'faults': 0}
+
+
+class _CountingResponse:
+    """Proxy over an HTTP response that counts the bytes read."""
+
+    def __init__(self, response, stats):
+        self._response = response
+        self._stats = stats
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        self._stats._add_bytes(received=len(data or b''))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class _CountingConnection:
+    """Proxy over an HTTP connection that counts request and response bytes."""
+
+    def __init__(self, connection, stats):
+        self._connection = connection
+        self._stats = stats
+
+    def request(self, method, url, body=None, headers=None, **kwargs):
+        if body:
+            self._stats._add_bytes(sent=len(body))
+        return self._connection.request(method, url, body, headers or {}, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        return _CountingResponse(self._connection.getresponse(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class SoapCallStats:
+    """Acumula llamadas, bytes y latencia por comprobación y tipo de objeto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checks = {}
+        self.types = {}
+        self.methods = {}
+        # listener(latency, fault) after each round trip; gate() before it
+        self.listeners = []
+        self.gates = []
+
+    # -- instrumentation -------------------------------------------------
+    def instrument(self, stub):
+        """Envuelve los métodos de ``stub`` para contar sus llamadas."""
+        if getattr(stub, '_soap_stats', None) is self:
+            return stub
+        originals = {}
+        for attr in ('InvokeMethod', 'InvokeAccessor', 'GetConnection', 'ReturnConnection'):
+            if hasattr(stub, attr):
+                originals[attr] = getattr(stub, attr)
+        stub._soap_stats = self
+        stub._soap_stats_originals = originals
+
+        def invoke(original):
+            def wrapper(mo, info, *args):
+                # pyVmomi implements InvokeAccessor on top of InvokeMethod;
+                # only the outermost call is a network round trip.
+                if getattr(self._local, 'active', None) is not None:
+                    return original(mo, info, *args)
+                key = (current_check() or 'unscoped', _mo_type(mo), info.name)
+                for gate in self.gates:
+                    gate()
+                self._local.active = key
+                start = time.perf_counter()
+                fault = None
+                try:
+                    return original(mo, info, *args)
+                except Exception as exc:
+                    fault = exc
+                    raise
+                finally:
+                    self._local.active = None
+                    self._add_call(key, time.perf_counter() - start, fault)
+            return wrapper
+
+        for attr in ('InvokeMethod', 'InvokeAccessor'):
+            if attr in originals:
+                setattr(stub, attr, invoke(originals[attr]))
+        if 'GetConnection' in originals:
+            get_connection = originals['GetConnection']
+
+            def counting_connection():
+                conn = get_connection()
+                if isinstance(conn, _CountingConnection):
+                    return conn
+                return _CountingConnection(conn, self)
+            stub.GetConnection = counting_connection
+        if 'ReturnConnection' in originals:
+            return_connection = originals['ReturnConnection']
+            # Pool the raw connection so it is not wrapped again on reuse
+            stub.ReturnConnection = lambda conn: return_connection(
+                getattr(conn, '_connection', conn)
+            )
+        return stub
+
+    def uninstrument(self, stub):
+        """Restore the original methods of ``stub``."""
+        for attr, original in getattr(stub, '_soap_stats_originals', {}).items():
+            setattr(stub, attr, original)
+        stub._soap_stats = None
+        stub._soap_stats_originals = {}
+
+    # -- accounting ------------------------------------------------------
+    def _buckets(self, key):
+        check, mo_type, name = key
+        return (
+            self.checks.setdefault(check, _empty()),
+            self.types.setdefault(mo_type, _empty()),
+            self.methods.setdefault(f'{mo_type}.{name}', _empty()),
+        )
+
+    def _add_call(self, key, latency, fault=None):
+        with self._lock:
+            for bucket in self._buckets(key):
+                bucket['calls'] += 1
+                bucket['latency_s'] += latency
+                if fault is not None:
+                    bucket['faults'] += 1
+        for listener in self.listeners:
+            listener(latency, fault)
+
+    def _add_bytes(self, sent=0, received=0):
+        key = getattr(self._local, 'active', None)
+        if key is None:
+            key = (current_check() or 'unscoped', 'unknown', 'unknown')
+        with self._lock:
+            for bucket in self._buckets(key):
+                bucket['bytes_sent'] += sent
+                bucket['bytes_received'] += received
+
+    def reset(self):
+        """Discard all counters."""
+        with self._lock:
+            self.checks = {}
+            self.types = {}
+            self.methods = {}
+
+    # -- reporting -------------------------------------------------------
+    def calls_for(self, check):
+        """Return the number of SOAP calls attributed to ``check``."""
+        return self.checks.get(check, {}).get('calls', 0)
+
+    def summary(self):
+        """Devuelve los contadores agregados como diccionario serializable."""
+        with self._lock:
+            checks = {k: dict(v) for k, v in self.checks.items()}
+            types = {k: dict(v) for k, v in self.types.items()}
+            methods = {k: dict(v) for k, v in self.methods.items()}
+        totals = _empty()
+        for bucket in checks.values():
+            for field in totals:
+                totals[field] += bucket[field]
+        for group in (checks, types, methods, {'totals': totals}):
+            for bucket in group.values():
+                bucket['latency_s'] = round(bucket['latency_s'], 4)
+        return {'totals': totals, 'checks': checks, 'types': types, 'methods': methods}
+
+    def format_table(self):
+        """Return a plain text table with the calls per check."""
+        data = self.summary()
+        lines = [
+            f"{'check':<28}{'calls':>8}{'sent KB':>10}{'recv KB':>10}{'latency s':>11}"
+        ]
+        for name, b in sorted(data['checks'].items(), key=lambda kv: -kv[1]['calls']):
+            lines.append(
+                f"{name:<28}{b['calls']:>8}{b['bytes_sent'] / 1024:>10.1f}"
+                f"{b['bytes_received'] / 1024:>10.1f}{b['latency_s']:>11.3f}"
+            )
+        t = data['totals']
+        lines.append(
+            f"{'total':<28}{t['calls']:>8}{t['bytes_sent'] / 1024:>10.1f}"
+            f"{t['bytes_received'] / 1024:>10.1f}{t['latency_s']:>11.3f}"
+        )
+        return "\n".join(lines)
+
+    def assert_budget(self, budgets, scale=1):
+        """Comprueba que ninguna comprobación supera su presupuesto.
+
+        Parameters
+        ----------
+        budgets : dict
+            Máximo de llamadas por comprobación, por ejemplo
+            ``{'security_check': 8}``.
+        scale : int, optional
+            Multiplicador del presupuesto (número de hosts o VMs) para expresar
+            límites por entidad.
+
+        Raises
+        ------
+        RoundTripBudgetExceeded
+            Si alguna comprobación realiza más llamadas de las permitidas.
+        """
+        exceeded = []
+        for check, limit in budgets.items():
+            calls = self.calls_for(check)
+            if calls > limit * scale:
+                exceeded.append(f"{check}: {calls} > {limit * scale}")
+        if exceeded:
+            raise RoundTripBudgetExceeded(
+                "SOAP round-trip budget exceeded: " + ", ".join(exceeded)
+            )
@@ -0,0 +1,197 @@
+"""Recopilación, agregación e informe solapados en etapas.
+
+Sin este módulo la ejecución es secuencial: se recopilan todos los hosts, se
+agregan los datos del informe y solo entonces se piden las secciones de IA y
+se renderiza. :class:`StreamingReport` lo convierte en una cadena de etapas
+unidas por una cola acotada:
+
+1. **recopilación**: ``VMwareHealthCheck.collect`` entrega cada registro de
+   host (``on_host``) en cuanto se completa;
+2. **agregación**: un hilo consume la cola y acumula el host y sus VMs en un
+   :class:`report_aggregates.ReportAggregates` (puntuaciones, indicadores,
+   listados Top 10...) mientras se recopilan los demás hosts. Si la
+   agregación se retrasa, la cola llena frena la recopilación en lugar de
+   acumular registros sin límite. Si las plantillas usan los indicadores,
+   las licencias, que no dependen de los hosts, se consultan en este hilo al
+   arrancar;
+3. **productores del informe**: al terminar la recopilación (:meth:`finish`)
+   los agregados ya están completos, se dejan en la caché de la ejecución y
+   se lanzan de inmediato los productores que usan las plantillas, incluidas
+   las secciones de IA, sin esperar al histórico, a la comparación con la
+   ejecución anterior ni al informe detallado;
+4. **renderizado**: ``generate_reports(..., prepared=stream)`` reutiliza ese
+   contexto y solo ejecuta lo que dependa de etapas posteriores
+   (:data:`LATE_PRODUCERS`, las tendencias del histórico).
+
+Así el tiempo total se acerca al de la recopilación más el de la sección de
+IA más lenta. :meth:`StreamingReport.summary` informa de cuánto esperó cada
+etapa.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from report_aggregates import ReportAggregates
+from report_pipeline import ReportPipeline, report_producers
+
+logger = logging.getLogger(__name__)
+
+# Host records waiting to be aggregated before collection blocks
+DEFAULT_QUEUE_SIZE = 64
+# Producers whose inputs only exist after the report context is started
+LATE_PRODUCERS = ('trends',)
+
+_HOST, _DONE, _ABORT = 'host', 'done', 'abort'
+
+
+class StreamingReport:
+    """Agrega cada host durante la recopilación y adelanta el informe.
+
+    Parameters
+    ----------
+    checker : VMwareHealthCheck
+        Comprobador que recopila los hosts.
+    variables : set of str, optional
+        Variables que usan las plantillas (``None``: todas).
+    queue_size : int, optional
+        Registros de host en cola como máximo.
+    """
+
+    def __init__(self, checker, variables=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.checker = checker
+        self.variables = variables
+        self.queue_size = queue_size
+        self.aggregates = ReportAggregates()
+        self.hosts_data = None
+        self.context = None
+        self.ran = ()
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._ready = threading.Event()
+        self._thread = None
+        self._started = None
+        self._collected = None
+        self._aggregated = None
+        self._finished = None
+        self.blocked_puts = 0
+        self.blocked_s = 0.0
+        self.queue_peak = 0
+
+    def start(self):
+        """Arranca el hilo de agregación; devuelve ``self``."""
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='report-aggregate', daemon=True)
+        self._thread.start()
+        return self
+
+    # -- collection stage ------------------------------------------------
+    def on_host(self, host_data):
+        """Encola un registro de host (bloquea si la cola está llena)."""
+        self._put((_HOST, host_data))
+
+    def finish(self, hosts_data, vm_data):
+        """Indica que la recopilación ha terminado con ``hosts_data``/``vm_data``."""
+        self._collected = time.monotonic()
+        self._put((_DONE, hosts_data, vm_data))
+
+    def abort(self):
+        """Detiene el hilo sin producir el informe (la recopilación falló)."""
+        self._put((_ABORT,))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.monotonic()
+            self._queue.put(item)
+            self.blocked_puts += 1
+            self.blocked_s += time.monotonic() - start
+        self.queue_peak = max(self.queue_peak, self._queue.qsize())
+
+    # -- aggregation and producer stages ---------------------------------
+    def _needs_licenses(self):
+        """``True`` si alguna variable pedida depende de los indicadores."""
+        pipeline = ReportPipeline(report_producers(self.checker, [], []))
+        return 'indicators' in pipeline.resolve(self.variables)
+
+    def _run(self):
+        checker = self.checker
+        try:
+            if checker.licenses is None and self._needs_licenses():
+                # vCenter-wide lookup, overlapped with the collection
+                checker.cache.lookup('licenses', checker.licensing_check)
+            while True:
+                item = self._queue.get()
+                if item[0] == _ABORT:
+                    return
+                if item[0] == _DONE:
+                    if self.error is None:
+                        self._produce(*item[1:])
+                    return
+                if self.error is not None:
+                    # Keep draining so that the collection never blocks
+                    continue
+                try:
+                    with checker.profiler.phase('aggregation'):
+                        self.aggregates.add_host_record(item[1])
+                except Exception as exc:
+                    self._fail(exc)
+        except Exception as exc:
+            self._fail(exc)
+        finally:
+            self._ready.set()
+
+    def _fail(self, exc):
+        logger.error("Streaming report stage failed: %s; the report is built after collection", exc)
+        self.error = exc
+
+    def _produce(self, hosts_data, vm_data):
+        checker = self.checker
+        self._aggregated = time.monotonic()
+        if (self.aggregates.hosts, self.aggregates.vms) == (len(hosts_data), len(vm_data)):
+            checker.cache.derived('aggregates', hosts_data, vm_data, lambda: self.aggregates)
+        else:  # pragma: no cover - records added outside ``on_host``
+            logger.warning("Streamed records do not match the collection; aggregating again")
+        pipeline = ReportPipeline(report_producers(checker, hosts_data, vm_data), checker.profiler)
+        self.context = pipeline.run(self.variables, exclude=LATE_PRODUCERS)
+        self.ran = tuple(pipeline.ran)
+        self.hosts_data = hosts_data
+        self._finished = time.monotonic()
+        logger.info("Report context ready %.2fs after the collection (%s)",
+                    self._finished - self._collected, ', '.join(self.ran) or 'no producers')
+
+    def result(self, hosts_data, timeout=None):
+        """Espera al contexto adelantado de ``hosts_data``.
+
+        Returns
+        -------
+        tuple or None
+            ``(context, producers_run)``, o ``None`` si la etapa falló o se
+            preparó para otra recopilación.
+        """
+        if not self._ready.wait(timeout):
+            logger.warning("Streaming report not ready after %ss; building it again", timeout)
+            return None
+        if self.error is not None or self.hosts_data is not hosts_data:
+            return None
+        return self.context, self.ran
+
+    def summary(self):
+        """Tiempos y esperas de cada etapa para el resumen de la ejecución."""
+        def since(start, end):
+            return None if start is None or end is None else round(end - start, 3)
+        return {
+            'hosts': self.aggregates.hosts,
+            'vms': self.aggregates.vms,
+            'queue_size': self.queue_size,
+            'queue_peak': self.queue_peak,
+            'blocked_puts': self.blocked_puts,
+            'blocked_s': round(self.blocked_s, 3),
+            'collection_s': since(self._started, self._collected),
+            'aggregation_lag_s': since(self._collected, self._aggregated),
+            'context_after_collection_s': since(self._collected, self._finished),
+            'producers': list(self.ran),
+            'error': None if self.error is None else str(self.error),
+        }
@@ -0,0 +1,365 @@
+"""Gráficos SVG generados sin dependencias externas.
+
+Los gráficos se insertan en el HTML como SVG en línea: no hace falta importar
+matplotlib, el resultado ocupa menos que un PNG en base64 y escala sin perder
+calidad al imprimir. Cada gráfico se guarda en una caché indexada por el hash
+de sus datos, de modo que los mismos datos (por ejemplo, varios informes del
+modo planificado entre dos refrescos del rendimiento) no vuelven a dibujarse.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from html import escape
+
+SERIES_COLORS = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728')
+STATUS_COLORS = {'ok': '#4CAF50', 'warning': '#FFC107', 'critical': '#FF5722'}
+FONT = "font-family='Roboto, Arial, sans-serif' font-size='11'"
+
+
+class ChartCache:
+    """Caché LRU de gráficos indexada por el hash de sus datos."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, data):
+        raw = json.dumps([kind, data], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get_or_render(self, kind, data, render):
+        """Devuelve el gráfico de ``data`` o lo genera con ``render(data)``."""
+        key = self.key(kind, data)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        svg = render(data)
+        with self._lock:
+            self._items[key] = svg
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return svg
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+cache = ChartCache()
+
+
+def _nice_step(maximum, ticks=5):
+    """Paso redondo (1, 2, 2.5 o 5 por potencia de 10) para el eje de valores."""
+    if maximum <= 0:
+        return 1
+    raw = maximum / ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 2.5, 5):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+def _fmt(value):
+    return f'{value:,.0f}' if abs(value) >= 10 else f'{value:g}'
+
+
+def bar_chart(categories, series, title=None, width=None, height=320, bands=None):
+    """Gráfico de barras agrupadas en SVG.
+
+    Parameters
+    ----------
+    categories : list of str
+        Etiquetas del eje horizontal.
+    series : list of tuple
+        Pares ``(nombre, valores)``; un valor por categoría.
+    title : str, optional
+        Título accesible del gráfico.
+    width : int, optional
+        Ancho del ``viewBox``; por defecto depende del número de categorías.
+    height : int, optional
+        Alto del ``viewBox``.
+    bands : list of tuple, optional
+        Bandas ``(etiqueta, inicio, fin, color)`` sombreadas detrás de las
+        barras; ``inicio`` y ``fin`` son fracciones del ancho del gráfico.
+
+    Returns
+    -------
+    str
+        Elemento ``<svg>`` listo para insertarse en el HTML.
+    """
+    n = max(len(categories), 1)
+    group = max(24, 12 * len(series) + 12)
+    left, right, top, bottom = 60, 10, 30, 90
+    width = width or max(400, left + right + n * group)
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    maximum = max([v or 0 for _, values in series for v in values] + [0])
+    step = _nice_step(maximum)
+    top_value = step * max(1, -(-maximum // step))
+    scale = plot_h / top_value
+    slot = plot_w / n
+    bar_w = slot * 0.8 / max(len(series), 1)
+
+    out = [f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {width} {height}' "
+           f"width='100%' role='img' {FONT}>"]
+    if title:
+        out.append(f'<title>{escape(title)}</title>')
+    # Value axis and grid
+    value = 0
+    while value <= top_value + 1e-9:
+        y = top + plot_h - value * scale
+        out.append(f"<line x1='{left}' y1='{y:.1f}' x2='{width - right}' y2='{y:.1f}' stroke='#e0e0e0'/>")
+        out.append(f"<text x='{left - 6}' y='{y + 4:.1f}' text-anchor='end' fill='#555'>{_fmt(value)}</text>")
+        value += step
+    # Bands (e.g. percentile ranges over a histogram)
+    for b, (label, start, end, color) in enumerate(bands or []):
+        x0 = left + plot_w * start
+        out.append(f"<rect x='{x0:.1f}' y='{top}' width='{max(plot_w * (end - start), 2):.1f}' "
+                   f"height='{plot_h}' fill='{color}' fill-opacity='0.12'/>")
+        out.append(f"<text x='{width - right}' y='{top + 12 + b * 14}' text-anchor='end' "
+                   f"fill='{color}'>{escape(label)}</text>")
+    # Bars
+    for s, (name, values) in enumerate(series):
+        color = SERIES_COLORS[s % len(SERIES_COLORS)]
+        for i, v in enumerate(values):
+            v = v or 0
+            h = v * scale
+            x = left + i * slot + slot * 0.1 + s * bar_w
+            out.append(
+                f"<rect x='{x:.1f}' y='{top + plot_h - h:.1f}' width='{bar_w:.1f}' "
+                f"height='{h:.1f}' fill='{color}'><title>{escape(str(categories[i]))} - "
+                f"{escape(name)}: {_fmt(v)}</title></rect>"
+            )
+    # Category labels
+    for i, label in enumerate(categories):
+        x = left + (i + 0.5) * slot
+        y = top + plot_h + 12
+        out.append(f"<text x='{x:.1f}' y='{y}' text-anchor='end' fill='#333' "
+                   f"transform='rotate(-45 {x:.1f} {y})'>{escape(str(label))}</text>")
+    # Legend
+    x = left
+    for s, (name, _) in enumerate(series):
+        color = SERIES_COLORS[s % len(SERIES_COLORS)]
+        out.append(f"<rect x='{x}' y='8' width='12' height='12' fill='{color}'/>")
+        out.append(f"<text x='{x + 16}' y='18' fill='#333'>{escape(name)}</text>")
+        x += 24 + 7 * len(name)
+    out.append('</svg>')
+    return ''.join(out)
+
+
+def usage_bars(rows, title=None, width=600, warning=80, critical=90):
+    """Barras horizontales de porcentaje de uso coloreadas por umbral.
+
+    ``rows`` es una lista de pares ``(etiqueta, porcentaje)``.
+    """
+    row_h = 22
+    left, right, top = 160, 50, 10
+    height = top * 2 + max(len(rows), 1) * row_h
+    plot_w = width - left - right
+    out = [f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {width} {height}' "
+           f"width='100%' role='img' {FONT}>"]
+    if title:
+        out.append(f'<title>{escape(title)}</title>')
+    for i, (label, pct) in enumerate(rows):
+        pct = max(0.0, min(float(pct or 0), 100.0))
+        status = 'critical' if pct >= critical else 'warning' if pct >= warning else 'ok'
+        y = top + i * row_h
+        out.append(f"<text x='{left - 6}' y='{y + 15}' text-anchor='end' fill='#333'>"
+                   f"{escape(str(label))}</text>")
+        out.append(f"<rect x='{left}' y='{y + 4}' width='{plot_w}' height='14' fill='#f1f1f1'/>")
+        out.append(f"<rect x='{left}' y='{y + 4}' width='{plot_w * pct / 100:.1f}' height='14' "
+                   f"fill='{STATUS_COLORS[status]}'/>")
+        out.append(f"<text x='{left + plot_w + 6}' y='{y + 15}' fill='#333'>{pct:.0f}%</text>")
+    out.append('</svg>')
+    return ''.join(out)
+
+
+# Above this number of bars the charts switch to aggregated views
+MAX_BARS = 40
+TOP_N = 20
+HISTOGRAM_BINS = 10
+PERCENTILES = (50, 90, 99)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _percentile(ordered, p):
+    """Percentil con interpolación lineal (como ``numpy.percentile``)."""
+    if not ordered:
+        return 0.0
+    pos = (len(ordered) - 1) * p / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def usage_stats(values, bins=HISTOGRAM_BINS):
+    """Histograma (tramos iguales entre 0 y 100 %) y percentiles de ``values``.
+
+    Se calcula con numpy si está instalado y, si no, en Python puro.
+
+    Returns
+    -------
+    dict
+        ``counts`` (hosts por tramo), ``percentiles`` (pares ``[p, valor]``
+        de :data:`PERCENTILES`) y ``max``.
+    """
+    np = _numpy()
+    if np is not None:
+        arr = np.clip(np.asarray(values, dtype=float), 0, 100)
+        counts = np.histogram(arr, bins=bins, range=(0, 100))[0].tolist()
+        pcts = np.percentile(arr, PERCENTILES).tolist() if arr.size else [0.0] * len(PERCENTILES)
+        maximum = float(arr.max()) if arr.size else 0.0
+    else:
+        clipped = sorted(min(max(float(v or 0), 0.0), 100.0) for v in values)
+        counts = [0] * bins
+        for v in clipped:
+            counts[min(int(v * bins / 100), bins - 1)] += 1
+        pcts = [_percentile(clipped, p) for p in PERCENTILES]
+        maximum = clipped[-1] if clipped else 0.0
+    return {
+        'counts': counts,
+        'percentiles': [[p, round(v, 1)] for p, v in zip(PERCENTILES, pcts)],
+        'max': round(maximum, 1),
+    }
+
+
+def _pct(host, key):
+    return host.get('performance', {}).get(key) or 0
+
+
+def host_usage_view(hosts_data, max_bars=MAX_BARS, top_n=TOP_N):
+    """Datos del gráfico de hosts según el tamaño del inventario.
+
+    * Hasta ``max_bars`` hosts: una barra por host (CPU en MHz y memoria en MB).
+    * Más hosts repartidos en 2..``max_bars`` clústeres: una barra por clúster
+      con el uso medio de CPU y memoria (%).
+    * En otro caso: los ``top_n`` hosts con más CPU y una barra ``Others`` con
+      la media del resto.
+    """
+    if len(hosts_data) <= max_bars:
+        return {
+            'view': 'hosts',
+            'names': [h.get('name') for h in hosts_data],
+            'series': [
+                ['CPU (MHz)', [h.get('performance', {}).get('cpu_usage') or 0 for h in hosts_data]],
+                ['Memory (MB)', [h.get('performance', {}).get('memory_usage') or 0 for h in hosts_data]],
+            ],
+        }
+    clusters = {}
+    for host in hosts_data:
+        name = (host.get('cluster') or {}).get('name') or 'Standalone'
+        totals = clusters.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += _pct(host, 'cpu_usage_pct')
+        totals[2] += _pct(host, 'memory_usage_pct')
+    if 1 < len(clusters) <= max_bars:
+        ordered = sorted(clusters.items(), key=lambda c: str(c[0]))
+        return {
+            'view': 'clusters',
+            'names': [f'{name} ({n})' for name, (n, _, _) in ordered],
+            'series': [
+                ['CPU (%)', [round(cpu / n, 1) for _, (n, cpu, _) in ordered]],
+                ['Memory (%)', [round(mem / n, 1) for _, (n, _, mem) in ordered]],
+            ],
+        }
+    ranked = sorted(hosts_data, key=lambda h: _pct(h, 'cpu_usage_pct'), reverse=True)
+    top, rest = ranked[:top_n], ranked[top_n:]
+    names = [h.get('name') for h in top]
+    cpu = [round(_pct(h, 'cpu_usage_pct'), 1) for h in top]
+    mem = [round(_pct(h, 'memory_usage_pct'), 1) for h in top]
+    if rest:
+        names.append(f'Others ({len(rest)})')
+        cpu.append(round(sum(_pct(h, 'cpu_usage_pct') for h in rest) / len(rest), 1))
+        mem.append(round(sum(_pct(h, 'memory_usage_pct') for h in rest) / len(rest), 1))
+    return {'view': 'top', 'names': names, 'series': [['CPU (%)', cpu], ['Memory (%)', mem]]}
+
+
+def _render_host_usage(data):
+    titles = {
+        'hosts': 'Resource Usage Chart',
+        'clusters': 'Average usage per cluster',
+        'top': 'Top hosts by CPU usage',
+    }
+    return bar_chart(data['names'], data['series'], title=titles[data['view']],
+                     width=None if data['view'] == 'hosts' else 800)
+
+
+def host_usage_chart(hosts_data, max_bars=MAX_BARS):
+    """Gráfico de uso de CPU y memoria de los hosts (SVG en línea)."""
+    return cache.get_or_render('host_usage', host_usage_view(hosts_data, max_bars),
+                               _render_host_usage)
+
+
+def _render_histogram(data):
+    labels = [f'{i * 100 // HISTOGRAM_BINS}-{(i + 1) * 100 // HISTOGRAM_BINS}%'
+              for i in range(HISTOGRAM_BINS)]
+    bands = []
+    for s, (name, stats) in enumerate((('CPU', data['cpu']), ('Memory', data['mem']))):
+        p = dict((int(k), v) for k, v in stats['percentiles'])
+        bands.append((f'{name} p50-p90: {p[50]:g}-{p[90]:g}% (p99 {p[99]:g}%)',
+                      p[50] / 100, p[90] / 100, SERIES_COLORS[s]))
+    return bar_chart(labels, [['CPU (hosts)', data['cpu']['counts']],
+                              ['Memory (hosts)', data['mem']['counts']]],
+                     title='Host usage distribution', width=800, bands=bands)
+
+
+def usage_histogram_chart(hosts_data, max_bars=MAX_BARS):
+    """Histograma del uso de CPU y memoria con bandas de percentiles.
+
+    Solo se genera para inventarios de más de ``max_bars`` hosts; en otro
+    caso devuelve una cadena vacía.
+    """
+    if len(hosts_data) <= max_bars:
+        return ''
+    data = {
+        'cpu': usage_stats([_pct(h, 'cpu_usage_pct') for h in hosts_data]),
+        'mem': usage_stats([_pct(h, 'memory_usage_pct') for h in hosts_data]),
+    }
+    return cache.get_or_render('usage_histogram', data, _render_histogram)
+
+
+def _datastore_rows(hosts_data, max_bars=MAX_BARS):
+    rows = {}
+    for host in hosts_data:
+        for ds in host.get('performance', {}).get('datastores', []):
+            if isinstance(ds, dict) and ds.get('name') not in rows:
+                rows[ds.get('name')] = round(ds.get('usage_pct') or 0, 1)
+    ordered = sorted(rows.items(), key=lambda r: (-r[1], str(r[0])))
+    if len(ordered) > max_bars:
+        top, rest = ordered[:max_bars - 1], ordered[max_bars - 1:]
+        top.append((f'Others ({len(rest)})', round(sum(v for _, v in rest) / len(rest), 1)))
+        return top
+    return ordered
+
+
+def _render_datastore_usage(rows):
+    return usage_bars(rows, title='Datastore Usage')
+
+
+def datastore_usage_chart(hosts_data, max_bars=MAX_BARS):
+    """Gráfico de uso de los datastores, del más lleno al más vacío (SVG en línea).
+
+    Con más de ``max_bars`` datastores se muestran los más llenos y una barra
+    ``Others`` con el uso medio del resto.
+    """
+    return cache.get_or_render('datastore_usage', _datastore_rows(hosts_data, max_bars),
+                               _render_datastore_usage)
@@ -0,0 +1,551 @@
+"""Inventario vSphere sintético para pruebas y bancos de rendimiento.
+
+Los objetos generados imitan la parte de la API de pyVmomi que utiliza
+``VMwareHealthCheck``: cada lectura de una propiedad de un *managed object* y
+cada llamada a un método pasan por ``stub.InvokeAccessor`` o
+``stub.InvokeMethod``, igual que en pyVmomi, por lo que se puede inyectar
+latencia por llamada y medir cuántas idas y vueltas hace cada comprobación.
+
+Ejemplo::
+
+    inventory = generate_inventory(hosts=100, vms_per_host=20, latency=0.002)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        hosts_data, all_vms, summary = checker.collect()
+"""
+
+import contextlib
+import datetime
+import random
+import time
+import types
+
+
+class InvalidLogin(Exception):
+    """Equivalente sintético de ``vim.fault.InvalidLogin``."""
+
+
+class _Info:
+    """Minimal stand-in for pyVmomi's property/method info objects."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeStub:
+    """Transporte sintético con latencia configurable por llamada.
+
+    Parameters
+    ----------
+    latency : float or callable, optional
+        Segundos de espera por llamada o una función ``(mo, name) -> float``.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _wait(self, mo, name):
+        delay = self.latency(mo, name) if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def InvokeAccessor(self, mo, info):
+        self._wait(mo, info.name)
+        return mo._props[info.name]
+
+    def InvokeMethod(self, mo, info, args):
+        self._wait(mo, info.name)
+        return mo._methods[info.name](*args)
+
+
+class ManagedObject:
+    """Managed object cuyas propiedades se resuelven a través del stub."""
+
+    def __init__(self, moid, stub, props=None, methods=None):
+        self.__dict__['_moId'] = moid
+        self.__dict__['_stub'] = stub
+        self.__dict__['_props'] = props if props is not None else {}
+        self.__dict__['_methods'] = methods if methods is not None else {}
+
+    def __getattr__(self, name):
+        props = self.__dict__['_props']
+        methods = self.__dict__['_methods']
+        if name in props:
+            return self._stub.InvokeAccessor(self, _Info(name))
+        if name in methods:
+            def invoke(*args, **kwargs):
+                return self._stub.InvokeMethod(
+                    self, _Info(name), args + tuple(kwargs.values())
+                )
+            return invoke
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"'{type(self).__name__}:{self._moId}'"
+
+
+class HostSystem(ManagedObject):
+    pass
+
+
+class VirtualMachine(ManagedObject):
+    pass
+
+
+class ClusterComputeResource(ManagedObject):
+    pass
+
+
+class Datastore(ManagedObject):
+    pass
+
+
+class ContainerView(ManagedObject):
+    pass
+
+
+class PropertyCollector(ManagedObject):
+    pass
+
+
+class _MetricId:
+    def __init__(self, counterId=None, instance=''):
+        self.counterId = counterId
+        self.instance = instance
+
+
+class _QuerySpec:
+    def __init__(self, entity=None, maxSample=None, metricId=None, intervalId=None):
+        self.entity = entity
+        self.maxSample = maxSample
+        self.metricId = metricId or []
+        self.intervalId = intervalId
+
+
+class _EventFilterSpec:
+    class ByTime:
+        def __init__(self, beginTime=None, endTime=None):
+            self.beginTime = beginTime
+            self.endTime = endTime
+
+    class ByEntity:
+        def __init__(self, entity=None, recursion=None):
+            self.entity = entity
+            self.recursion = recursion
+
+    def __init__(self, time=None, entity=None, category=None):
+        self.time = time
+        self.entity = entity
+        self.category = category
+
+
+class Event:
+    """Evento sintético; ``category`` solo la usa el filtro del collector."""
+
+    def __init__(self, key, created, host, category, message=''):
+        self.key = key
+        self.createdTime = created
+        self.host = _ns(host=host, name=host.__dict__['_props']['name'])
+        self.category = category
+        self.fullFormattedMessage = message
+
+
+# One subclass per vSphere event type generated by ``generate_inventory``
+EVENT_TYPES = {
+    name: type(name, (Event,), {})
+    for name in ('AlarmStatusChangedEvent', 'HostConnectionLostEvent', 'DasHostFailedEvent',
+                 'VmPoweredOffEvent', 'UserLoginSessionEvent')
+}
+_EVENT_CATEGORIES = {
+    'AlarmStatusChangedEvent': 'warning',
+    'HostConnectionLostEvent': 'error',
+    'DasHostFailedEvent': 'error',
+    'VmPoweredOffEvent': 'info',
+    'UserLoginSessionEvent': 'info',
+}
+
+
+def _event_manager(stub, events):
+    """``EventManager`` whose collectors filter and page like vCenter."""
+    collectors = []
+
+    def create_collector(spec):
+        begin, end = spec.time.beginTime, spec.time.endTime
+        entity = spec.entity.entity if spec.entity else None
+        matches = [
+            e for e in events
+            if (begin is None or e.createdTime >= begin)
+            and (end is None or e.createdTime <= end)
+            and (not spec.category or e.category in spec.category)
+            and (entity is None or not isinstance(entity, HostSystem) or e.host.host is entity)
+        ]
+        position = [0]
+
+        def read_next(max_count):
+            page = matches[position[0]:position[0] + max_count]
+            position[0] += len(page)
+            return page
+
+        def destroy():
+            collectors.remove(collector)
+
+        collector = ManagedObject(f'EventHistoryCollector-{len(collectors)}', stub, {}, {
+            'RewindCollector': lambda: position.__setitem__(0, 0),
+            'ReadNextEvents': read_next,
+            'DestroyCollector': destroy,
+        })
+        collectors.append(collector)
+        return collector
+
+    manager = ManagedObject('EventManager', stub, {},
+                            {'CreateCollectorForEvents': create_collector})
+    manager.__dict__['collectors'] = collectors
+    return manager
+
+
+class _DataObject:
+    """Data object built from keyword arguments, like pyVmomi's."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+_PROPERTY_COLLECTOR_TYPES = types.SimpleNamespace(**{
+    name: type(name, (_DataObject,), {})
+    for name in ('FilterSpec', 'ObjectSpec', 'PropertySpec', 'TraversalSpec', 'RetrieveOptions')
+})
+
+
+def _property_value(obj, path):
+    first, *rest = path.split('.')
+    value = obj.__dict__['_props'].get(first)
+    for part in rest:
+        value = getattr(value, part, None)
+    return value
+
+
+def _property_collector(stub):
+    """``PropertyCollector`` whose ``RetrievePropertiesEx`` pages like vCenter.
+
+    Only view traversals (``ObjectSpec`` plus one ``TraversalSpec`` over a
+    list property) are supported. Unset properties are left out of
+    ``propSet`` and an empty result is ``None``, as in pyVmomi.
+    """
+    pending = {}
+    tokens = iter(range(1, 1 << 62))
+
+    def contents(spec):
+        for obj_spec in spec.objectSet:
+            objects = [] if obj_spec.skip else [obj_spec.obj]
+            for traversal in getattr(obj_spec, 'selectSet', None) or []:
+                objects.extend(obj_spec.obj.__dict__['_props'].get(traversal.path) or [])
+            for obj in objects:
+                for prop_spec in spec.propSet:
+                    if not isinstance(obj, prop_spec.type):
+                        continue
+                    values = ((path, _property_value(obj, path)) for path in prop_spec.pathSet)
+                    yield _ns(obj=obj, propSet=[_ns(name=path, val=value)
+                                                for path, value in values if value is not None])
+
+    def page(objects, max_objects):
+        token = None
+        if max_objects and len(objects) > max_objects:
+            token = f'session[{next(tokens)}]'
+            pending[token] = (objects[max_objects:], max_objects)
+            objects = objects[:max_objects]
+        return _ns(objects=objects, token=token) if objects else None
+
+    def retrieve(specSet, options=None):
+        objects = [content for spec in specSet for content in contents(spec)]
+        return page(objects, getattr(options, 'maxObjects', None))
+
+    def continue_retrieve(token):
+        return page(*pending.pop(token))
+
+    collector = PropertyCollector('propertyCollector', stub, {}, {
+        'RetrievePropertiesEx': retrieve,
+        'ContinueRetrievePropertiesEx': continue_retrieve,
+        'CancelRetrievePropertiesEx': lambda token: pending.pop(token),
+    })
+    # Result sets not yet read to the end, to check they are released
+    collector.__dict__['pending'] = pending
+    return collector
+
+
+# Replacement for ``pyVmomi.vim`` exposing only the names used by the checker
+vim = types.SimpleNamespace(
+    HostSystem=HostSystem,
+    VirtualMachine=VirtualMachine,
+    ClusterComputeResource=ClusterComputeResource,
+    Datastore=Datastore,
+    PerformanceManager=types.SimpleNamespace(MetricId=_MetricId, QuerySpec=_QuerySpec),
+    PropertyCollector=_PROPERTY_COLLECTOR_TYPES,
+    view=types.SimpleNamespace(ContainerView=ContainerView),
+    event=types.SimpleNamespace(EventFilterSpec=_EventFilterSpec),
+    fault=types.SimpleNamespace(InvalidLogin=InvalidLogin),
+)
+
+
+@contextlib.contextmanager
+def use_synthetic_vim():
+    """Sustituye temporalmente ``vmware_healthcheck.vim`` por :data:`vim`."""
+    import vmware_healthcheck
+
+    original = vmware_healthcheck.vim
+    vmware_healthcheck.vim = vim
+    try:
+        yield vim
+    finally:
+        vmware_healthcheck.vim = original
+
+
+PERF_COUNTERS = [
+    ('cpu', 'ready', 'summation'),
+    ('cpu', 'usage', 'average'),
+    ('mem', 'usage', 'average'),
+    ('disk', 'numberRead', 'summation'),
+    ('disk', 'numberWrite', 'summation'),
+    ('net', 'received', 'average'),
+    ('net', 'transmitted', 'average'),
+]
+
+
+def _ns(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+
+class SyntheticInventory:
+    """Inventario generado por :func:`generate_inventory`."""
+
+    def __init__(self, si, stub, hosts, vms, datastores, clusters):
+        self.si = si
+        self.stub = stub
+        self.hosts = hosts
+        self.vms = vms
+        self.datastores = datastores
+        self.clusters = clusters
+
+    def checker(self, cls=None):
+        """Return a ``VMwareHealthCheck`` already attached to this inventory."""
+        if cls is None:
+            from vmware_healthcheck import VMwareHealthCheck as cls
+        checker = cls('synthetic', 'user', 'password')
+        checker.si = self.si
+        return checker
+
+
+def generate_inventory(hosts=10, vms_per_host=10, datastores_per_cluster=4,
+                       hosts_per_cluster=8, perf_samples=1, latency=0.0, seed=0,
+                       events_per_host=4):
+    """Genera un inventario vSphere sintético.
+
+    Parameters
+    ----------
+    hosts : int
+        Número de hosts ESXi.
+    vms_per_host : int
+        Máquinas virtuales registradas en cada host.
+    datastores_per_cluster : int
+        Datastores compartidos por los hosts de cada clúster.
+    hosts_per_cluster : int
+        Hosts agrupados en cada clúster.
+    perf_samples : int
+        Muestras devueltas por serie en ``QueryStats``.
+    latency : float or callable
+        Latencia inyectada en cada llamada al stub.
+    seed : int
+        Semilla para obtener inventarios reproducibles.
+    events_per_host : int
+        Eventos de cada host repartidos en las últimas 48 horas.
+
+    Returns
+    -------
+    SyntheticInventory
+    """
+    rng = random.Random(seed)
+    stub = FakeStub(latency)
+    boot = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    gb = 1024 ** 3
+
+    counters = []
+    for key, (group, name, rollup) in enumerate(PERF_COUNTERS, start=1):
+        counters.append(_ns(
+            key=key, groupInfo=_ns(key=group), nameInfo=_ns(key=name), rollupType=rollup
+        ))
+    vm_stats = {}
+
+    def query_stats(querySpec):
+        result = []
+        for spec in querySpec:
+            base = vm_stats[spec.entity._moId]
+            series = [
+                _ns(id=_ns(counterId=m.counterId, instance=''),
+                    value=[base[m.counterId]] * perf_samples)
+                for m in spec.metricId
+            ]
+            result.append(_ns(entity=spec.entity, value=series))
+        return result
+
+    perf_manager = ManagedObject('PerfMgr', stub, {'perfCounter': counters},
+                                 {'QueryStats': query_stats})
+    assignment = ManagedObject(
+        'LicenseAssignmentManager', stub, {},
+        {'QueryAssignedLicenses': lambda entity=None: [
+            _ns(assignedLicense=_ns(licenseKey='XXXXX-XXXXX-XXXXX-XXXXX-00000'))
+        ]},
+    )
+    license_manager = ManagedObject('LicenseManager', stub,
+                                    {'licenseAssignmentManager': assignment})
+
+    all_hosts = []
+    all_vms = []
+    all_datastores = []
+    clusters = []
+    cluster = None
+    cluster_datastores = []
+    for h in range(hosts):
+        if h % hosts_per_cluster == 0:
+            index = len(clusters)
+            pool = ManagedObject(f'resgroup-{index}', stub, {'resourcePool': [
+                ManagedObject(f'resgroup-{index}-{p}', stub) for p in range(2)
+            ]})
+            cluster = ClusterComputeResource(f'domain-c{index}', stub, {
+                'name': f'cluster-{index:03d}',
+                'configurationEx': _ns(
+                    dasConfig=_ns(enabled=rng.random() > 0.2),
+                    drsConfig=_ns(enabled=rng.random() > 0.2),
+                ),
+                'resourcePool': pool,
+            })
+            clusters.append(cluster)
+            cluster_datastores = []
+            for d in range(datastores_per_cluster):
+                capacity = rng.choice([2, 4, 8]) * 1024 * gb
+                ds = Datastore(f'datastore-{index}-{d}', stub, {
+                    'summary': _ns(
+                        name=f'ds-{index:03d}-{d:02d}',
+                        capacity=capacity,
+                        freeSpace=int(capacity * rng.uniform(0.05, 0.7)),
+                    ),
+                })
+                cluster_datastores.append(ds)
+                all_datastores.append(ds)
+
+        host_name = f'esx{h:05d}.lab.local'
+        host_vms = []
+        for v in range(vms_per_host):
+            moid = f'vm-{h}-{v}'
+            vm_stats[moid] = {
+                1: rng.randint(0, 400),
+                2: rng.randint(100, 9000),
+                3: rng.randint(100, 9000),
+                4: rng.randint(0, 4000),
+                5: rng.randint(0, 4000),
+                6: rng.randint(0, 20000),
+                7: rng.randint(0, 20000),
+            }
+            disk_capacity = rng.choice([40, 80, 200]) * gb
+            vm = VirtualMachine(moid, stub, {
+                'name': f'vm-{h:05d}-{v:03d}',
+                'config': _ns(hardware=_ns(memoryMB=rng.choice([2048, 4096, 8192, 16384]),
+                                           numCPU=rng.choice([1, 2, 4, 8]))),
+                'summary': _ns(quickStats=_ns(balloonedMemory=rng.choice([0] * 9 + [512]))),
+                'snapshot': _ns(rootSnapshotList=[]) if rng.random() < 0.1 else None,
+                'guest': _ns(
+                    toolsStatus=rng.choice(['toolsOk'] * 8 + ['toolsOld', 'toolsNotRunning']),
+                    disk=[_ns(capacity=disk_capacity,
+                              freeSpace=int(disk_capacity * rng.uniform(0.02, 0.9)))],
+                ),
+                'runtime': _ns(powerState=rng.choice(['poweredOn'] * 9 + ['poweredOff']),
+                               host=None),
+            })
+            host_vms.append(vm)
+        all_vms.extend(host_vms)
+
+        cores = rng.choice([16, 32, 64])
+        mhz = 2400
+        memory = rng.choice([256, 512, 1024]) * gb
+        services = ManagedObject(f'serviceSystem-{h}', stub, {'serviceInfo': _ns(service=[
+            _ns(key='TSM-SSH', running=rng.random() < 0.1),
+            _ns(key='TSM', running=rng.random() < 0.05),
+            _ns(key='ntpd', running=True),
+        ])})
+        firewall = ManagedObject(f'firewallSystem-{h}', stub, {'firewallInfo': _ns(ruleset=[
+            _ns(key='sshServer'), _ns(key='vSphereClient'), _ns(key='ntpClient'),
+        ])})
+        pnics = [_ns(device=f'vmnic{n}', linkSpeed=_ns(speedMb=10000)) for n in range(4)]
+        host = HostSystem(f'host-{h}', stub, {
+            'name': host_name,
+            'summary': _ns(
+                config=_ns(name=host_name, product=_ns(fullName='VMware ESXi 8.0.2 build-22380479')),
+                quickStats=_ns(
+                    overallCpuUsage=rng.randint(1, cores * mhz),
+                    overallMemoryUsage=rng.randint(1024, memory // (1024 ** 2)),
+                    overallNetworkUsage=rng.randint(0, 100000),
+                ),
+                hardware=_ns(cpuMhz=mhz, numCpuCores=cores, memorySize=memory),
+            ),
+            'config': _ns(
+                lockdownMode='lockdownDisabled',
+                network=_ns(ipv6Enabled=rng.random() < 0.3, pnic=pnics,
+                            dnsConfig=_ns(hostName=host_name)),
+                dateTimeInfo=_ns(ntpConfig=_ns(server=['pool.ntp.org'] if rng.random() > 0.1 else [])),
+            ),
+            'configManager': _ns(serviceSystem=services, firewallSystem=firewall,
+                                 patchManager=ManagedObject(f'patchManager-{h}', stub)),
+            'hardware': _ns(
+                cpuPkg=[_ns(description='Intel(R) Xeon(R) Gold 6338 CPU @ 2.00GHz')],
+                memorySize=memory,
+                biosInfo=_ns(biosVersion='U46'),
+                systemInfo=_ns(vendor='HPE', model='ProLiant DL380 Gen10 Plus'),
+            ),
+            'runtime': _ns(bootTime=boot),
+            'parent': cluster,
+            'vm': host_vms,
+            'datastore': list(cluster_datastores),
+            'network': [_ns(name='VM Network'), _ns(name='vMotion')],
+        })
+        for vm in host_vms:
+            vm._props['runtime'].host = host
+        all_hosts.append(host)
+
+    def create_container_view(container, type, recursive):
+        wanted = tuple(type)
+        if isinstance(container, HostSystem):
+            candidates = container.__dict__['_props']['vm']
+        else:
+            candidates = all_hosts + all_vms + all_datastores + clusters
+        objects = [o for o in candidates if isinstance(o, wanted)]
+        return ContainerView('view', stub, {'view': objects}, {'Destroy': lambda: None})
+
+    # Separate generator so that the rest of the inventory does not change
+    event_rng = random.Random(seed + 1)
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    names = list(EVENT_TYPES)
+    events = []
+    for host in all_hosts:
+        for _ in range(events_per_host):
+            name = event_rng.choice(names)
+            created = now - datetime.timedelta(hours=event_rng.uniform(0, 48))
+            events.append(EVENT_TYPES[name](len(events), created, host, _EVENT_CATEGORIES[name]))
+    events.sort(key=lambda e: e.createdTime)
+    alarms = [
+        _ns(entity=entity, overallStatus=event_rng.choice(['red', 'yellow', 'green']))
+        for entity in event_rng.sample(all_hosts + all_vms, min(len(all_hosts), 5))
+    ]
+
+    view_manager = ManagedObject('ViewManager', stub, {},
+                                 {'CreateContainerView': create_container_view})
+    content = _ns(
+        rootFolder=ManagedObject('group-d1', stub, {'triggeredAlarmState': alarms}),
+        viewManager=view_manager,
+        perfManager=perf_manager,
+        propertyCollector=_property_collector(stub),
+        licenseManager=license_manager,
+        eventManager=_event_manager(stub, events),
+    )
+    si = ManagedObject('ServiceInstance', stub, {'content': content},
+                       {'RetrieveContent': lambda: content})
+    return SyntheticInventory(si, stub, all_hosts, all_vms, all_datastores, clusters)
@@ -2,7 +2,7 @@ import os
 import sys
 import json
 import types
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 # Provide dummy pyVmomi modules so vmware_healthcheck can be imported without
 # the real pyvmomi dependency.
@@ -354,3 +354,1183 @@ def test_generate_detailed_report(monkeypatch):
     assert recorded['cfg']['api_version'] == 'v'
     assert recorded['model'] == 'm'
 
+
+
+def test_fetch_completion_records_usage(monkeypatch):
+    import openai_connector
+    from llm_usage import LLMUsageTracker
+
+    tracker = LLMUsageTracker(prompt_price_per_1k=1.0, completion_price_per_1k=2.0)
+    monkeypatch.setattr(openai_connector, 'usage_tracker', tracker)
+    openai_connector.clear_completion_cache()
+
+    def fake_create(**kwargs):
+        return {
+            "choices": [{"message": {"content": "hola"}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 50},
+        }
+
+    monkeypatch.setattr(openai_connector.openai.ChatCompletion, 'create', fake_create)
+    messages = [{"role": "user", "content": "x"}]
+    assert openai_connector.fetch_completion(messages, 'm', section='storage') == 'hola'
+    assert openai_connector.fetch_completion(messages, 'm', section='storage') == 'hola'
+
+    summary = tracker.summary()
+    storage = summary['sections']['storage']
+    assert storage['calls'] == 2
+    assert storage['cache_hits'] == 1
+    assert storage['prompt_tokens'] == 100
+    assert storage['completion_tokens'] == 50
+    assert summary['totals']['cost'] == 0.2
+    assert 'Consumo de IA' in tracker.html_footer()
+
+    # The response cache is an LRU and the tracker keeps only recent calls
+    monkeypatch.setattr(openai_connector, '_COMPLETION_CACHE_SIZE', 1)
+    tracker = LLMUsageTracker(max_calls=2)
+    monkeypatch.setattr(openai_connector, 'usage_tracker', tracker)
+    other = [{"role": "user", "content": "y"}]
+    openai_connector.fetch_completion(other, 'm', section='storage')
+    assert len(openai_connector._COMPLETION_CACHE) == 1
+    openai_connector.fetch_completion(messages, 'm', section='storage')
+    summary = tracker.summary()
+    assert summary['sections']['storage']['cache_hits'] == 0
+    assert summary['totals']['calls'] == 2 and summary['calls_dropped'] == 0
+    openai_connector.fetch_completion(messages, 'm', section='storage')
+    summary = tracker.summary()
+    assert (summary['totals']['calls'], len(summary['calls']), summary['calls_dropped']) == (3, 2, 1)
+    assert summary['totals']['prompt_tokens'] == 200
+
+    # A malformed price is ignored instead of breaking configure_openai
+    tracker.set_prices('abc', '-1')
+    tracker.set_prices(None, '0.5')
+    assert (tracker.prompt_price_per_1k, tracker.completion_price_per_1k) == (0.0, 0.5)
+
+
+def test_generate_report_llm_usage_footer(tmp_path):
+    output = tmp_path / 'usage.html'
+    checker = _checker()
+    with patch.object(checker, '_create_chart', return_value='c'):
+        checker.generate_report(HOSTS, VMS, str(output), llm_usage_footer=True)
+
+    assert 'llm-usage' in output.read_text()
+
+
+def test_collect_synthetic_inventory():
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+
+    inventory = generate_inventory(hosts=3, vms_per_host=4, hosts_per_cluster=2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        hosts_data, all_vms, summary = checker.collect()
+        data = checker._build_report_data(hosts_data, all_vms, chart=None)
+
+    assert summary['hosts'] == 3
+    assert summary['vms'] == 12
+    assert len(all_vms) == 12
+    assert hosts_data[0]['performance']['datastores']
+    assert 'cpu_ready_ms' in all_vms[0]['metrics']
+    checker._validate_report_data(data, 'template_full.html')
+
+
+def test_benchmark_pipeline_smoke(tmp_path):
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+    try:
+        import bench_pipeline
+    finally:
+        sys.path.pop(0)
+
+    rows = bench_pipeline.run(hosts=2, vms_per_host=2, datastores=1,
+                              perf_samples=2, latency=0)
+    phases = [r['phase'] for r in rows]
+    assert phases[:4] == ['collect', 'build_report_data', 'build_text_summary', 'create_chart']
+    assert 'render:template_full.html' in phases
+
+
+def test_soap_round_trip_budget():
+    import pytest
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from soap_stats import RoundTripBudgetExceeded
+
+    hosts, vms_per_host = 4, 3
+    inventory = generate_inventory(hosts=hosts, vms_per_host=vms_per_host)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        stats = checker.instrument_soap()
+        checker.collect()
+
+    per_host = {
+        'security_check': 9,
+        'performance_check': 10,
+        'best_practice_check': 8,
+        'get_hosts': 1,
+        '_build_perf_counter_map': 1,
+    }
+    stats.assert_budget(per_host, scale=hosts)
+    # VMs are read in pages and their stats queried in one call per page
+    stats.assert_budget({'vm_inventory': 4, 'vm_page_performance': 2}, scale=hosts)
+    assert stats.calls_for('vm_performance_check') == stats.calls_for('vm_extra_info') == 0
+    assert stats.summary()['types']['PropertyCollector']['calls'] == hosts
+    assert 'unscoped' not in stats.summary()['checks']
+
+    with pytest.raises(RoundTripBudgetExceeded):
+        stats.assert_budget({'vm_page_performance': 1}, scale=hosts)
+
+
+def test_soap_stats_counts_bytes():
+    from soap_stats import SoapCallStats, check_scope
+
+    class Response:
+        def read(self, *a):
+            return b'x' * 10
+
+    class Connection:
+        def request(self, *a, **k):
+            pass
+
+        def getresponse(self):
+            return Response()
+
+    class Stub:
+        def GetConnection(self):
+            return Connection()
+
+        def InvokeMethod(self, mo, info, args):
+            conn = self.GetConnection()
+            conn.request('POST', '/sdk', b'<soap/>', {})
+            return conn.getresponse().read()
+
+    stats = SoapCallStats()
+    stub = stats.instrument(Stub())
+    with check_scope('licensing_check'):
+        stub.InvokeMethod(object(), types.SimpleNamespace(name='QueryAssignedLicenses'), ())
+
+    bucket = stats.summary()['checks']['licensing_check']
+    assert bucket == {'calls': 1, 'bytes_sent': 7, 'bytes_received': 10,
+                      'latency_s': bucket['latency_s'], 'faults': 0}
+
+
+def _soap_body(method, mo_type, moid, extra=''):
+    return (
+        '<soapenv:Envelope><soapenv:Body><{0} xmlns="urn:vim25">'
+        '<_this type="{1}">{2}</_this>{3}</{0}></soapenv:Body></soapenv:Envelope>'
+    ).format(method, mo_type, moid, extra)
+
+
+def _cassette_stub(response_body):
+    class Response:
+        status = 200
+        reason = 'OK'
+
+        def read(self, *a):
+            return response_body
+
+        def getheader(self, name, default=None):
+            return {'Set-Cookie': 'vmware_soap_session=secret'}.get(name, default)
+
+    class Connection:
+        def request(self, method, url, body=None, headers=None):
+            self.body = body
+
+        def getresponse(self):
+            return Response()
+
+    class Stub:
+        version = 'vim.version.version8'
+
+        def GetConnection(self):
+            return Connection()
+
+        def ReturnConnection(self, conn):
+            self.returned = conn
+
+        def InvokeMethod(self, body):
+            conn = self.GetConnection()
+            conn.request('POST', '/sdk', body, {})
+            data = conn.getresponse().read()
+            self.ReturnConnection(conn)
+            return data
+
+    return Stub, Connection
+
+
+def test_cassette_record_and_replay(tmp_path):
+    import time
+    import pytest
+    from soap_cassette import CassetteRecorder, Cassette, replay_stub, CassetteMiss
+
+    body = (b'<result><url>https://vc01.corp/sdk</url><userName>admin</userName>'
+            b'<cookie>vmware_soap_session="52a1"</cookie></result>')
+    Stub, Connection = _cassette_stub(body)
+    live = Stub()
+    recorder = CassetteRecorder(host='vc01.corp')
+    recorder.instrument(live)
+    request = _soap_body('RetrievePropertiesEx', 'PropertyCollector', 'propertyCollector')
+    assert live.InvokeMethod(request) == body
+    assert isinstance(live.returned, Connection)
+    path = str(tmp_path / 'run.cassette.json.gz')
+    recorder.save(path)
+
+    cassette = Cassette.load(path)
+    assert cassette.meta['api_version'] == 'vim.version.version8'
+    stored = cassette.interactions[0]['body']
+    assert 'admin' not in stored and 'vc01.corp' not in stored and '52a1' not in stored
+
+    replayed = replay_stub(Stub(), cassette, latency=0.01)
+    start = time.perf_counter()
+    assert replayed.InvokeMethod(request) == (
+        b'<result><url>https://***/sdk</url><userName>***</userName>'
+        b'<cookie>vmware_soap_session="***"</cookie></result>'
+    )
+    assert time.perf_counter() - start >= 0.01
+    # Same operation on the same object but other arguments is a miss...
+    other = _soap_body('RetrievePropertiesEx', 'PropertyCollector', 'propertyCollector', '<x/>')
+    with pytest.raises(CassetteMiss):
+        replayed.InvokeMethod(other)
+    # ...unless loose matching is requested
+    loose = replay_stub(Stub(), Cassette.load(path, loose=True))
+    assert loose.InvokeMethod(other).startswith(b'<result>')
+
+    with pytest.raises(CassetteMiss):
+        replayed.InvokeMethod(_soap_body('QueryStats', 'PerformanceManager', 'PerfMgr'))
+
+
+def test_cassette_scrubs_only_credential_values():
+    from soap_cassette import CassetteRecorder, Cassette, replay_stub
+
+    # A short user name and an IP must not corrupt unrelated XML
+    content = (b'<returnval><rootFolder type="Folder">group-d1</rootFolder>'
+               b'<about><fullName>VMware vCenter Server 8.0 build-10</fullName></about>'
+               b'<name>esx-10.0.0.1-root</name>'
+               b'<currentSession><userName>root</userName></currentSession></returnval>')
+    Stub, _ = _cassette_stub(content)
+    live = Stub()
+    recorder = CassetteRecorder(host='10.0.0.1')
+    recorder.instrument(live)
+    login = _soap_body('Login', 'SessionManager', 'SessionManager',
+                       '<userName>root</userName><password>root10</password>')
+    retrieve = _soap_body('RetrieveServiceContent', 'ServiceInstance', 'ServiceInstance')
+    live.InvokeMethod(login)
+    live.InvokeMethod(retrieve)
+
+    stored = recorder.cassette.interactions
+    assert '<userName>***</userName><password>***</password>' in stored[0]['request']
+    replayed = replay_stub(Stub(), Cassette(stored))
+    assert replayed.InvokeMethod(retrieve) == content.replace(
+        b'<userName>root</userName>', b'<userName>***</userName>')
+
+
+def test_phase_profiler_json(tmp_path):
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from profiling import PhaseProfiler
+
+    inventory = generate_inventory(hosts=2, vms_per_host=2)
+    profiler = PhaseProfiler(cprofile=True).start()
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        checker.profiler = profiler
+        hosts_data, all_vms, _ = checker.collect()
+        checker.generate_report(hosts_data, all_vms, str(tmp_path / 'r.html'))
+    profiler.stop()
+
+    path = tmp_path / 'profile.json'
+    profiler.write_json(str(path))
+    data = json.loads(path.read_text())
+    phases = data['phases']
+    for name in ('host_enumeration', 'host_checks', 'vm_perf', 'chart', 'render_write'):
+        assert name in phases
+    assert phases['host_checks']['count'] == 2
+    assert phases['host_checks']['peak_kb'] > 0
+    assert data['cprofile_top']
+    assert (tmp_path / 'profile.json.pstats').exists()
+    assert data['peak_kb'] >= phases['host_checks']['peak_kb']
+    assert phases['host_enumeration']['peak_overlapped'] == 0
+
+
+def test_phase_profiler_overlapping_threads():
+    import threading
+    import time
+    from profiling import PhaseProfiler
+
+    profiler = PhaseProfiler().start()
+    started, release = threading.Event(), threading.Event()
+
+    def busy():
+        with profiler.phase('busy'):
+            started.set()
+            while not release.is_set():
+                sum(range(1000))
+
+    worker = threading.Thread(target=busy)
+    worker.start()
+    started.wait(5)
+    with profiler.phase('idle'):
+        time.sleep(0.05)
+    release.set()
+    worker.join()
+    with profiler.phase('alone'):
+        pass
+    profiler.stop()
+
+    phases = profiler.summary()['phases']
+    # CPU is per thread: the other thread's busy loop is not charged to 'idle'
+    assert phases['idle']['cpu_s'] < 0.03 < phases['busy']['cpu_s']
+    assert phases['idle']['peak_overlapped'] == phases['busy']['peak_overlapped'] == 1
+    assert phases['alone']['peak_overlapped'] == 0
+
+
+def test_scheduler_refreshes_families_independently(tmp_path):
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from scheduler import CollectionScheduler, parse_intervals
+
+    inventory = generate_inventory(hosts=2, vms_per_host=2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        stats = checker.instrument_soap()
+        scheduler = CollectionScheduler(
+            checker, parse_intervals(['security=3600', 'vm_performance=60'])
+        )
+        ran = scheduler.run_due(now=0)
+        assert set(ran) == set(scheduler.intervals)
+        assert scheduler.state.is_complete(scheduler.intervals)
+
+        stats.reset()
+        assert scheduler.run_due(now=30) == []
+        ran = scheduler.run_due(now=61)
+        assert ran == ['vm_performance']
+        assert stats.calls_for('security_check') == 0
+        assert stats.calls_for('vm_page_performance') > 0
+
+        stats.reset()
+        with patch.object(checker, '_create_chart', return_value='c'):
+            scheduler.state.generate_report(checker, str(tmp_path / 'live.html'),
+                                            template_file='template_a.html')
+        assert stats.calls_for('licensing_check') == 0
+
+    hosts_data, all_vms, summary = scheduler.state.snapshot()
+    assert summary['hosts'] == 2 and summary['vms'] == 4
+    assert hosts_data[0]['performance']['avg_cpu_ready_ms'] == \
+        VMwareHealthCheck.avg_cpu_ready(hosts_data[0]['vms'])
+    assert (tmp_path / 'live.html').exists()
+
+    # A host whose refresh failed keeps the state incomplete
+    state = scheduler.state
+    state.host_families[hosts_data[1]['name']].discard('security')
+    assert not state.is_complete(scheduler.intervals)
+    assert state.is_complete(['inventory', 'licensing', 'vm_performance'])
+
+    # run_forever drives the report callback of --schedule
+    calls = []
+
+    def after_refresh(now):
+        calls.append(now)
+        if len(calls) == 2:
+            scheduler.stop()
+        return now
+
+    with use_synthetic_vim():
+        scheduler.run_forever(after_refresh=after_refresh)
+    assert len(calls) == 2
+
+
+def test_scheduler_survives_failed_refresh():
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from scheduler import RETRY_DELAY, CollectionScheduler
+
+    inventory = generate_inventory(hosts=2, vms_per_host=1)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        scheduler = CollectionScheduler(checker)
+        get_hosts = checker.get_hosts
+        with patch.object(checker, 'get_hosts', side_effect=ConnectionError('reset')), \
+             patch.object(checker, 'licensing_check', side_effect=ConnectionError('reset')):
+            ran = scheduler.run_due(now=0)
+        assert set(ran) == set(scheduler.intervals)
+        assert not scheduler.state.hosts
+        assert scheduler.next_run['inventory'] == RETRY_DELAY
+        assert scheduler.failures['licensing'] == 1
+
+        assert scheduler.run_due(now=1) == []
+        with patch.object(checker, 'get_hosts', wraps=get_hosts):
+            ran = scheduler.run_due(now=RETRY_DELAY)
+        assert set(ran) == set(scheduler.intervals)
+        assert scheduler.state.is_complete(scheduler.intervals)
+        assert not scheduler.failures
+        assert scheduler.next_run['inventory'] == RETRY_DELAY + scheduler.intervals['inventory']
+
+
+def test_prometheus_metrics_text():
+    from prometheus_exporter import render_metrics
+
+    hosts = [dict(h, vms=[VMS[i]]) for i, h in enumerate(HOSTS)]
+    data = {
+        'health_score': 4.5,
+        'categories': [{'name': 'Rendimiento', 'score': 90}],
+        'indicators': [{'label': 'SSH', 'status': 'warning'},
+                       {'label': 'Name "quoted"', 'status': 'critical'},
+                       {'label': 'IPv6', 'status': 'unknown'},
+                       {'label': 'Other', 'status': 'pending'}],
+    }
+    text = render_metrics(hosts, VMS, data)
+
+    assert '# TYPE vmware_host_cpu_usage_percent gauge' in text
+    assert 'vmware_host_cpu_usage_percent{host="h1"} 10' in text
+    assert 'vmware_vm_cpu_ready_ms{vm="vm1",host="h1"} 50' in text
+    assert 'vmware_vm_ballooned_memory_mb{vm="vm2",host="h2"} 0' in text
+    assert 'vmware_datastore_usage_percent{datastore="ds1"} 70' in text
+    assert 'vmware_health_indicator{indicator="SSH"} 1' in text
+    assert 'vmware_health_indicator{indicator="Name \\"quoted\\""} 2' in text
+    # Unknown is never exported as critical
+    assert 'vmware_health_indicator{indicator="IPv6"} -1' in text
+    assert 'indicator="Other"' not in text
+    assert text.count('# TYPE vmware_vm_iops gauge') == 1
+
+
+def test_metrics_exporter_serves_cached_snapshot():
+    import urllib.request
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from scheduler import CollectionScheduler
+    from prometheus_exporter import MetricsExporter
+
+    inventory = generate_inventory(hosts=2, vms_per_host=2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        stats = checker.instrument_soap()
+        scheduler = CollectionScheduler(checker)
+        exporter = MetricsExporter(scheduler, port=0)
+        # Run one collection cycle in the foreground, then serve it
+        scheduler.run_due(now=0)
+        import time
+        scheduler.next_run = {f: time.monotonic() + 3600 for f in scheduler.next_run}
+        exporter.start()
+        try:
+            stats.reset()
+            url = 'http://127.0.0.1:%d/metrics' % exporter.port
+            body = urllib.request.urlopen(url).read().decode()
+            urllib.request.urlopen(url).read()
+        finally:
+            exporter.stop()
+
+    assert 'vmware_vm_cpu_ready_ms' in body
+    assert 'vmware_health_score' in body
+    assert stats.summary()['totals']['calls'] == 0
+
+
+def test_history_store_trends_and_retention(tmp_path):
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from history_store import HistoryStore, DAY
+
+    inventory = generate_inventory(hosts=2, vms_per_host=2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        hosts_data, all_vms, _ = checker.collect()
+        data = checker._build_report_data(hosts_data, all_vms, chart=None)
+
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    now = 100 * DAY
+    for i in range(40):
+        store.record_run(hosts_data, all_vms, data, ts=now - i * 3600)
+    store.record_run(hosts_data, all_vms, data, ts=now - 60 * DAY)
+    store.record_run(hosts_data, all_vms, data, ts=now - 60 * DAY + 60)
+
+    trends = store.trends(last_n=30)
+    assert len(trends['runs']) == 30
+    assert set(trends['categories']) == {c['name'] for c in data['categories']}
+    assert trends['datastores']
+    assert all(len(points) <= 30 for points in trends['datastores'].values())
+
+    vm = all_vms[0]['name']
+    before = store.conn.execute('SELECT COUNT(*) FROM vm_metrics WHERE vm = ?', (vm,)).fetchone()[0]
+    store.apply_retention(keep_days=365, downsample_after_days=30, now=now)
+    after = store.conn.execute('SELECT COUNT(*) FROM vm_metrics WHERE vm = ?', (vm,)).fetchone()[0]
+    assert before - after == 1
+    store.apply_retention(keep_days=10, downsample_after_days=5, now=now)
+    assert len(store.runs(100)) == 40
+    store.close()
+
+    # The cutoff is aligned to midnight: a day is downsampled once, whole
+    store = HistoryStore(str(tmp_path / 'aligned.db'))
+    now = 100 * DAY + DAY / 2
+    for offset in (-3600, 3600):
+        store.record_run(hosts_data, all_vms, data, ts=now - 30 * DAY + offset)
+    for hours in range(0, 48, 6):
+        store.apply_retention(now=now + hours * 3600)
+    rows = store.conn.execute(
+        'SELECT downsampled, COUNT(*) FROM vm_metrics WHERE vm = ? GROUP BY downsampled', (vm,)
+    ).fetchall()
+    assert rows == [(1, 1)]
+    store.close()
+
+    # A database shared by several vCenters does not mix their trends
+    store = HistoryStore(str(tmp_path / 'shared.db'))
+    other = dict(data, health_score=1.0, categories=[{'name': 'Other', 'score': 10}])
+    for i in range(3):
+        store.record_run(hosts_data, all_vms, data, ts=now + i, vcenter='vc-a')
+        store.record_run(hosts_data, all_vms[:1], other, ts=now + i + 0.5, vcenter='vc-b')
+    store.apply_retention(downsample_after_days=0, now=now + 2 * DAY)
+    trends = store.trends(vcenter='vc-a')
+    assert [r['vms'] for r in trends['runs']] == [len(all_vms)] * 3
+    assert 'Other' not in trends['categories']
+    assert all(len(points) == 1 for points in trends['datastores'].values())
+    assert {r['vcenter'] for r in store.runs(vcenter='vc-b')} == {'vc-b'}
+    assert len(store.runs()) == 6
+    store.close()
+    assert 'trends' in _checker().report_variables([('template_full_es.html', 'es.html')])
+
+
+def test_run_diff_detects_changes(tmp_path):
+    import copy
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from run_diff import Snapshot, diff_snapshots, format_text, render_html
+
+    inventory = generate_inventory(hosts=2, vms_per_host=3)
+    with use_synthetic_vim():
+        hosts_data, all_vms, _ = inventory.checker().collect()
+    Snapshot.from_collection(hosts_data, all_vms).save(str(tmp_path / 'old.json.gz'))
+
+    current = copy.deepcopy(hosts_data)
+    ssh = current[0]['security']['services']['ssh']
+    current[0]['security']['services']['ssh'] = not ssh
+    current[0]['vms'][0]['metrics']['has_snapshot'] = True
+    removed = current[1]['vms'].pop()['name']
+    current[1]['vms'].append({'name': 'vm-new', 'metrics': dict(current[1]['vms'][0]['metrics'])})
+    ds = current[0]['performance']['datastores'][0]
+    ds['usage_pct'] = 95.0 if ds['usage_pct'] < 90 else 50.0
+    current[0]['performance']['cpu_usage_pct'] = 1.0
+
+    result = diff_snapshots(Snapshot.load(str(tmp_path / 'old.json.gz')),
+                            Snapshot.from_collection(current))
+    changes = {(c['kind'], c['name'], c['change']) for c in result['changes']}
+    assert changes == {
+        ('host', current[0]['name'], 'changed'),
+        ('vm', current[0]['vms'][0]['name'], 'changed'),
+        ('vm', removed, 'removed'),
+        ('vm', 'vm-new', 'added'),
+        ('datastore', ds['name'], 'changed'),
+    }
+    host_change = next(c for c in result['changes'] if c['kind'] == 'host')
+    assert host_change['fields'] == [('ssh', ssh, not ssh)]
+    assert result['counts']['vm']['unchanged'] == 4
+    assert f'ssh: {ssh} -> {not ssh}' in format_text(result)
+    assert 'vm-new' in render_html(result)
+
+
+def test_pdf_batch_reuses_fonts_and_print_css(tmp_path, monkeypatch):
+    import html_to_pdf
+
+    created = {'fonts': 0, 'css': []}
+
+    class FakeCSS:
+        def __init__(self, filename=None, font_config=None):
+            created['css'].append(filename)
+
+    class FakeHTML:
+        def __init__(self, filename=None):
+            self.filename = filename
+
+        def write_pdf(self, target, stylesheets=None, font_config=None, **options):
+            assert stylesheets and font_config is not None and 'cache' in options
+            with open(target, 'wb') as f:
+                f.write(b'%PDF-fake')
+
+    def font_configuration():
+        created['fonts'] += 1
+        return object()
+
+    fake = types.ModuleType('weasyprint')
+    fake.__version__ = '62.1'
+    fake.HTML = FakeHTML
+    fake.CSS = FakeCSS
+    monkeypatch.setitem(sys.modules, 'weasyprint', fake)
+    monkeypatch.setattr(html_to_pdf, '_font_configuration', font_configuration)
+    monkeypatch.setattr(html_to_pdf, '_WORKER_STATE', None)
+
+    jobs = []
+    for i in range(3):
+        src = tmp_path / f'r{i}.html'
+        src.write_text('<html><body>x</body></html>')
+        jobs.append((str(src), html_to_pdf.pdf_path_for(str(src))))
+    results = html_to_pdf.convert_batch(jobs, workers=1)
+
+    assert [r['error'] for r in results] == [None, None, None]
+    assert all(os.path.exists(pdf) for _, pdf in jobs)
+    assert created['fonts'] == 1
+    assert created['css'] == [html_to_pdf.PRINT_CSS]
+
+
+def test_sharded_report_pages(tmp_path):
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from sharded_report import write_sharded_report
+
+    inventory = generate_inventory(hosts=3, vms_per_host=2, hosts_per_cluster=2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        hosts_data, all_vms, _ = checker.collect()
+        index = write_sharded_report(checker, hosts_data, all_vms, str(tmp_path / 'out'),
+                                     workers=1)
+
+    assert {h['cluster']['name'] for h in hosts_data} == {'cluster-000', 'cluster-001'}
+    assert os.path.basename(index) == 'index.html'
+    assert sorted(os.listdir(tmp_path / 'out' / 'clusters')) == ['cluster-000.html', 'cluster-001.html']
+    assert len(os.listdir(tmp_path / 'out' / 'hosts')) == 3
+    assert (tmp_path / 'out' / 'report.css').exists()
+    assert (tmp_path / 'out' / 'hosts' / f"{hosts_data[0]['name']}.html").exists()
+    assert 'Hosts: 3' in open(index, encoding='utf-8').read()
+
+    # A --template directory without the shard assets falls back to the bundled ones
+    custom = tmp_path / 'custom'
+    custom.mkdir()
+    (custom / 'template_shard_index.html').write_text('custom index {{ hosts }}', encoding='utf-8')
+    with use_synthetic_vim():
+        index = write_sharded_report(checker, hosts_data, all_vms, str(tmp_path / 'mixed'),
+                                     template_dir=str(custom), workers=1)
+    assert open(index, encoding='utf-8').read().startswith('custom index 3')
+    assert len(os.listdir(tmp_path / 'mixed' / 'hosts')) == 3
+    assert (tmp_path / 'mixed' / 'report.css').read_text(encoding='utf-8')
+
+
+def test_compact_report_embeds_compressed_rows(tmp_path):
+    import re
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from compact_report import decode_payload
+
+    inventory = generate_inventory(hosts=2, vms_per_host=3)
+    out = tmp_path / 'compact.html'
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        hosts_data, all_vms, _ = checker.collect()
+        with patch.object(checker, '_create_chart') as chart:
+            checker.generate_report(hosts_data, all_vms, str(out),
+                                    template_file='template_compact.html')
+    chart.assert_not_called()
+
+    text = out.read_text(encoding='utf-8')
+    match = re.search(r'<script id="report-data"[^>]*>([^<]+)</script>', text)
+    payload = decode_payload(match.group(1))
+    assert len(payload['vms']['rows']) == 6
+    assert len(payload['hosts']['rows']) == 2
+    assert payload['vms']['columns'][0] == 'VM'
+    assert payload['vms']['rows'][0][1] == hosts_data[0]['name']
+
+
+def test_report_pipeline_runs_only_template_producers(tmp_path):
+    from report_pipeline import ReportPipeline, report_producers
+
+    checker = _checker()
+    pipeline = ReportPipeline(report_producers(checker, HOSTS, VMS))
+    assert pipeline.resolve({'health_score', 'chart'}) == {'scores', 'chart'}
+    assert pipeline.resolve({'performance_text'}) == {
+        'ai_performance', 'openai', 'scores', 'usage', 'top_lists'
+    }
+
+    output = tmp_path / 'basic.html'
+    with patch.object(checker, '_create_chart') as chart, \
+         patch.object(checker, '_create_chart_svg', wraps=checker._create_chart_svg) as svg, \
+         patch.object(checker, 'licensing_check') as licensing, \
+         patch('openai_connector.fetch_completion') as completion:
+        checker.generate_report(HOSTS, VMS, str(output))
+    svg.assert_called_once()
+    chart.assert_not_called()
+    licensing.assert_not_called()
+    completion.assert_not_called()
+    assert output.exists()
+
+
+def test_report_data_built_once_per_collection(tmp_path):
+    checker = _checker()
+    with patch.object(checker, '_create_chart', return_value='c'), \
+         patch.object(checker, 'licensing_check', return_value=['key']) as licensing, \
+         patch.object(checker, '_report_indicators',
+                      wraps=checker._report_indicators) as indicators:
+        checker.build_text_summary(HOSTS, {}, VMS)
+        checker.generate_report(HOSTS, VMS, str(tmp_path / 'a.html'),
+                                template_file='template_a.html')
+        data = checker._build_report_data(HOSTS, VMS, chart=None)
+        assert indicators.call_count == 1
+        assert licensing.call_count == 1
+        assert data['chart'] is None
+
+        other = [dict(h) for h in HOSTS]
+        checker._build_report_data(other, VMS, chart=None)
+        assert indicators.call_count == 2
+        assert licensing.call_count == 1
+
+        checker.cache.invalidate()
+        checker._build_report_data(other, VMS, chart=None)
+        assert indicators.call_count == 3
+        assert licensing.call_count == 2
+
+
+def test_generate_reports_share_data_and_ai_sections(tmp_path):
+    from vmware_healthcheck import parse_outputs
+
+    assert parse_outputs(['template_full_es.html:es.html', 'C:\\r\\a.html'], 'template.html') == [
+        ('template_full_es.html', 'es.html'), ('template.html', 'C:\\r\\a.html'),
+    ]
+
+    import contextlib
+    import importlib
+    from report_pipeline import AI_FULL_SECTIONS, AI_SECTIONS
+
+    modules = [importlib.import_module(f'report_sections.{name}')
+               for name in [m for m, _, _ in AI_SECTIONS.values()] + list(AI_FULL_SECTIONS.values())]
+
+    def ai_calls(outputs):
+        checker = _checker()
+        completion = MagicMock(return_value='AI text')
+        with contextlib.ExitStack() as stack:
+            for module in modules:
+                stack.enter_context(patch.object(module, 'fetch_completion', completion))
+            stack.enter_context(patch.object(checker, '_create_chart', return_value='c'))
+            licensing = stack.enter_context(
+                patch.object(checker, 'licensing_check', return_value=['key']))
+            paths = [str(tmp_path / f'{i}_{t}') for i, t in enumerate(outputs)]
+            written = []
+            checker.generate_reports(HOSTS, VMS, list(zip(outputs, paths)),
+                                     on_written=lambda p: written.append(os.path.exists(p) and p))
+        assert licensing.call_count == 1
+        # Each report is announced once, already on disk
+        assert sorted(written) == sorted(paths)
+        return completion.call_count
+
+    names = ['template_full.html', 'template_a_detailed.html', 'template_full_es.html']
+    full = ai_calls(names[:1])
+    detailed = ai_calls(names[1:2])
+    both = ai_calls(names)
+    # The four area sections are requested once for both templates
+    assert both == full < full + detailed
+    for i, t in enumerate(names):
+        assert (tmp_path / f'{i}_{t}').exists()
+    assert 'AI text' in (tmp_path / '0_template_full.html').read_text()
+
+
+def test_svg_charts_are_cached_by_content():
+    import xml.dom.minidom
+    import svg_charts
+
+    svg_charts.cache.clear()
+    hosts = [dict(h, performance=dict(h['performance'], datastores=[
+        {'name': 'ds1', 'usage_pct': 95.0}, {'name': 'ds<2>', 'usage_pct': 10.0},
+    ])) for h in HOSTS]
+    first = svg_charts.host_usage_chart(hosts)
+    again = svg_charts.host_usage_chart([dict(h) for h in hosts])
+    assert first is again
+    assert svg_charts.cache.hits == 1
+    xml.dom.minidom.parseString(first)
+
+    datastores = svg_charts.datastore_usage_chart(hosts)
+    xml.dom.minidom.parseString(datastores)
+    assert 'ds&lt;2&gt;' in datastores
+    assert svg_charts.STATUS_COLORS['critical'] in datastores
+
+
+def test_svg_charts_aggregate_large_inventories():
+    import svg_charts
+
+    hosts = [{'name': f'h{i}', 'cluster': {'name': f'c{i % 5}'},
+              'performance': {'cpu_usage_pct': i % 100, 'memory_usage_pct': 50}}
+             for i in range(200)]
+    view = svg_charts.host_usage_view(hosts)
+    assert view['view'] == 'clusters'
+    assert view['names'][0] == 'c0 (40)'
+
+    standalone = [dict(h, cluster=None) for h in hosts]
+    view = svg_charts.host_usage_view(standalone, top_n=10)
+    assert view['view'] == 'top'
+    assert view['names'][-1] == 'Others (190)'
+    assert view['series'][0][1][0] == 99
+
+    stats = svg_charts.usage_stats([h['performance']['cpu_usage_pct'] for h in hosts])
+    assert stats['counts'] == [20] * 10
+    assert dict(stats['percentiles'])[50] == 49.5
+    histogram = svg_charts.usage_histogram_chart(hosts)
+    assert "viewBox='0 0 800 320'" in histogram
+    assert svg_charts.usage_histogram_chart(hosts[:5]) == ''
+
+
+def test_reports_are_minified_and_precompressed(tmp_path):
+    import gzip
+    from report_output import minify_html
+
+    html = "<p>a  <b>b</b>\n   c</p><!-- note --><pre>  keep\n  this</pre><style> a { color : red ; } </style>"
+    assert minify_html(html) == "<p>a <b>b</b> c</p><pre>  keep\n  this</pre><style>a{color:red}</style>"
+
+    checker = _checker()
+    output = tmp_path / 'full.html'
+    with patch.object(checker, 'licensing_check', return_value=['key']):
+        checker.generate_report(HOSTS, VMS, str(output), template_file='template_full.html',
+                                precompress=('gz',))
+        checker.generate_report(HOSTS, VMS, str(tmp_path / 'raw.html'),
+                                template_file='template_full.html', minify=False)
+    text = output.read_text(encoding='utf-8')
+    assert '\n' not in text.split('<script')[0]
+    assert len(text) < len((tmp_path / 'raw.html').read_text(encoding='utf-8'))
+    assert gzip.decompress((tmp_path / 'full.html.gz').read_bytes()).decode('utf-8') == text
+    assert not (tmp_path / 'raw.html.gz').exists()
+
+
+def test_transport_options_reach_smart_connect():
+    from transport import TransportConfig
+
+    # Stand-in for pyVmomi's SoapStubAdapter (compression on by default)
+    stub = types.SimpleNamespace(poolSize=5, _acceptCompressedResponses=True)
+    conn = types.SimpleNamespace(sock=MagicMock())
+    stub.GetConnection = lambda: conn
+    si = types.SimpleNamespace(_stub=stub)
+    checker = _checker()
+    checker.transport = TransportConfig(connect_timeout=5, read_timeout=120, pool_size=12,
+                                        compression=False, ca_bundle=None, verify=False)
+    with patch('vmware_healthcheck.SmartConnect', return_value=si) as smart_connect:
+        checker.connect()
+    kwargs = smart_connect.call_args.kwargs
+    assert kwargs['httpConnectionTimeout'] == 5
+    assert 'customHeaders' not in kwargs
+    assert kwargs['sslContext'] is TransportConfig().ssl_context()
+    assert stub._acceptCompressedResponses is False
+    assert stub.poolSize == 12
+    assert stub.GetConnection() is conn
+    conn.sock.settimeout.assert_called_once_with(120)
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+    try:
+        import bench_transport
+    finally:
+        sys.path.pop(0)
+    body = bench_transport.retrieve_properties_response(200)
+    server, port = bench_transport.start_server(body)
+    try:
+        plain = bench_transport.run(port, 2, compression=False, keep_alive=True)
+        gzipped = bench_transport.run(port, 2, compression=True, keep_alive=False)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert plain['bytes'] == 2 * len(body) and plain['connections'] == 1
+    assert gzipped['bytes'] < plain['bytes'] / 5 and gzipped['connections'] == 2
+
+
+def test_transport_compression_toggles_soap_stub_adapter():
+    import pytest
+    from transport import TransportConfig
+
+    soap_adapter = pytest.importorskip('pyVmomi.SoapAdapter')
+    stub = soap_adapter.SoapStubAdapter('localhost')
+    assert stub._acceptCompressedResponses
+    TransportConfig(compression=False).apply(stub)
+    assert stub._acceptCompressedResponses is False
+    TransportConfig().apply(stub)
+    assert stub._acceptCompressedResponses is True
+
+
+def test_events_are_paged_and_aggregated_per_host():
+    from event_collector import collect_events
+    from synthetic_inventory import generate_inventory, use_synthetic_vim, vim
+
+    inventory = generate_inventory(hosts=6, vms_per_host=2, events_per_host=30)
+    manager = inventory.si.content.eventManager
+    summary = collect_events(inventory.si, vim, hours=24, page_size=7)
+    # Only warning/error events of the last 24 hours are returned by the collector
+    assert 0 < summary.total_events < 6 * 30
+    assert summary.pages == -(-summary.total_events // 7)
+    assert manager.collectors == []
+    host = inventory.hosts[0]
+    counts = summary.for_host(host)
+    assert counts['alert_count'] >= counts['sla_violations']
+
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        stats = checker.instrument_soap()
+        hosts_data, all_vms, _ = checker.collect()
+        data = checker._report_summary(hosts_data, all_vms)
+    assert data['alerts'] == sum(h['runtime']['alert_count'] for h in hosts_data) > 0
+    violated = sum(1 for h in hosts_data if h['runtime']['sla_violations'])
+    assert data['sla'] == f"{round(100 * (1 - violated / 6), 1):g}%"
+    # Collected once for every host
+    assert stats.summary()['checks']['event_summary']['calls'] < 20
+
+    checker.events_window_hours = 0
+    checker.cache.invalidate()
+    assert checker.event_summary().for_host(host) == {'alert_count': 0, 'sla_violations': 0}
+
+
+def test_section_cache_reuses_unchanged_sections(tmp_path):
+    import contextlib
+    import copy
+    import importlib
+    from report_pipeline import AI_FULL_SECTIONS, AI_SECTIONS
+    from section_cache import SectionCache, payload_hash
+
+    assert payload_hash({'a': 1, 'uptime_seconds': 5}) == payload_hash({'a': 1, 'uptime_seconds': 9})
+    modules = [importlib.import_module(f'report_sections.{name}')
+               for name in [m for m, _, _ in AI_SECTIONS.values()] + list(AI_FULL_SECTIONS.values())]
+    cache_file = tmp_path / 'sections.json'
+
+    def run(hosts):
+        checker = _checker()
+        checker.section_cache = SectionCache(str(cache_file))
+        completion = MagicMock(return_value='AI text')
+        with contextlib.ExitStack() as stack:
+            for module in modules:
+                stack.enter_context(patch.object(module, 'fetch_completion', completion))
+            stack.enter_context(patch.object(checker, 'licensing_check', return_value=['key']))
+            svg = stack.enter_context(patch.object(
+                checker, '_create_chart_svg', wraps=checker._create_chart_svg))
+            checker.generate_reports(hosts, VMS, [('template_full.html', str(tmp_path / 'r.html')),
+                                                  ('template.html', str(tmp_path / 'c.html'))])
+        return completion.call_count, svg.call_count, checker.section_cache
+
+    first, charts, _ = run(HOSTS)
+    assert first > 0 and charts == 1
+    again, charts, cache = run(copy.deepcopy(HOSTS))
+    assert (again, charts) == (0, 0)
+    assert cache.summary()['misses'] == 0
+    assert 'AI text' in (tmp_path / 'r.html').read_text()
+
+    changed = copy.deepcopy(HOSTS)
+    changed[0]['performance']['datastores'][0]['usage_pct'] = 99.0
+    partial, charts, _ = run(changed)
+    # storage_text and the three whole-report sections of template_full are
+    # regenerated; performance, security and availability are reused
+    assert (first, partial, charts) == (7, 4, 1)
+
+
+def test_collection_plan_skips_properties_unused_by_template():
+    import argparse
+    from collection_plan import CollectionPlan, used_fields
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+    from vmware_healthcheck import collection_plan_for_args
+
+    assert used_fields("{% for k, v in host.performance.items() if k in ['cpu_usage'] %}") == set()
+    assert 'performance.firmware' in used_fields("{% for k, v in host.performance.items() %}")
+
+    args = argparse.Namespace(full_collection=False, diff=None, save_snapshot=None,
+                              template=None, output_dir=None, detailed_report=None,
+                              outputs=[('template_a.html', 'a.html')])
+    plan = collection_plan_for_args(args)
+    assert plan.skipped == {'performance.network', 'performance.firmware',
+                            'best_practice.firmware', 'best_practice.cpu_model',
+                            'best_practice.memory_total_gb'}
+    args.outputs = [('template_a.html', 'a.html'), ('template_full.html', 'f.html')]
+    assert collection_plan_for_args(args).full
+
+    hosts = 3
+    with use_synthetic_vim():
+        full = generate_inventory(hosts=hosts, vms_per_host=2).checker()
+        full_stats = full.instrument_soap()
+        full.collect()
+        planned = generate_inventory(hosts=hosts, vms_per_host=2).checker()
+        planned.plan = plan
+        stats = planned.instrument_soap()
+        hosts_data, all_vms, _ = planned.collect()
+    calls = lambda s, check: s.summary()['checks'][check]['calls']
+    assert calls(full_stats, 'performance_check') - calls(stats, 'performance_check') == 2 * hosts
+    assert calls(full_stats, 'best_practice_check') - calls(stats, 'best_practice_check') == hosts
+    summary = plan.summary()
+    assert summary['round_trips_saved'] == 3 * hosts
+    assert summary['skipped_properties'] == ['hardware.biosInfo', 'hardware.cpuPkg',
+                                             'hardware.memorySize', 'hardware.systemInfo']
+    assert 'firmware' not in hosts_data[0]['performance']
+    assert hosts_data[0]['best_practice']['network']
+    planned._validate_report_data(planned._build_report_data(hosts_data, all_vms, chart=None),
+                                  'template_a.html')
+    assert CollectionPlan().summary()['round_trips_saved'] == 0
+
+
+def test_collection_plan_falls_back_to_full_and_reports_skipped_as_unknown():
+    import argparse
+    import copy
+    from vmware_healthcheck import collection_plan_for_args
+
+    args = argparse.Namespace(full_collection=False, diff=None, save_snapshot=None,
+                              template=None, output_dir=None, detailed_report=None,
+                              outputs=[('template_full_es.html', 'es.html')])
+    assert 'security.ipv6_enabled' in collection_plan_for_args(args).skipped
+    # build_text_summary sends the IPv6 indicator to the model
+    args.detailed_report = 'detail.txt'
+    assert 'security.ipv6_enabled' not in collection_plan_for_args(args).skipped
+
+    # A template that Jinja2 cannot load renders the default report instead
+    with patch.object(DummyEnvironment, 'get_template', side_effect=SyntaxError('bad')):
+        assert collection_plan_for_args(args).full
+    with patch.dict(sys.modules, {'jinja2': None}):
+        assert collection_plan_for_args(args).full
+
+    hosts = copy.deepcopy(HOSTS)
+    checker = _checker()
+    with patch.object(checker, 'licensing_check', return_value=['key']):
+        ipv6 = lambda: next(i for i in checker._report_indicators(hosts, VMS)['indicators']
+                            if i['label'] == 'IPv6')
+        assert (ipv6()['status'], ipv6()['text']) == ('ok', 'Disabled')
+        for h in hosts:
+            del h['security']['ipv6_enabled']
+        checker.cache.invalidate()
+        assert (ipv6()['status'], ipv6()['text']) == ('unknown', 'Unknown')
+
+
+def test_adaptive_limiter_backs_off_when_vcenter_slows():
+    import time
+    from concurrency import AdaptiveLimiter, parse_rate_limits
+    from soap_stats import SoapCallStats
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+
+    assert parse_rate_limits(['5', 'vc1=2'], 'vc1') == 2
+    assert parse_rate_limits(['5', 'vc1=2'], 'vc2') == 5
+
+    limiter = AdaptiveLimiter(8, window=10)
+    # Each call gets slower the more hosts are collected at once
+    inventory = generate_inventory(hosts=12, vms_per_host=1,
+                                   latency=lambda mo, name: 0.0005 * limiter.in_flight ** 2)
+    with use_synthetic_vim():
+        checker = inventory.checker()
+        checker.workers = 8
+        checker.limiter = limiter
+        stats = SoapCallStats()
+        stats.instrument(inventory.stub)
+        limiter.attach(stats)
+        hosts_data, _, summary = checker.collect()
+
+    assert [h['name'] for h in hosts_data] == [h.name for h in inventory.hosts]
+    data = limiter.summary()
+    assert data['calls'] == stats.summary()['totals']['calls']
+    assert data['increases'] and data['throttle_events']
+    assert data['throttle_events'][0]['to'] < data['throttle_events'][0]['from']
+    assert 2 <= data['peak_in_flight'] < 8
+
+    paced = AdaptiveLimiter(1, max_calls_per_second=100)
+    start = time.monotonic()
+    for _ in range(11):
+        paced.wait_for_call()
+    assert time.monotonic() - start >= 0.09
+    assert paced.summary()['rate_waits'] == 10
+
+
+def test_vm_inventory_is_paged_and_matches_per_vm_reads():
+    from vm_inventory import iter_vm_pages, iter_vms
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+
+    inventory = generate_inventory(hosts=3, vms_per_host=5)
+    collector = inventory.si.content.propertyCollector
+    with use_synthetic_vim() as vim:
+        pages = list(iter_vm_pages(inventory.si, vim, page_size=4))
+        assert [len(p) for p in pages] == [4, 4, 4, 3]
+        assert [r.name for p in pages for r in p] == [vm.name for vm in inventory.vms]
+        assert pages[0][0].config.hardware.numCPU == inventory.vms[0].config.hardware.numCPU
+
+        # Stopping early releases the result set still held by vCenter
+        stream = iter_vms(inventory.si, vim, page_size=4)
+        next(stream)
+        assert collector.pending
+        stream.close()
+        assert not collector.pending
+
+        paged = inventory.checker()
+        paged.vm_page_size = 2
+        paged_hosts, paged_vms, _ = paged.collect()
+        per_vm = inventory.checker()
+        per_vm.vm_page_size = 0
+        hosts_data, all_vms, _ = per_vm.collect()
+
+    assert paged_vms == all_vms
+    assert [len(h['vms']) for h in paged_hosts] == [5, 5, 5]
+
+
+def test_streaming_report_overlaps_aggregation_and_ai_sections(tmp_path):
+    import contextlib
+    import importlib
+    from report_aggregates import ReportAggregates
+    from report_pipeline import AI_FULL_SECTIONS, AI_SECTIONS
+    from streaming_report import StreamingReport
+    from synthetic_inventory import generate_inventory, use_synthetic_vim
+
+    modules = [importlib.import_module(f'report_sections.{name}')
+               for name in [m for m, _, _ in AI_SECTIONS.values()] + list(AI_FULL_SECTIONS.values())]
+    completion = MagicMock(return_value='AI text')
+    hosts = 6
+    inventory = generate_inventory(hosts=hosts, vms_per_host=5)
+    outputs = [('template_full.html', str(tmp_path / 'full.html'))]
+    with use_synthetic_vim(), contextlib.ExitStack() as stack:
+        for module in modules:
+            stack.enter_context(patch.object(module, 'fetch_completion', completion))
+        checker = inventory.checker()
+        stream = StreamingReport(checker, checker.report_variables(outputs), queue_size=1).start()
+        hosts_data, all_vms, _ = checker.collect(on_host=stream.on_host)
+        # With one queued record, the others were aggregated during collection
+        assert stream.aggregates.hosts >= hosts - 2
+        stream.finish(hosts_data, all_vms)
+
+        context, ran = stream.result(hosts_data, timeout=10)
+        # The AI sections ran before any report was requested
+        assert completion.call_count == 7
+        assert 'ai_performance' in ran and 'trends' not in ran
+        reports = stack.enter_context(patch.object(checker, '_report_part',
+                                                   wraps=checker._report_part))
+        checker.generate_reports(hosts_data, all_vms, outputs, trends={'health': []},
+                                 prepared=stream)
+
+    assert completion.call_count == 7
+    reports.assert_not_called()
+    assert 'AI text' in (tmp_path / 'full.html').read_text()
+    batch = ReportAggregates.from_data(hosts_data, all_vms)
+    assert stream.aggregates.top_lists() == batch.top_lists()
+    assert stream.aggregates.indicators(['key'], [], 0) == batch.indicators(['key'], [], 0)
+    assert context['categories'] == batch.scores()['categories']
+    assert stream.summary()['hosts'] == hosts
+
+    # Licenses are only looked up when a template uses the indicators
+    checker = _checker()
+    with patch.object(checker, 'licensing_check', return_value=['key']) as licensing:
+        stream = StreamingReport(checker, {'cpu_hosts'}).start()
+        stream.finish(HOSTS, VMS)
+        assert stream.result(HOSTS, timeout=10)[1] == ('usage',)
+        licensing.assert_not_called()
+        stream = StreamingReport(checker, {'key_risks'}).start()
+        stream.finish(HOSTS, VMS)
+        stream.result(HOSTS, timeout=10)
+        licensing.assert_called_once()
+
+
+def test_report_indicators_use_folder_and_backup_checks():
+    checker = _checker()
+    with patch.object(checker, 'licensing_check', return_value=['key']), \
+         patch.object(checker, 'backup_config_check', return_value=3) as backups, \
+         patch.object(checker, 'folder_inconsistencies', return_value=['vm1']) as folders:
+        indicators = {i['label']: i for i in checker._report_indicators(HOSTS, VMS)['indicators']}
+    folders.assert_called_once_with(VMS)
+    backups.assert_called_once_with(VMS)
+    assert (indicators['Folders']['status'], indicators['Folders']['text']) == ('warning', '1 dup')
+    assert indicators['Backups']['text'] == 'Configured'
+
+
+def test_event_window_is_pinned_when_replaying():
+    import datetime
+    import pytest
+    from event_collector import EventSummary
+    from soap_cassette import Cassette, CassetteMiss, CassetteRecorder
+
+    checker = _checker()
+    checker.events_window_hours = 24
+    windows = []
+
+    def fake_collect(si, vim_mod, hours, now=None):
+        windows.append(now)
+        return EventSummary(now - datetime.timedelta(hours=hours), now)
+
+    checker.recorder = CassetteRecorder()
+    with patch('vmware_healthcheck.collect_events', side_effect=fake_collect):
+        checker._collect_events()
+        recorded = checker.recorder.cassette.meta['event_windows']
+        assert recorded == [windows[0].isoformat()]
+
+        checker.recorder = None
+        checker.replaying = True
+        checker.si = types.SimpleNamespace(_stub=types.SimpleNamespace(
+            cassette=Cassette(meta={'event_windows': recorded})))
+        assert checker._collect_events().until == windows[0]
+        assert checker._collect_events().until == windows[0]
+
+        # Cassettes without the window cannot be replayed; a miss is not "no events"
+        checker.si._stub.cassette.meta = {}
+        with pytest.raises(CassetteMiss):
+            checker._collect_events()
+    with patch('vmware_healthcheck.collect_events', side_effect=CassetteMiss('CreateCollectorForEvents')):
+        checker.si._stub.cassette.meta = {'event_windows': recorded}
+        with pytest.raises(CassetteMiss):
+            checker._collect_events()
@@ -0,0 +1,159 @@
+"""Configuración del transporte SOAP con vCenter.
+
+:class:`TransportConfig` reúne los parámetros de la conexión de pyVmomi que
+antes quedaban con sus valores por defecto:
+
+* ``connect_timeout`` y ``read_timeout``: segundos para abrir la conexión y
+  para esperar cada respuesta (sin límite por defecto en pyVmomi).
+* ``compression``: pide respuestas comprimidas con gzip
+  (``Accept-Encoding``), que pyVmomi descomprime al leerlas. Las respuestas
+  de ``RetrievePropertiesEx`` son XML muy repetitivo y se reducen más de un
+  80 %. ``SoapStubAdapter`` ya las pide por defecto y fija la cabecera después
+  de ``customHeaders``, y ``SmartConnect`` no permite cambiarlo, así que
+  :meth:`TransportConfig.apply` ajusta ``_acceptCompressedResponses`` en el
+  stub ya conectado.
+* ``pool_size`` y ``pool_idle_timeout``: conexiones keep-alive que el stub
+  mantiene abiertas para reutilizarlas entre llamadas (y entre hilos).
+* ``ca_bundle``/``verify``: verificación del certificado de vCenter. Sin
+  ellos se mantiene el comportamiento anterior (sin verificar).
+
+El contexto SSL se crea una vez por configuración y lo comparten todas las
+conexiones que se abren con ella.
+"""
+
+import logging
+import ssl
+import threading
+
+logger = logging.getLogger(__name__)
+
+# pyVmomi's own defaults
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_IDLE_TIMEOUT = 900
+
+_SSL_CONTEXTS = {}
+_SSL_LOCK = threading.Lock()
+
+
+def ssl_context(verify=False, ca_bundle=None):
+    """Devuelve (creándolo la primera vez) el contexto SSL de la configuración."""
+    key = (bool(verify or ca_bundle), ca_bundle)
+    with _SSL_LOCK:
+        context = _SSL_CONTEXTS.get(key)
+        if context is None:
+            if key[0]:
+                context = ssl.create_default_context(cafile=ca_bundle)
+            else:
+                context = ssl._create_unverified_context()
+            _SSL_CONTEXTS[key] = context
+        return context
+
+
+class TransportConfig:
+    """Parámetros del transporte SOAP.
+
+    Parameters
+    ----------
+    connect_timeout : float, optional
+        Segundos para establecer cada conexión HTTP.
+    read_timeout : float, optional
+        Segundos de espera de cada respuesta una vez conectado; por defecto
+        igual a ``connect_timeout``.
+    compression : bool, optional
+        Pide respuestas con ``Content-Encoding: gzip``.
+    pool_size : int, optional
+        Conexiones keep-alive que conserva el stub; conviene igualarlo al
+        número de hilos de recopilación.
+    pool_idle_timeout : float, optional
+        Segundos que una conexión inactiva permanece en el pool.
+    ca_bundle : str, optional
+        Archivo PEM con las CA de confianza; activa la verificación.
+    verify : bool, optional
+        Verifica el certificado con las CA del sistema.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, compression=True,
+                 pool_size=DEFAULT_POOL_SIZE, pool_idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+                 ca_bundle=None, verify=False):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout if read_timeout is not None else connect_timeout
+        self.compression = compression
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self.ca_bundle = ca_bundle
+        self.verify = verify
+
+    @classmethod
+    def from_args(cls, args):
+        """Build the configuration from the ``main()`` command line options."""
+        return cls(
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            compression=args.soap_compression,
+            pool_size=args.pool_size,
+            pool_idle_timeout=args.pool_idle_timeout,
+            ca_bundle=args.ca_bundle,
+            verify=args.verify_ssl,
+        )
+
+    def ssl_context(self):
+        return ssl_context(self.verify, self.ca_bundle)
+
+    def headers(self):
+        """Cabeceras HTTP que envía el stub con esta configuración."""
+        return {'Accept-Encoding': 'gzip, deflate' if self.compression else 'identity'}
+
+    def smart_connect_kwargs(self):
+        """Argumentos adicionales para ``pyVim.connect.SmartConnect``."""
+        kwargs = {
+            'sslContext': self.ssl_context(),
+            'connectionPoolTimeout': self.pool_idle_timeout,
+        }
+        if self.connect_timeout is not None:
+            kwargs['httpConnectionTimeout'] = self.connect_timeout
+        return kwargs
+
+    def apply(self, stub):
+        """Ajusta el stub ya conectado: compresión, pool y timeout de lectura."""
+        if hasattr(stub, 'poolSize'):
+            stub.poolSize = self.pool_size
+        if hasattr(stub, '_acceptCompressedResponses'):
+            # Read by SoapStubAdapter.InvokeMethod on every call
+            stub._acceptCompressedResponses = self.compression
+        if self.read_timeout is None or self.read_timeout == self.connect_timeout:
+            return stub
+        wrapped = getattr(stub, '_read_timeout', None) is not None
+        stub._read_timeout = self.read_timeout
+        if wrapped or not hasattr(stub, 'GetConnection'):
+            return stub
+        get_connection = stub.GetConnection
+
+        def connection_with_read_timeout(*args, **kwargs):
+            conn = get_connection(*args, **kwargs)
+            if not getattr(conn, '_read_timeout_set', False):
+                _set_read_timeout(conn, stub._read_timeout)
+            return conn
+
+        stub.GetConnection = connection_with_read_timeout
+        return stub
+
+    def describe(self):
+        return (f"timeouts={self.connect_timeout}/{self.read_timeout}s "
+                f"compression={'gzip' if self.compression else 'off'} "
+                f"pool={self.pool_size} idle={self.pool_idle_timeout}s "
+                f"verify={'yes' if self.verify or self.ca_bundle else 'no'}")
+
+
+def _set_read_timeout(conn, timeout):
+    """Aplica ``timeout`` al socket de ``conn`` en cuanto esté conectado."""
+    conn._read_timeout_set = True
+    if getattr(conn, 'sock', None) is not None:
+        conn.sock.settimeout(timeout)
+        return
+    connect = conn.connect
+
+    def connect_then_set_timeout():
+        connect()
+        conn.sock.settimeout(timeout)
+
+    conn.connect = connect_then_set_timeout
@@ -1,16 +1,35 @@
 import argparse
-import ssl
+import contextlib
+import datetime
 import io
 import base64
 import logging
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pyVim.connect import SmartConnect, Disconnect
 from pyVmomi import vim
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 from openai_report import generate_detailed_report
 from openai_connector import apply_azure_env_vars
+from llm_usage import tracker as llm_usage_tracker
+from soap_stats import SoapCallStats, check_scope, tracked_check
+from soap_cassette import CassetteMiss, CassetteRecorder, replay_service_instance
+from profiling import NullProfiler, profiled_phase
+from history_store import HistoryStore
+from report_pipeline import ReportPipeline, report_producers, template_variables
+from run_cache import RunCache
+from collection_plan import DETAILED_REPORT_FIELDS, CollectionPlan, plan_for_templates
+from concurrency import AdaptiveLimiter, parse_rate_limits
+from section_cache import SectionCache
+from report_aggregates import ReportAggregates, status_from_score
+from streaming_report import StreamingReport
+from event_collector import DEFAULT_WINDOW_HOURS, EventSummary, collect_events
+from vm_inventory import DEFAULT_PAGE_SIZE as DEFAULT_VM_PAGE_SIZE, iter_vm_pages
+from transport import DEFAULT_POOL_IDLE_TIMEOUT, DEFAULT_POOL_SIZE, TransportConfig
+import svg_charts
+from report_output import COMPRESSIONS, write_html
 
 logging.basicConfig(
     level=logging.INFO,
@@ -44,7 +63,38 @@ class VMwareHealthCheck:
         self.password = password
         self.port = port
         self.si = None
-
+        self.soap_stats = None
+        self.recorder = None
+        self.cassette_path = None
+        self.replaying = False
+        self.replayed_windows = 0
+        self.profiler = NullProfiler()
+        # License keys already known (e.g. refreshed by the scheduler); when
+        # set, report generation does not query vCenter again.
+        self.licenses = None
+        # Report data derived from the current collection and vCenter-wide
+        # lookups, shared by every report of the run
+        self.cache = RunCache()
+        # Timeouts, compression, keep-alive pool and certificate checks
+        self.transport = TransportConfig()
+        # Hours of vCenter events read for alerts and SLA (0 disables it)
+        self.events_window_hours = DEFAULT_WINDOW_HOURS
+        # AI texts and charts of the previous run, reused while their data
+        # does not change (see ``section_cache.py``)
+        self.section_cache = None
+        # Optional host properties to collect, derived from the templates
+        # (see ``collection_plan.py``); collects everything by default
+        self.plan = CollectionPlan()
+        # Hosts collected in parallel and the adaptive limiter that keeps
+        # that load acceptable for vCenter (see ``concurrency.py``)
+        self.workers = 1
+        self.limiter = None
+        # VMs per RetrievePropertiesEx page (see ``vm_inventory.py``); 0 reads
+        # every VM property with its own accessor
+        self.vm_page_size = DEFAULT_VM_PAGE_SIZE
+        self._aggregates_lock = threading.Lock()
+
+    @profiled_phase('connect')
     def connect(self):
         """Establece la conexión con el servidor VMware.
 
@@ -53,16 +103,16 @@ class VMwareHealthCheck:
         ServiceInstance
             Objeto de conexión a vSphere.
         """
-        logger.info("Connecting to %s", self.host)
-        context = ssl._create_unverified_context()
+        logger.info("Connecting to %s (%s)", self.host, self.transport.describe())
         try:
             self.si = SmartConnect(
                 host=self.host,
                 user=self.user,
                 pwd=self.password,
                 port=self.port,
-                sslContext=context,
+                **self.transport.smart_connect_kwargs(),
             )
+            self.transport.apply(self.si._stub)
             logger.info("Connection established")
         except vim.fault.InvalidLogin:
             logger.error("Invalid credentials for %s", self.host)
@@ -72,12 +122,72 @@ class VMwareHealthCheck:
             raise
         return self.si
 
+    def instrument_soap(self, stats=None):
+        """Cuenta las llamadas SOAP realizadas a través de la conexión actual.
+
+        Parameters
+        ----------
+        stats : SoapCallStats, optional
+            Contadores a reutilizar. Si no se indica se crean unos nuevos.
+
+        Returns
+        -------
+        SoapCallStats
+            Contadores por comprobación, tipo de objeto y propiedad.
+        """
+        self.soap_stats = stats or self.soap_stats or SoapCallStats()
+        self.soap_stats.instrument(self.si._stub)
+        return self.soap_stats
+
+    @profiled_phase('connect')
+    def connect_replay(self, cassette_path, latency=0.0, loose=False):
+        """Sirve la sesión desde un cassette grabado en lugar de vCenter.
+
+        Parameters
+        ----------
+        cassette_path : str
+            Archivo generado con :meth:`start_recording`.
+        latency : float, optional
+            Segundos añadidos a cada respuesta para simular la red.
+        loose : bool, optional
+            Sirve las peticiones no grabadas con otra de la misma operación y
+            objeto en lugar de fallar.
+
+        Returns
+        -------
+        ServiceInstance
+            Objeto de conexión respaldado por el cassette.
+        """
+        logger.info("Replaying vCenter session from %s", cassette_path)
+        self.si = replay_service_instance(cassette_path, latency, loose)
+        self.replaying = True
+        self.replayed_windows = 0
+        return self.si
+
+    def start_recording(self, cassette_path):
+        """Graba las respuestas SOAP de esta sesión en ``cassette_path``.
+
+        Las credenciales y el nombre del vCenter se eliminan del cassette, que
+        se escribe al llamar a :meth:`disconnect`.
+        """
+        self.recorder = CassetteRecorder(host=self.host)
+        self.recorder.instrument(self.si._stub)
+        self.cassette_path = cassette_path
+        return self.recorder
+
     def disconnect(self):
         """Cierra la conexión actual si existe."""
-        if self.si:
+        if self.recorder:
+            self.recorder.uninstrument(self.si._stub)
+            self.recorder.save(self.cassette_path)
+            logger.info("SOAP cassette written to %s", self.cassette_path)
+            self.recorder = None
+        if self.si and not self.replaying:
             logger.info("Disconnecting from %s", self.host)
             Disconnect(self.si)
 
+    @tracked_check
+    @profiled_phase('host_enumeration')
     def get_hosts(self):
         """Devuelve la lista de hosts gestionados."""
         logger.info("Retrieving hosts")
@@ -90,6 +200,7 @@ class VMwareHealthCheck:
         logger.info("Found %d host(s)", len(hosts))
         return hosts
 
+    @tracked_check
     def security_check(self, host):
         """Realiza comprobaciones básicas de seguridad en un host."""
         logger.info("Running security checks on %s", host.name)
@@ -106,8 +217,9 @@ class VMwareHealthCheck:
             'esxi_shell': any(s.key == 'TSM' and s.running for s in host.configManager.serviceSystem.serviceInfo.service)
         }
         # IPv6 configuration state
-        net_cfg = getattr(config, 'network', None)
-        security['ipv6_enabled'] = getattr(net_cfg, 'ipv6Enabled', False)
+        if self.plan.wants('security.ipv6_enabled'):
+            net_cfg = getattr(config, 'network', None)
+            security['ipv6_enabled'] = getattr(net_cfg, 'ipv6Enabled', False)
         ntp_cfg = getattr(getattr(config.dateTimeInfo, 'ntpConfig', None), 'server', None)
         if isinstance(ntp_cfg, (list, tuple)):
             security['ntp_servers'] = list(ntp_cfg)
@@ -123,6 +235,7 @@ class VMwareHealthCheck:
         security['firewall_exceptions'] = [rs.key for rs in getattr(firewall_info, 'ruleset', [])]
         return security
 
+    @tracked_check
     def performance_check(self, host):
         """Obtiene métricas de rendimiento del host."""
         logger.info("Gathering performance metrics from %s", host.name)
@@ -174,30 +287,37 @@ class VMwareHealthCheck:
         perf['datastores'] = datastore_stats
 
         # Basic information about physical NICs
-        nic_stats = []
-        pnic_list = getattr(getattr(host.config, 'network', None), 'pnic', None)
-        if pnic_list is None:
-            pnic_list = getattr(getattr(host, 'network', None), 'pnic', None)
-        if pnic_list is None:
-            pnic_list = []
-        for pnic in pnic_list:
-            nic_stats.append({
-                'device': pnic.device,
-                'speed_mb': getattr(getattr(pnic, 'linkSpeed', None), 'speedMb', 'n/a')
-            })
-        perf['network'] = nic_stats
+        if self.plan.wants('performance.network'):
+            nic_stats = []
+            pnic_list = getattr(getattr(host.config, 'network', None), 'pnic', None)
+            if pnic_list is None:
+                pnic_list = getattr(getattr(host, 'network', None), 'pnic', None)
+            if pnic_list is None:
+                pnic_list = []
+            for pnic in pnic_list:
+                nic_stats.append({
+                    'device': pnic.device,
+                    'speed_mb': getattr(getattr(pnic, 'linkSpeed', None), 'speedMb', 'n/a')
+                })
+            perf['network'] = nic_stats
+        else:
+            self.plan.skip_read('performance_check', 'config')
 
         # Firmware information can also be interesting from a performance point of view
-        hw = host.hardware
-        perf['firmware'] = {
-            'bios_version': getattr(getattr(hw, 'biosInfo', None), 'biosVersion', 'n/a'),
-            'vendor': getattr(getattr(hw, 'systemInfo', None), 'vendor', 'n/a'),
-            'model': getattr(getattr(hw, 'systemInfo', None), 'model', 'n/a'),
-        }
+        if self.plan.wants('performance.firmware'):
+            hw = host.hardware
+            perf['firmware'] = {
+                'bios_version': getattr(getattr(hw, 'biosInfo', None), 'biosVersion', 'n/a'),
+                'vendor': getattr(getattr(hw, 'systemInfo', None), 'vendor', 'n/a'),
+                'model': getattr(getattr(hw, 'systemInfo', None), 'model', 'n/a'),
+            }
+        else:
+            self.plan.skip_read('performance_check', 'hardware')
 
         # Additional metrics can be gathered from host.configManager or perfManager
         return perf
 
+    @tracked_check
     def _build_perf_counter_map(self):
         """Create a mapping of performance counter name to counter id."""
         pm = self.si.content.perfManager
@@ -207,53 +327,112 @@ class VMwareHealthCheck:
             counters[full] = c.key
         return counters
 
-    def vm_performance_check(self, vm, counters=None, metric_names=None):
-        """Gather VM level performance metrics."""
-        pm = self.si.content.perfManager
-        if counters is None:
-            counters = self._build_perf_counter_map()
-
-        if metric_names is None:
-            metric_names = {
-                'cpu.ready.summation': 'cpu_ready_ms',
-                'cpu.usage.average': 'cpu_usage_pct',
-                'mem.usage.average': 'mem_usage_pct',
-                'disk.numberRead.summation': 'disk_reads',
-                'disk.numberWrite.summation': 'disk_writes',
-                'net.received.average': 'net_rx_kbps',
-                'net.transmitted.average': 'net_tx_kbps',
-            }
-
+    #: Contadores de rendimiento por VM y campo de las métricas que alimentan.
+    VM_METRICS = {
+        'cpu.ready.summation': 'cpu_ready_ms',
+        'cpu.usage.average': 'cpu_usage_pct',
+        'mem.usage.average': 'mem_usage_pct',
+        'disk.numberRead.summation': 'disk_reads',
+        'disk.numberWrite.summation': 'disk_writes',
+        'net.received.average': 'net_rx_kbps',
+        'net.transmitted.average': 'net_tx_kbps',
+    }
+
+    @staticmethod
+    def _vm_query_spec(entity, counters, metric_names):
         metric_ids = []
         for key in metric_names:
             cid = counters.get(key)
             if cid:
                 metric_ids.append(vim.PerformanceManager.MetricId(counterId=cid, instance="*"))
 
-        spec = vim.PerformanceManager.QuerySpec(
-            entity=vm,
+        return vim.PerformanceManager.QuerySpec(
+            entity=entity,
             maxSample=1,
             metricId=metric_ids,
             intervalId=20,
         )
 
+    @tracked_check
+    def vm_performance_check(self, vm, counters=None, metric_names=None):
+        """Gather VM level performance metrics."""
+        pm = self.si.content.perfManager
+        if counters is None:
+            counters = self._build_perf_counter_map()
+
+        if metric_names is None:
+            metric_names = self.VM_METRICS
+
+        spec = self._vm_query_spec(vm, counters, metric_names)
         stats = pm.QueryStats(querySpec=[spec])
+        return self._vm_metrics(vm, stats[0].value if stats else [], counters, metric_names)
+
+    @tracked_check
+    def vm_page_performance(self, records, counters=None, metric_names=None):
+        """Gather performance metrics for a page of ``VmRecord`` with one query.
+
+        Returns
+        -------
+        list of dict
+            ``{'name', 'metrics'}`` of every VM, in the order of ``records``.
+        """
+        if not records:
+            return []
+        pm = self.si.content.perfManager
+        if counters is None:
+            counters = self._build_perf_counter_map()
+
+        if metric_names is None:
+            metric_names = self.VM_METRICS
+
+        specs = [self._vm_query_spec(r.obj, counters, metric_names) for r in records]
+        series = {}
+        for entity_metric in pm.QueryStats(querySpec=specs) or []:
+            series[getattr(entity_metric.entity, '_moId', None)] = entity_metric.value
+
+        vm_info = []
+        for record in records:
+            metrics = self._vm_metrics(record, series.get(record._moId) or [],
+                                       counters, metric_names)
+            metrics.update(self.vm_extra_info(record))
+            vm_info.append({'name': getattr(record, 'name', None), 'metrics': metrics})
+        return vm_info
+
+    def vm_pages(self, root=None):
+        """Genera las VM bajo ``root`` en páginas de ``VmRecord``.
+
+        Las llamadas del recorrido se atribuyen a ``vm_inventory`` en las
+        estadísticas SOAP.
+        """
+        pages = iter_vm_pages(self.si, vim, root, self.vm_page_size)
+        try:
+            while True:
+                with check_scope('vm_inventory'):
+                    page = next(pages, None)
+                if page is None:
+                    return
+                yield page
+        finally:
+            with check_scope('vm_inventory'):
+                pages.close()
+
+    @staticmethod
+    def _vm_metrics(vm, vals, counters, metric_names):
+        """Compute the VM metrics from its ``QueryStats`` series."""
         # Collect samples by metric field
         samples = {v: [] for v in metric_names.values()}
-        if stats:
-            vals = stats[0].value
-            for val in vals:
-                for name, field in metric_names.items():
-                    if counters.get(name) == val.id.counterId and val.value:
-                        if name.endswith('summation') or name.startswith('disk') or name.startswith('net.'):
-                            # Sum across instances (e.g. multiple disks or NICs)
-                            if len(samples[field]) < len(val.value):
-                                samples[field] += [0] * (len(val.value) - len(samples[field]))
-                            for i, v in enumerate(val.value):
-                                samples[field][i] += v
-                        else:
-                            # Average type metrics - just store all values
-                            samples[field].extend(val.value)
+        for val in vals:
+            for name, field in metric_names.items():
+                if counters.get(name) == val.id.counterId and val.value:
+                    if name.endswith('summation') or name.startswith('disk') or name.startswith('net.'):
+                        # Sum across instances (e.g. multiple disks or NICs)
+                        if len(samples[field]) < len(val.value):
+                            samples[field] += [0] * (len(val.value) - len(samples[field]))
+                        for i, v in enumerate(val.value):
+                            samples[field][i] += v
+                    else:
+                        # Average type metrics - just store all values
+                        samples[field].extend(val.value)
 
         metrics = {}
         for name, field in metric_names.items():
@@ -295,6 +474,7 @@ class VMwareHealthCheck:
             metrics['cpu_ready_class'] = 'good'
         return metrics
 
+    @tracked_check
     def host_runtime_info(self, host):
         """Return uptime information for a host."""
         import datetime
@@ -313,20 +493,63 @@ class VMwareHealthCheck:
         return {
             'boot_time': boot,
             'uptime_seconds': uptime,
-            'sla_violations': 0,
-            'alert_count': 0,
+            **self.event_summary().for_host(host),
         }
 
+    @tracked_check
+    def event_summary(self):
+        """Return triggered alarms and recent events aggregated per host.
+
+        Events are read once per run (see :mod:`event_collector`) and shared
+        by every host.
+        """
+        return self.cache.lookup('events', self._collect_events)
+
+    def _events_until(self):
+        """Fin de la ventana de eventos.
+
+        La ventana forma parte de la petición SOAP, por lo que al grabar se
+        guarda en el cassette y al reproducir se usa la grabada en lugar de
+        la hora actual.
+        """
+        if self.replaying:
+            windows = self.si._stub.cassette.meta.get('event_windows') or []
+            if not windows:
+                raise CassetteMiss('event window not recorded')
+            until = windows[min(self.replayed_windows, len(windows) - 1)]
+            self.replayed_windows += 1
+            return datetime.datetime.fromisoformat(until)
+        until = datetime.datetime.now(tz=datetime.timezone.utc)
+        if self.recorder:
+            self.recorder.cassette.meta.setdefault('event_windows', []).append(until.isoformat())
+        return until
+
+    def _collect_events(self):
+        if not self.events_window_hours:
+            return EventSummary()
+        try:
+            return collect_events(self.si, vim, self.events_window_hours,
+                                  now=self._events_until())
+        except CassetteMiss:
+            # Not "no events": the replay does not match the recorded session
+            raise
+        except Exception as exc:
+            logger.warning("Could not read vCenter events and alarms: %s", exc)
+            return EventSummary()
+
+    @tracked_check
     def cluster_features(self, host):
-        """Return cluster level features such as HA or DRS if available."""
+        """Return the cluster name and features such as HA or DRS if available."""
         cluster = getattr(host, 'parent', None)
         if isinstance(cluster, vim.ClusterComputeResource):
             cfg = getattr(cluster, 'configurationEx', None)
             das = getattr(getattr(cfg, 'dasConfig', None), 'enabled', False)
             drs = getattr(getattr(cfg, 'drsConfig', None), 'enabled', False)
-            return {'ha_enabled': bool(das), 'drs_enabled': bool(drs)}
-        return {'ha_enabled': False, 'drs_enabled': False}
+            return {'name': getattr(cluster, 'name', None),
+                    'ha_enabled': bool(das), 'drs_enabled': bool(drs)}
+        return {'name': None, 'ha_enabled': False, 'drs_enabled': False}
 
+    @tracked_check
     def vm_extra_info(self, vm):
         """Return snapshot presence, VMware Tools status and power state."""
         has_snap = hasattr(vm, 'snapshot') and vm.snapshot is not None
@@ -357,14 +580,23 @@ class VMwareHealthCheck:
             'disk_free_pct': disk_free_pct,
         }
 
+    @tracked_check
     def best_practice_check(self, host):
         """Comprueba parámetros recomendados en un host."""
         logger.info("Checking best practices on %s", host.name)
         bp = {}
-        hardware = host.hardware
-        bp['cpu_model'] = hardware.cpuPkg[0].description if hardware.cpuPkg else 'n/a'
-        # Convert memory size from bytes to gigabytes for easier readability
-        bp['memory_total_gb'] = hardware.memorySize / (1024 ** 3)
+        plan = self.plan
+        hardware = None
+        if plan.wants('best_practice.cpu_model', 'best_practice.memory_total_gb',
+                      'best_practice.firmware'):
+            hardware = host.hardware
+        else:
+            plan.skip_read('best_practice_check', 'hardware')
+        if plan.wants('best_practice.cpu_model'):
+            bp['cpu_model'] = hardware.cpuPkg[0].description if hardware.cpuPkg else 'n/a'
+        if plan.wants('best_practice.memory_total_gb'):
+            # Convert memory size from bytes to gigabytes for easier readability
+            bp['memory_total_gb'] = hardware.memorySize / (1024 ** 3)
 
         # Detailed datastore information
         datastore_names = []
@@ -378,24 +610,29 @@ class VMwareHealthCheck:
         bp['datastores'] = datastore_names
 
         # Basic network interface details
-        nic_info = []
-        pnic_list = getattr(getattr(host.config, "network", None), "pnic", None)
-        if pnic_list is not None:
-            for pnic in pnic_list:
-                nic_info.append({"device": pnic.device, "speed_mb": getattr(getattr(pnic, "linkSpeed", None), "speedMb", "n/a")})
+        if plan.wants('best_practice.network'):
+            nic_info = []
+            pnic_list = getattr(getattr(host.config, "network", None), "pnic", None)
+            if pnic_list is not None:
+                for pnic in pnic_list:
+                    nic_info.append({"device": pnic.device, "speed_mb": getattr(getattr(pnic, "linkSpeed", None), "speedMb", "n/a")})
+            else:
+                for nic in getattr(host, "network", []):
+                    if hasattr(nic, "name"):
+                        nic_info.append(nic.name)
+            bp["network"] = nic_info
         else:
-            for nic in getattr(host, "network", []):
-                if hasattr(nic, "name"):
-                    nic_info.append(nic.name)
-        bp["network"] = nic_info
+            plan.skip_read('best_practice_check', 'config')
         # Firmware information
-        bp['firmware'] = {
-            'bios_version': getattr(getattr(hardware, 'biosInfo', None), 'biosVersion', 'n/a'),
-            'vendor': getattr(getattr(hardware, 'systemInfo', None), 'vendor', 'n/a'),
-            'model': getattr(getattr(hardware, 'systemInfo', None), 'model', 'n/a'),
-        }
+        if plan.wants('best_practice.firmware'):
+            bp['firmware'] = {
+                'bios_version': getattr(getattr(hardware, 'biosInfo', None), 'biosVersion', 'n/a'),
+                'vendor': getattr(getattr(hardware, 'systemInfo', None), 'vendor', 'n/a'),
+                'model': getattr(getattr(hardware, 'systemInfo', None), 'model', 'n/a'),
+            }
         return bp
 
+    @tracked_check
     def resource_pool_check(self, host):
         """Return the number of configured resource pools for a host's cluster."""
         cluster = getattr(host, 'parent', None)
@@ -404,6 +641,7 @@ class VMwareHealthCheck:
             return len(pools)
         return 0
 
+    @tracked_check
     def ntp_config_check(self, host):
         """Return True if the host has at least one NTP server configured."""
         ntp_cfg = getattr(getattr(host.config, 'dateTimeInfo', None), 'ntpConfig', None)
@@ -412,6 +650,7 @@ class VMwareHealthCheck:
             servers = [servers]
         return len(servers) > 0
 
+    @tracked_check
     def update_compliance_check(self, host):
         """Simple placeholder for update compliance."""
         try:
@@ -420,6 +659,7 @@ class VMwareHealthCheck:
         except Exception:
             return True
 
+    @tracked_check
     def dns_consistency_check(self, host):
         """Check if DNS hostname matches configured name."""
         try:
@@ -428,6 +668,7 @@ class VMwareHealthCheck:
         except Exception:
             return True
 
+    @tracked_check
     def storage_overusage(self, host):
         """Return True if any datastore exceeds 90% usage."""
         for ds in getattr(host, 'datastore', []):
@@ -451,6 +692,7 @@ class VMwareHealthCheck:
         # and compare them with the list of virtual disks attached to VMs.
         return 0
 
+    @tracked_check
     def licensing_check(self):
         """Retrieve assigned license keys."""
         try:
@@ -477,8 +719,194 @@ class VMwareHealthCheck:
         """Count VMs with snapshots as a simple backup indicator."""
         return sum(1 for vm in vm_info if vm['metrics'].get('has_snapshot'))
 
+    #: Comprobaciones agrupadas por familia; cada familia puede refrescarse con
+    #: su propio intervalo en el modo planificado (ver ``scheduler.py``).
+    CHECK_FAMILIES = ('security', 'best_practice', 'performance', 'vm_performance')
+
+    def collect_family(self, host, family, counters=None):
+        """Ejecuta las comprobaciones de una familia sobre ``host``.
+
+        Parameters
+        ----------
+        host : vim.HostSystem
+            Host a analizar.
+        family : str
+            Una de :attr:`CHECK_FAMILIES`.
+        counters : dict, optional
+            Mapa de contadores devuelto por ``_build_perf_counter_map``.
+
+        Returns
+        -------
+        dict
+            Claves del registro del host que produce la familia.
+        """
+        if family == 'security':
+            return {
+                'security': self.security_check(host),
+                'ntp_ok': self.ntp_config_check(host),
+                'dns_ok': self.dns_consistency_check(host),
+            }
+        if family == 'best_practice':
+            return {
+                'best_practice': self.best_practice_check(host),
+                'resource_pools': self.resource_pool_check(host),
+                'zombie_vmdks': self.zombie_vmdk_check(host),
+                'update_ok': self.update_compliance_check(host),
+                'iscsi_rr': self.iscsi_roundrobin_check(host),
+                'cluster': self.cluster_features(host),
+            }
+        if family == 'performance':
+            return {
+                'performance': self.performance_check(host),
+                'storage_warn': self.storage_overusage(host),
+                'runtime': self.host_runtime_info(host),
+            }
+        if family == 'vm_performance':
+            if counters is None:
+                counters = self._build_perf_counter_map()
+            vm_info = []
+            if self.vm_page_size:
+                # One RetrievePropertiesEx and one QueryStats per page of VMs
+                for page in self.vm_pages(host):
+                    vm_info.extend(self.vm_page_performance(page, counters))
+                return {'vms': vm_info}
+            for vm in getattr(host, 'vm', []):
+                metrics = self.vm_performance_check(vm, counters)
+                extra = self.vm_extra_info(vm)
+                metrics.update(extra)
+                vm_info.append({'name': vm.name, 'metrics': metrics})
+            return {'vms': vm_info}
+        raise ValueError(f"Unknown check family: {family}")
+
+    @staticmethod
+    def avg_cpu_ready(vm_info):
+        """Return the average CPU ready (ms) of a host's VMs."""
+        if not vm_info:
+            return 0
+        return sum(v['metrics'].get('cpu_ready_ms') or 0 for v in vm_info) / len(vm_info)
+
+    @tracked_check
+    def collect_host(self, host, counters=None):
+        """Ejecuta todas las comprobaciones sobre un host.
+
+        Parameters
+        ----------
+        host : vim.HostSystem
+            Host a analizar.
+        counters : dict, optional
+            Mapa de contadores devuelto por ``_build_perf_counter_map``.
+
+        Returns
+        -------
+        dict
+            Registro del host con el mismo formato que consumen las plantillas.
+        """
+        logger.info("Processing host %s", host.name)
+        if counters is None:
+            counters = self._build_perf_counter_map()
+        host_data = {'name': host.name}
+        with self.profiler.phase('host_checks'):
+            for family in ('security', 'performance', 'best_practice'):
+                host_data.update(self.collect_family(host, family, counters))
+        with self.profiler.phase('vm_perf'):
+            host_data.update(self.collect_family(host, 'vm_performance', counters))
+        host_data['performance']['avg_cpu_ready_ms'] = self.avg_cpu_ready(host_data['vms'])
+        return host_data
+
+    @tracked_check
+    def collect(self, on_host=None):
+        """Recorre todos los hosts y recopila su información.
+
+        Parameters
+        ----------
+        on_host : callable, optional
+            Función invocada con el registro de cada host en cuanto se completa.
+
+        Returns
+        -------
+        tuple
+            ``(hosts_data, all_vms, summary)`` listos para ``generate_report``.
+        """
+        hosts = self.get_hosts()
+        hosts_data = []
+        all_vms = []
+        summary = {
+            'hosts': 0,
+            'vms': 0,
+            'datastores': 0,
+            'networks': 0,
+        }
+        # The counter map is vCenter-global, so build it once per run
+        counters = self._build_perf_counter_map()
+        for host, host_data in zip(hosts, self._collect_hosts(hosts, counters)):
+            for vm in host_data['vms']:
+                all_vms.append({'name': vm['name'], 'metrics': vm['metrics']})
+            summary['vms'] += len(host_data['vms'])
+            summary['hosts'] += 1
+            summary['datastores'] += len(getattr(host, 'datastore', []))
+            summary['networks'] += len(getattr(host, 'network', []))
+            if on_host:
+                on_host(host_data)
+            hosts_data.append(host_data)
+        return hosts_data, all_vms, summary
+
+    def _collect_hosts(self, hosts, counters):
+        """Genera el registro de cada host, en orden, con hasta ``workers`` en paralelo.
+
+        Con :attr:`limiter` el número de hosts en curso se adapta a la
+        latencia de vCenter (ver ``concurrency.py``).
+        """
+        if self.workers <= 1 or len(hosts) <= 1:
+            for host in hosts:
+                yield self.collect_host(host, counters)
+            return
+        # vCenter-wide lookups are done once before the workers start
+        self.event_summary()
+        limiter = self.limiter
+
+        def collect_one(host):
+            with limiter.slot() if limiter else contextlib.nullcontext():
+                return self.collect_host(host, counters)
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='collect-host') as pool:
+            futures = [pool.submit(collect_one, host) for host in hosts]
+            try:
+                for future in futures:
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    @profiled_phase('chart')
+    def _create_chart_svg(self, hosts_data):
+        """Genera los gráficos SVG de uso de hosts y datastores.
+
+        Parameters
+        ----------
+        hosts_data : list of dict
+            Datos recopilados de cada host.
+
+        Returns
+        -------
+        dict
+            ``chart_svg`` (CPU y memoria por host, o por clúster y Top N en
+            inventarios grandes), ``datastore_chart_svg`` (uso de los
+            datastores) y ``usage_histogram_svg`` (distribución del uso con
+            percentiles; vacío en inventarios pequeños), como SVG en línea.
+        """
+        return {
+            'chart_svg': svg_charts.host_usage_chart(hosts_data),
+            'datastore_chart_svg': svg_charts.datastore_usage_chart(hosts_data),
+            'usage_histogram_svg': svg_charts.usage_histogram_chart(hosts_data),
+        }
+
+    @profiled_phase('chart')
     def _create_chart(self, hosts_data):
-        """Genera un gráfico de uso de CPU y memoria.
+        """Genera un gráfico de uso de CPU y memoria con matplotlib.
+
+        Solo se usa si la plantilla referencia ``chart`` (PNG en base64); las
+        plantillas incluidas usan ``chart_svg``. matplotlib es opcional.
 
         Parameters
         ----------
@@ -488,16 +916,26 @@ class VMwareHealthCheck:
         Returns
         -------
         str
-            Imagen en base64 del gráfico.
+            Imagen en base64 del gráfico, o ``None`` si matplotlib no está
+            instalado.
         """
-        names = [h['name'] for h in hosts_data]
-        cpu = [h['performance']['cpu_usage'] for h in hosts_data]
-        mem = [h['performance']['memory_usage'] for h in hosts_data]
+        try:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            logger.error("matplotlib not available: %s. Use chart_svg in the template", exc)
+            return None
+
+        # Same per-host / per-cluster / top-N view as the SVG chart
+        view = svg_charts.host_usage_view(hosts_data)
+        names = view['names']
+        (cpu_label, cpu), (mem_label, mem) = view['series']
 
         x = range(len(names))
         fig, ax = plt.subplots()
-        ax.bar([i - 0.2 for i in x], cpu, width=0.4, label='CPU (MHz)')
-        ax.bar([i + 0.2 for i in x], mem, width=0.4, label='Memory (MB)')
+        ax.bar([i - 0.2 for i in x], cpu, width=0.4, label=cpu_label)
+        ax.bar([i + 0.2 for i in x], mem, width=0.4, label=mem_label)
         ax.set_xticks(list(x))
         ax.set_xticklabels(names, rotation=45, ha='right')
         ax.legend()
@@ -509,8 +947,12 @@ class VMwareHealthCheck:
         encoded = base64.b64encode(buffer.getvalue()).decode()
         return encoded
 
-    def _generate_report_default(self, hosts_data, vm_data, chart):
-        """Genera el informe HTML utilizando la plantilla incorporada."""
+    def _generate_report_default(self, hosts_data, vm_data, chart=None):
+        """Genera el informe HTML utilizando la plantilla incorporada.
+
+        Con ``chart`` (PNG en base64) se inserta la imagen; si no, el gráfico
+        SVG de :meth:`_create_chart_svg`.
+        """
         html = [
             "<html><head><meta charset='utf-8'><title>VMware Health Check</title>",
             "<style>",
@@ -522,7 +964,10 @@ class VMwareHealthCheck:
         ]
         html.append("<h1>VMware Health Check Report</h1>")
 
-        html.append(f"<img src='data:image/png;base64,{chart}' alt='Resource Usage Chart'/>")
+        if chart:
+            html.append(f"<img src='data:image/png;base64,{chart}' alt='Resource Usage Chart'/>")
+        else:
+            html.append(self._create_chart_svg(hosts_data)['chart_svg'])
 
         running_vms = [v for v in vm_data if v['metrics'].get('power_state') == 'poweredOn']
         top_vms = sorted(
@@ -575,8 +1020,8 @@ class VMwareHealthCheck:
                 html.append("</table>")
 
             html.append("<h3>Best Practices</h3><table>")
-            html.append(f"<tr><th>cpu_model</th><td>{h['best_practice'].get('cpu_model')}</td></tr>")
-            html.append(f"<tr><th>memory_total_gb</th><td>{h['best_practice'].get('memory_total_gb')}</td></tr>")
+            html.append(f"<tr><th>cpu_model</th><td>{h['best_practice'].get('cpu_model', 'Unknown')}</td></tr>")
+            html.append(f"<tr><th>memory_total_gb</th><td>{h['best_practice'].get('memory_total_gb', 'Unknown')}</td></tr>")
             html.append("</table>")
 
             if h['best_practice'].get('datastores'):
@@ -628,227 +1073,111 @@ class VMwareHealthCheck:
         html.append("</div></body></html>")
         return '\n'.join(html)
 
-    def _build_report_data(self, hosts_data, vm_data, chart):
-        """Construye la estructura de datos para la plantilla avanzada.
-
-        Además de la información básica utilizada por ``template_a.html`` se
-        calculan datos adicionales que pueden ser consumidos por plantillas más
-        completas como ``template_full.html``.  No se trata de un análisis
-        exhaustivo pero proporciona un resumen global, los riesgos detectados y
-        algunas recomendaciones genéricas.
-        """
-        import datetime
-
-        def status_from_score(score):
-            if score >= 80:
-                return 'ok'
-            elif score >= 60:
-                return 'warning'
-            return 'critical'
-
-        uptime = sum(h.get('runtime', {}).get('uptime_seconds', 0) for h in hosts_data)
-        avg_uptime_days = uptime / max(len(hosts_data), 1) / 86400
-
-        total_datastores = sum(len(h.get('performance', {}).get('datastores', [])) for h in hosts_data)
-        total_networks = sum(len(h.get('best_practice', {}).get('network', [])) for h in hosts_data)
-
-        all_ready = [v['metrics'].get('cpu_ready_ms') or 0 for v in vm_data]
-        avg_ready = sum(all_ready) / len(all_ready) if all_ready else 0
-        performance_score = max(0, 100 - min(avg_ready, 200) / 2)
+    _status_from_score = staticmethod(status_from_score)
 
-        usage_vals = [ds['usage_pct'] for h in hosts_data for ds in h.get('performance', {}).get('datastores', [])]
-        avg_usage = sum(usage_vals) / len(usage_vals) if usage_vals else 0
-        storage_score = max(0, 100 - avg_usage)
+    def _aggregates(self, hosts_data, vm_data):
+        """:class:`ReportAggregates` de estos datos, calculados una vez.
 
-        insecure = 0
-        for h in hosts_data:
-            services = h.get('security', {}).get('services', {})
-            if services.get('ssh'):
-                insecure += 1
-            if services.get('esxi_shell'):
-                insecure += 1
-        for vm in vm_data:
-            if vm['metrics'].get('has_snapshot'):
-                insecure += 1
-            tools = vm['metrics'].get('tools_status')
-            if tools not in (None, 'toolsOk', 'guestToolsRunning'):
-                insecure += 1
-        security_score = max(0, 100 - insecure * 5)
-
-        ha_all = all(h.get('cluster', {}).get('ha_enabled') for h in hosts_data)
-        drs_all = all(h.get('cluster', {}).get('drs_enabled') for h in hosts_data)
-        if ha_all and drs_all:
-            availability_score = 100
-        elif ha_all or drs_all:
-            availability_score = 70
-        else:
-            availability_score = 40
-
-        categories = [
-            {'name': 'Rendimiento', 'score': int(performance_score), 'status': status_from_score(performance_score), 'icon': 'fa-solid fa-tachometer-alt'},
-            {'name': 'Almacenamiento', 'score': int(storage_score), 'status': status_from_score(storage_score), 'icon': 'fa-solid fa-hdd'},
-            {'name': 'Seguridad', 'score': int(security_score), 'status': status_from_score(security_score), 'icon': 'fa-solid fa-shield'},
-            {'name': 'Disponibilidad', 'score': int(availability_score), 'status': status_from_score(availability_score), 'icon': 'fa-solid fa-plug-circle-bolt'},
-        ]
+        ``StreamingReport`` los deja en :attr:`cache` ya acumulados durante la
+        recopilación.
+        """
+        with self._aggregates_lock:
+            # Report parts run in parallel; only the first one aggregates
+            return self.cache.derived(
+                'aggregates', hosts_data, vm_data,
+                lambda: ReportAggregates.from_data(hosts_data, vm_data),
+            )
 
-        avg_cat = sum(c['score'] for c in categories) / len(categories)
-        health_score = round(avg_cat / 20, 1)
-        if health_score >= 4.5:
-            health_state = 'optimal'
-            health_msg = 'Óptimo'
-        elif health_score >= 3:
-            health_state = 'warning'
-            health_msg = 'Estable con Advertencias'
-        else:
-            health_state = 'critical'
-            health_msg = 'Crítico'
+    def _report_summary(self, hosts_data, vm_data, deps=None):
+        """Datos generales del entorno: tiempo activo, recuentos y fecha."""
+        return self._aggregates(hosts_data, vm_data).summary(hosts_data, vm_data)
 
-        cpu_hosts = []
-        ram_hosts = []
-        datastore_usage = []
-        for h in hosts_data:
-            cpu_pct = h.get('performance', {}).get('cpu_usage_pct', 0)
-            mem_pct = h.get('performance', {}).get('memory_usage_pct', 0)
-            mem_used_gb = h.get('performance', {}).get('memory_usage', 0) / 1024
-            cpu_hosts.append({'name': h.get('name'), 'percent': int(cpu_pct)})
-            ram_hosts.append({'name': h.get('name'), 'percent': int(mem_pct), 'value': f"{mem_used_gb:.1f}GB"})
-            for ds in h.get('performance', {}).get('datastores', []):
-                datastore_usage.append({'name': ds.get('name'), 'percent': int(ds.get('usage_pct', 0))})
-
-        resource_pools = sum(h.get('resource_pools', 0) for h in hosts_data)
-        zombie_count = sum(h.get('zombie_vmdks', 0) for h in hosts_data)
-        ntp_ok = all(h.get('ntp_ok') for h in hosts_data)
-        folder_dups = self.folder_inconsistencies(vm_data)
-        licenses = self.licensing_check()
-        backups = self.backup_config_check(vm_data)
-
-        ballooning = any((vm['metrics'].get('ballooned_memory_mb') or 0) > 0 for vm in vm_data)
-        update_ok = all(h.get('update_ok', True) for h in hosts_data)
-        storage_warn = any(h.get('storage_warn') for h in hosts_data)
-        ipv6_enabled = any(h.get('security', {}).get('ipv6_enabled') for h in hosts_data)
-        total_vcpu = sum(vm['metrics'].get('num_cpu', 0) for vm in vm_data)
-        total_pcpu = sum(h.get('performance', {}).get('cpu_cores', 0) for h in hosts_data)
-        cpu_ratio = total_vcpu / total_pcpu if total_pcpu else 0
-        iscsi_rr = all(h.get('iscsi_rr', True) for h in hosts_data)
-        dns_ok = all(h.get('dns_ok', True) for h in hosts_data)
-
-        cpu_status = 'ok' if avg_ready < 100 else 'warning' if avg_ready < 150 else 'critical'
-        ratio_status = 'ok' if cpu_ratio < 4 else 'warning' if cpu_ratio < 8 else 'critical'
-
-        indicators = [
-            {'icon': 'fa-solid fa-shield-halved', 'label': 'HA', 'status': 'ok' if ha_all else 'critical', 'text': 'Enabled' if ha_all else 'Disabled'},
-            {'icon': 'fa-solid fa-arrows-to-circle', 'label': 'DRS', 'status': 'ok' if drs_all else 'critical', 'text': 'Enabled' if drs_all else 'Disabled'},
-            {'icon': 'fa-solid fa-camera', 'label': 'Snapshots', 'status': 'warning' if any(vm['metrics'].get('has_snapshot') for vm in vm_data) else 'ok', 'text': 'Warning' if any(vm['metrics'].get('has_snapshot') for vm in vm_data) else 'OK'},
-            {'icon': 'fa-solid fa-wrench', 'label': 'VMware Tools', 'status': 'warning' if any(vm['metrics'].get('tools_status') not in (None, 'toolsOk', 'guestToolsRunning') for vm in vm_data) else 'ok', 'text': 'Warning' if any(vm['metrics'].get('tools_status') not in (None, 'toolsOk', 'guestToolsRunning') for vm in vm_data) else 'OK'},
-            {'icon': 'fa-solid fa-terminal', 'label': 'SSH', 'status': 'warning' if any(h.get('security', {}).get('services', {}).get('ssh') for h in hosts_data) else 'ok', 'text': 'Warning' if any(h.get('security', {}).get('services', {}).get('ssh') for h in hosts_data) else 'OK'},
-            {'icon': 'fa-solid fa-layer-group', 'label': 'Resource Pools', 'status': 'ok' if resource_pools else 'warning', 'text': resource_pools if resource_pools else 'None'},
-            {'icon': 'fa-solid fa-folder-tree', 'label': 'Folders', 'status': 'warning' if folder_dups else 'ok', 'text': f"{len(folder_dups)} dup" if folder_dups else 'OK'},
-            {'icon': 'fa-solid fa-skull-crossbones', 'label': 'Zombie VMDKs', 'status': 'critical' if zombie_count else 'ok', 'text': zombie_count if zombie_count else '0'},
-            {'icon': 'fa-solid fa-clock', 'label': 'NTP', 'status': 'ok' if ntp_ok else 'warning', 'text': 'Configured' if ntp_ok else 'Missing'},
-            {'icon': 'fa-solid fa-id-card', 'label': 'Licensing', 'status': 'ok' if licenses else 'critical', 'text': 'OK' if licenses else 'Missing'},
-            {'icon': 'fa-solid fa-floppy-disk', 'label': 'Backups', 'status': 'ok' if backups else 'warning', 'text': 'Configured' if backups else 'None'},
-            {'icon': 'fa-solid fa-microchip', 'label': 'CPU Ready', 'status': cpu_status, 'text': f"{int(avg_ready)}ms"},
-            {'icon': 'fa-solid fa-expand', 'label': 'Ballooning', 'status': 'warning' if ballooning else 'ok', 'text': 'Detected' if ballooning else 'None'},
-            {'icon': 'fa-solid fa-download', 'label': 'Updates', 'status': 'ok' if update_ok else 'warning', 'text': 'Compliant' if update_ok else 'Outdated'},
-            {'icon': 'fa-solid fa-database', 'label': 'Storage', 'status': 'critical' if storage_warn else 'ok', 'text': 'Full' if storage_warn else 'OK'},
-            {'icon': 'fa-solid fa-network-wired', 'label': 'IPv6', 'status': 'warning' if ipv6_enabled else 'ok', 'text': 'Enabled' if ipv6_enabled else 'Disabled'},
-            {'icon': 'fa-solid fa-divide', 'label': 'vCPU/pCPU', 'status': ratio_status, 'text': f"{cpu_ratio:.1f}:1"},
-            {'icon': 'fa-solid fa-route', 'label': 'Round Robin', 'status': 'ok' if iscsi_rr else 'warning', 'text': 'OK' if iscsi_rr else 'Check'},
-            {'icon': 'fa-solid fa-globe', 'label': 'DNS', 'status': 'ok' if dns_ok else 'warning', 'text': 'OK' if dns_ok else 'Mismatch'},
-        ]
+    def _report_scores(self, hosts_data, vm_data, deps=None):
+        """Puntuación por categoría y puntuación global."""
+        return self._aggregates(hosts_data, vm_data).scores()
 
-        # Top lists
-        running_vms = [v for v in vm_data if v['metrics'].get('power_state') == 'poweredOn']
-
-        top_cpu_ready = sorted(
-            running_vms,
-            key=lambda x: x['metrics'].get('cpu_ready_ms') or 0,
-            reverse=True
-        )[:10]
-        top_ram = sorted(
-            running_vms,
-            key=lambda x: x['metrics'].get('mem_usage_pct') or 0,
-            reverse=True
-        )[:10]
-        datastores_list = [ds for h in hosts_data for ds in h.get('performance', {}).get('datastores', [])]
-        datastores_sorted = sorted(
-            datastores_list,
-            key=lambda x: x.get('capacity_gb') or 0,
-            reverse=True
-        )[:10]
+    def _report_usage(self, hosts_data, vm_data, deps=None):
+        """Barras de uso de CPU, RAM y datastores por host."""
+        return self._aggregates(hosts_data, vm_data).usage()
 
-        vm_disk_free = []
-        for vm in running_vms:
-            free_pct = vm['metrics'].get('disk_free_pct')
-            if free_pct is not None:
-                vm_disk_free.append({'name': vm['name'], 'free_pct': free_pct})
+    def _report_indicators(self, hosts_data, vm_data, deps=None):
+        """Indicadores de salud, riesgos y prioridades.
 
-        top_disk_free = sorted(
-            vm_disk_free,
-            key=lambda x: x['free_pct'] if x['free_pct'] is not None else 0
-        )[:10]
+        Es la única parte que consulta vCenter (licencias).
+        """
+        licenses = (self.licenses if self.licenses is not None
+                    else self.cache.lookup('licenses', self.licensing_check))
+        return self._aggregates(hosts_data, vm_data).indicators(
+            licenses, self.folder_inconsistencies(vm_data), self.backup_config_check(vm_data)
+        )
 
-        top_iops = sorted(
-            running_vms,
-            key=lambda x: x['metrics'].get('iops') or 0,
-            reverse=True
-        )[:10]
-        top_network = sorted(
-            running_vms,
-            key=lambda x: x['metrics'].get('net_throughput_kbps') or 0,
-            reverse=True
-        )[:10]
+    def _report_top_lists(self, hosts_data, vm_data, deps=None):
+        """Listados Top 10 de VMs y datastores."""
+        return self._aggregates(hosts_data, vm_data).top_lists()
 
-        # Extract main risks and priorities from indicators
-        risks = [i['label'] for i in indicators if i.get('status') == 'critical']
-        priorities = [i['label'] for i in indicators if i.get('status') == 'warning']
+    def _report_texts(self, hosts_data, vm_data, deps):
+        """Textos genéricos de recomendaciones, conclusiones y glosario.
 
-        global_state = health_msg
-        key_risks = ', '.join(risks[:3]) if risks else 'Ninguno'
+        Necesita ``health_message`` de :meth:`_report_scores`.
+        """
+        health_msg = deps['health_message']
+        return {
+            'recommendations': (
+                'Revisar los elementos en estado crítico o de advertencia y planificar '
+                'acciones correctivas.'
+            ),
+            'conclusions': f'El entorno se encuentra en estado {health_msg.lower()}.',
+            'glossary': 'VM: Virtual Machine, HA: High Availability, DRS: Distributed Resource Scheduler',
+            'annexes_data': [],
+        }
 
-        recommendations = (
-            'Revisar los elementos en estado crítico o de advertencia y planificar '
-            'acciones correctivas.'
+    # Templates rendered from ``_build_report_data`` (validated before rendering)
+    REPORT_TEMPLATES = (
+        'template_a.html', 'template_a_detailed.html', 'template_full.html',
+        'template_full_es.html', 'template_compact.html',
+    )
+
+    # Parts of ``_build_report_data`` in dependency order:
+    # (name, method, keys it returns, parts it needs)
+    REPORT_PARTS = (
+        ('summary', '_report_summary',
+         ('uptime', 'alerts', 'sla', 'hosts', 'vms', 'datastores_count',
+          'networks_count', 'report_date'), ()),
+        ('scores', '_report_scores',
+         ('health_score', 'health_state', 'health_message', 'global_state', 'categories'), ()),
+        ('usage', '_report_usage', ('cpu_hosts', 'ram_hosts', 'datastore_usage'), ()),
+        ('indicators', '_report_indicators', ('indicators', 'risks', 'priorities', 'key_risks'), ()),
+        ('top_lists', '_report_top_lists',
+         ('top_cpu_ready', 'top_ram', 'datastores', 'top_disk_free', 'top_iops', 'top_network'), ()),
+        ('texts', '_report_texts',
+         ('recommendations', 'conclusions', 'glossary', 'annexes_data'), ('scores',)),
+    )
+
+    def _report_part(self, name, hosts_data, vm_data, deps=None):
+        """Parte ``name`` de :attr:`REPORT_PARTS`, calculada una vez por recopilación."""
+        method = next(m for n, m, _, _ in self.REPORT_PARTS if n == name)
+        return self.cache.derived(
+            name, hosts_data, vm_data,
+            lambda: getattr(self, method)(hosts_data, vm_data, deps),
         )
-        conclusions = f'El entorno se encuentra en estado {health_msg.lower()}.'
-        glossary = 'VM: Virtual Machine, HA: High Availability, DRS: Distributed Resource Scheduler'
-        annexes_data = []
 
-        return {
-            'health_score': health_score,
-            'health_state': health_state,
-            'health_message': health_msg,
-            'global_state': global_state,
-            'key_risks': key_risks,
-            'uptime': f"{int(avg_uptime_days)} días",
-            'alerts': 0,
-            'sla': '100%',
-            'hosts': hosts_data,
-            'vms': vm_data,
-            'datastores_count': total_datastores,
-            'networks_count': total_networks,
-            'categories': categories,
-            'cpu_hosts': cpu_hosts,
-            'ram_hosts': ram_hosts,
-            'datastore_usage': datastore_usage,
-            'indicators': indicators,
-            'top_cpu_ready': top_cpu_ready,
-            'top_ram': top_ram,
-            'datastores': datastores_sorted,
-            'top_disk_free': top_disk_free,
-            'top_iops': top_iops,
-            'top_network': top_network,
-            'risks': risks,
-            'priorities': priorities,
-            'recommendations': recommendations,
-            'conclusions': conclusions,
-            'glossary': glossary,
-            'annexes_data': annexes_data,
-            'report_date': datetime.datetime.utcnow().strftime('%d-%m-%Y'),
-            'chart': chart,
-        }
+    @profiled_phase('aggregation')
+    def _build_report_data(self, hosts_data, vm_data, chart):
+        """Construye la estructura de datos para la plantilla avanzada.
+
+        Además de la información básica utilizada por ``template_a.html`` se
+        calculan datos adicionales que pueden ser consumidos por plantillas más
+        completas como ``template_full.html``.  No se trata de un análisis
+        exhaustivo pero proporciona un resumen global, los riesgos detectados y
+        algunas recomendaciones genéricas.
+        """
+        data = {}
+        for name, _, _, _ in self.REPORT_PARTS:
+            data.update(self._report_part(name, hosts_data, vm_data, data))
+        data['chart'] = chart
+        return data
 
-    def _validate_report_data(self, data, template_file=None):
+    def _validate_report_data(self, data, template_file=None, keys=None):
         """Verify that report data has all fields required by the templates.
 
         Parameters
@@ -858,6 +1187,8 @@ class VMwareHealthCheck:
         template_file : str, optional
             Name of the template that will consume the data. Additional keys are
             checked when ``template_full.html`` is used.
+        keys : set of str, optional
+            Variables referenced by the template; only those are required.
         """
 
         required = {
@@ -873,16 +1204,19 @@ class VMwareHealthCheck:
                 'global_state', 'key_risks', 'risks', 'priorities',
                 'recommendations', 'conclusions', 'glossary', 'annexes_data'
             }
+        if keys is not None:
+            required &= set(keys)
 
         missing = [k for k in required if k not in data]
         if missing:
             logger.error("Report data missing keys: %s", ", ".join(missing))
             raise ValueError(f"Missing keys in report data: {', '.join(missing)}")
 
-    def build_text_summary(self, hosts_data, summary):
+    def build_text_summary(self, hosts_data, summary, vm_data=None):
         """Build a plain text summary similar to ``template_a.html``."""
         # Aggregate VM list from hosts
-        vm_data = [vm for h in hosts_data for vm in h.get('vms', [])]
+        if vm_data is None:
+            vm_data = [vm for h in hosts_data for vm in h.get('vms', [])]
 
         # Reuse the logic from ``_build_report_data`` to obtain scores and lists
         data = self._build_report_data(hosts_data, vm_data, chart=None)
@@ -951,7 +1285,8 @@ class VMwareHealthCheck:
         return "\n".join(lines)
 
     def generate_report(self, hosts_data, vm_data, output_file, template_dir=None,
-                        template_file='template.html', detailed_report=None):
+                        template_file='template.html', detailed_report=None,
+                        llm_usage_footer=False, trends=None, minify=True, precompress=()):
         """Crea un informe HTML con los datos obtenidos.
 
         Parameters
@@ -965,273 +1300,338 @@ class VMwareHealthCheck:
             se utilizará el directorio del script.
         template_file : str, optional
             Nombre del archivo de plantilla Jinja2. Por defecto ``template.html``.
+        detailed_report : str, optional
+            Texto del informe detallado que se añadirá al final del HTML.
+        llm_usage_footer : bool, optional
+            Si es ``True`` se añade al pie una tabla con el consumo de tokens,
+            latencia y coste de las llamadas a la IA.
+        trends : dict, optional
+            Series de :meth:`history_store.HistoryStore.trends` que se pasan a
+            la plantilla como ``trends``.
+        minify : bool, optional
+            Minifica el HTML antes de escribirlo (ver ``report_output.py``).
+        precompress : iterable of str, optional
+            Escribe también copias ``.gz`` y/o ``.br`` del informe.
         """
-        logger.info("Generating HTML report: %s", output_file)
-        chart = self._create_chart(hosts_data)
+        self.generate_reports(
+            hosts_data, vm_data, [(template_file, output_file)], template_dir,
+            detailed_report=detailed_report, llm_usage_footer=llm_usage_footer, trends=trends,
+            minify=minify, precompress=precompress,
+        )
 
-        if os.path.isabs(template_file):
-            template_dir = os.path.dirname(template_file)
-            template_file = os.path.basename(template_file)
+    def _load_templates(self, outputs, template_dir=None):
+        """Carga las plantillas de ``outputs`` y las variables que usan.
 
-        if template_dir is None:
-            template_dir = os.path.dirname(os.path.abspath(__file__))
+        Returns
+        -------
+        tuple
+            ``(loaded, variables)``: tuplas ``(template_file, output_file,
+            template, names)`` (``template`` es ``None`` si no pudo cargarse) y
+            la unión de las variables (``None`` si no pueden conocerse).
+        """
+        default_dir = template_dir or os.path.dirname(os.path.abspath(__file__))
+        targets = []
+        for template_file, output_file in outputs:
+            if os.path.isabs(template_file):
+                targets.append((os.path.dirname(template_file),
+                                os.path.basename(template_file), output_file))
+            else:
+                targets.append((default_dir, template_file, output_file))
 
         try:
             import jinja2
         except Exception as exc:  # pragma: no cover - optional dependency
             logger.error("Jinja2 not available: %s. Using default template", exc)
-            html_content = self._generate_report_default(hosts_data, vm_data, chart)
-        else:
-            try:
-                env = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir))
-                template = env.get_template(template_file)
-                if template_file == 'template_a.html':
-                    data = self._build_report_data(hosts_data, vm_data, chart)
-                    self._validate_report_data(data, template_file)
-                    html_content = template.render(**data)
-                elif template_file == 'template_a_detailed.html':
-                    data = self._build_report_data(hosts_data, vm_data, chart)
-                    self._validate_report_data(data, template_file)
-                    try:
-                        from report_sections.performance import (
-                            generate as generate_performance, INTRO as INTRO_PERFORMANCE
-                        )
-                        from report_sections.storage import (
-                            generate as generate_storage, INTRO as INTRO_STORAGE
-                        )
-                        from report_sections.security import (
-                            generate as generate_security, INTRO as INTRO_SECURITY
-                        )
-                        from report_sections.availability import (
-                            generate as generate_availability, INTRO as INTRO_AVAILABILITY
-                        )
-                        from openai_connector import configure_openai
-                        import openai
-
-                        configure_openai()
-                        has_key = bool(getattr(openai, "api_key", None))
-
-                        def score(name):
-                            for c in data.get('categories', []):
-                                if c.get('name') == name:
-                                    return c.get('score')
-                            return 0
-
-                        perf_info = {
-                            'score': score('Rendimiento'),
-                            'cpu_hosts': data.get('cpu_hosts'),
-                            'ram_hosts': data.get('ram_hosts'),
-                            'top_cpu_ready': data.get('top_cpu_ready'),
-                            'top_ram': data.get('top_ram'),
-                            'top_iops': data.get('top_iops'),
-                            'top_network': data.get('top_network'),
-                        }
-                        storage_info = {
-                            'score': score('Almacenamiento'),
-                            'datastore_usage': data.get('datastore_usage'),
-                            'datastores': data.get('datastores'),
-                            'top_disk_free': data.get('top_disk_free'),
-                        }
-                        security_labels = {
-                            'SSH', 'VMware Tools', 'Snapshots', 'Backups',
-                            'Licensing', 'IPv6', 'DNS'
-                        }
-                        security_info = {
-                            'score': score('Seguridad'),
-                            'indicators': [
-                                i for i in data.get('indicators', [])
-                                if i.get('label') in security_labels
-                            ],
-                        }
-                        avail_labels = {
-                            'HA', 'DRS', 'NTP', 'Updates', 'Round Robin',
-                            'vCPU/pCPU', 'Resource Pools'
-                        }
-                        availability_info = {
-                            'score': score('Disponibilidad'),
-                            'indicators': [
-                                i for i in data.get('indicators', [])
-                                if i.get('label') in avail_labels
-                            ],
-                        }
-
-                        if has_key:
-                            performance_text = generate_performance(perf_info)
-                            storage_text = generate_storage(storage_info)
-                            security_text = generate_security(security_info)
-                            availability_text = generate_availability(availability_info)
-                        else:
-                            performance_text = INTRO_PERFORMANCE
-                            storage_text = INTRO_STORAGE
-                            security_text = INTRO_SECURITY
-                            availability_text = INTRO_AVAILABILITY
-                    except Exception as exc:  # pragma: no cover - external API
-                        logger.error(
-                            "Failed to generate detailed sections: %s", exc
-                        )
-                        performance_text = INTRO_PERFORMANCE
-                        storage_text = INTRO_STORAGE
-                        security_text = INTRO_SECURITY
-                        availability_text = INTRO_AVAILABILITY
-
-                    html_content = template.render(
-                        **data,
-                        performance_text=performance_text,
-                        storage_text=storage_text,
-                        security_text=security_text,
-                        availability_text=availability_text,
-                    )
-                elif template_file in ('template_full.html', 'template_full_es.html'):
-                    data = self._build_report_data(hosts_data, vm_data, chart)
-                    self._validate_report_data(data, template_file)
-                    try:
-                        from report_sections.performance import (
-                            generate as generate_performance, INTRO as INTRO_PERFORMANCE
-                        )
-                        from report_sections.storage import (
-                            generate as generate_storage, INTRO as INTRO_STORAGE
-                        )
-                        from report_sections.security import (
-                            generate as generate_security, INTRO as INTRO_SECURITY
-                        )
-                        from report_sections.availability import (
-                            generate as generate_availability, INTRO as INTRO_AVAILABILITY
-                        )
-                        from report_sections.executive_summary import (
-                            generate as generate_exec, INTRO as INTRO_EXEC
-                        )
-                        from report_sections.recommendations import (
-                            generate as generate_reco, INTRO as INTRO_RECO
-                        )
-                        from report_sections.conclusions import (
-                            generate as generate_conclusions, INTRO as INTRO_CONCLUSIONS
-                        )
-                        from report_sections.glossary import (
-                            generate as generate_glossary, INTRO as INTRO_GLOSSARY
-                        )
-                        from openai_connector import configure_openai
-                        import openai
-
-                        configure_openai()
-                        has_key = bool(getattr(openai, "api_key", None))
-
-                        def score(name):
-                            for c in data.get('categories', []):
-                                if c.get('name') == name:
-                                    return c.get('score')
-                            return 0
-
-                        perf_info = {
-                            'score': score('Rendimiento'),
-                            'cpu_hosts': data.get('cpu_hosts'),
-                            'ram_hosts': data.get('ram_hosts'),
-                            'top_cpu_ready': data.get('top_cpu_ready'),
-                            'top_ram': data.get('top_ram'),
-                            'top_disk_free': data.get('top_disk_free'),
-                            'top_iops': data.get('top_iops'),
-                            'top_network': data.get('top_network'),
-                        }
-                        storage_info = {
-                            'score': score('Almacenamiento'),
-                            'datastore_usage': data.get('datastore_usage'),
-                            'datastores': data.get('datastores'),
-                        }
-                        security_labels = {
-                            'SSH', 'VMware Tools', 'Snapshots', 'Backups',
-                            'Licensing', 'IPv6', 'DNS'
-                        }
-                        security_info = {
-                            'score': score('Seguridad'),
-                            'indicators': [
-                                i for i in data.get('indicators', [])
-                                if i.get('label') in security_labels
-                            ],
-                        }
-                        avail_labels = {
-                            'HA', 'DRS', 'NTP', 'Updates', 'Round Robin',
-                            'vCPU/pCPU', 'Resource Pools'
-                        }
-                        availability_info = {
-                            'score': score('Disponibilidad'),
-                            'indicators': [
-                                i for i in data.get('indicators', [])
-                                if i.get('label') in avail_labels
-                            ],
-                        }
-
-                        if has_key:
-                            performance_text = generate_performance(perf_info)
-                            storage_text = generate_storage(storage_info)
-                            security_text = generate_security(security_info)
-                            availability_text = generate_availability(availability_info)
-
-                            executive_text = generate_exec(data)
-                            recommendations_text = generate_reco(data)
-                            conclusions_text = generate_conclusions(data)
-                            glossary_text = generate_glossary(data)
-                        else:
-                            performance_text = INTRO_PERFORMANCE
-                            storage_text = INTRO_STORAGE
-                            security_text = INTRO_SECURITY
-                            availability_text = INTRO_AVAILABILITY
-                            executive_text = INTRO_EXEC
-                            recommendations_text = INTRO_RECO
-                            conclusions_text = INTRO_CONCLUSIONS
-                            glossary_text = INTRO_GLOSSARY
-
-                        data['executive_summary'] = executive_text
-                        data['recommendations'] = recommendations_text
-                        data['conclusions'] = conclusions_text
-                        data['glossary'] = glossary_text
-                    except Exception as exc:  # pragma: no cover - external API
-                        logger.error(
-                            "Failed to generate full template sections: %s", exc
+            jinja2 = None
+
+        # Load every template and collect the variables they reference
+        envs = {}
+        loaded = []
+        variables = set()
+        for directory, template_file, output_file in targets:
+            template = names = None
+            if jinja2 is not None:
+                try:
+                    env = envs.get(directory)
+                    if env is None:
+                        env = envs[directory] = jinja2.Environment(
+                            loader=jinja2.FileSystemLoader(directory)
                         )
-                        performance_text = INTRO_PERFORMANCE
-                        storage_text = INTRO_STORAGE
-                        security_text = INTRO_SECURITY
-                        availability_text = INTRO_AVAILABILITY
-                        executive_text = INTRO_EXEC
-                        recommendations_text = INTRO_RECO
-                        conclusions_text = INTRO_CONCLUSIONS
-                        glossary_text = INTRO_GLOSSARY
-
-                    html_content = template.render(
-                        **data,
-                        performance_text=performance_text,
-                        storage_text=storage_text,
-                        security_text=security_text,
-                        availability_text=availability_text,
-                    )
-                else:
-                    html_content = template.render(
-                        hosts=hosts_data, vms=vm_data, chart=chart
-                    )
-            except jinja2.TemplateNotFound as exc:
-                logger.error("Template '%s' not found in '%s': %s. Using default template", template_file, template_dir, exc)
-                html_content = self._generate_report_default(hosts_data, vm_data, chart)
-            except Exception as exc:  # pragma: no cover - rendering errors
-                logger.error("Error rendering template '%s': %s. Using default template", template_file, exc)
-                html_content = self._generate_report_default(hosts_data, vm_data, chart)
-
-        if detailed_report:
-            insert = f"<h2>Informe Detallado</h2><pre>{detailed_report}</pre>"
-            if '</body>' in html_content:
-                html_content = html_content.replace('</body>', insert + '</body>')
-            else:
-                html_content += insert
+                    template = env.get_template(template_file)
+                    names = template_variables(env, template_file)
+                except jinja2.TemplateNotFound as exc:
+                    logger.error("Template '%s' not found in '%s': %s. Using default template", template_file, directory, exc)
+                except Exception as exc:  # pragma: no cover - template syntax errors
+                    logger.error("Error loading template '%s': %s. Using default template", template_file, exc)
+            if template is not None and variables is not None:
+                variables = None if names is None else variables | names
+            loaded.append((template_file, output_file, template, names))
+        return loaded, variables
+
+    def report_variables(self, outputs, template_dir=None):
+        """Variables de contexto que necesitan las plantillas de ``outputs``."""
+        loaded, variables = self._load_templates(outputs, template_dir)
+        if not any(template is not None for _, _, template, _ in loaded):
+            return set()
+        return variables
+
+    def generate_reports(self, hosts_data, vm_data, outputs, template_dir=None,
+                         detailed_report=None, llm_usage_footer=False, trends=None,
+                         workers=None, minify=True, precompress=(), prepared=None,
+                         on_written=None):
+        """Genera varios informes HTML a partir de la misma recopilación.
+
+        Los productores de datos necesarios para el conjunto de plantillas se
+        ejecutan una sola vez, de modo que las secciones de IA comunes (todas
+        las de ``report_sections`` usan el mismo prompt sea cual sea el idioma
+        de la plantilla) se piden una vez para todos los informes. Después
+        cada plantilla se renderiza y escribe en paralelo.
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        Parameters
+        ----------
+        outputs : list of tuple
+            Pares ``(template_file, output_file)``.
+        workers : int, optional
+            Hilos de renderizado; por defecto uno por informe.
+        prepared : streaming_report.StreamingReport, optional
+            Etapa que ya ha calculado el contexto de estas plantillas durante
+            la recopilación; solo se ejecutan los productores que faltan.
+        on_written : callable, optional
+            Se llama con la ruta de cada informe en cuanto se escribe, desde el
+            hilo que lo ha renderizado, sin esperar al resto.
+
+        El resto de parámetros son los de :meth:`generate_report` y se aplican
+        a todos los informes.
+        """
+        for _, output_file in outputs:
+            logger.info("Generating HTML report: %s", output_file)
+        loaded, variables = self._load_templates(outputs, template_dir)
+
+        context = {}
+        if any(template is not None for _, _, template, _ in loaded):
+            # Only the producers of the variables used by the templates run
+            pipeline = ReportPipeline(
+                report_producers(self, hosts_data, vm_data, trends), self.profiler
+            )
+            early = prepared.result(hosts_data) if prepared is not None else None
+            early_context, done = early or ({}, ())
+            try:
+                context = pipeline.run(variables, early_context, done)
+                logger.debug("Report producers: %s", ', '.join(pipeline.ran))
+            except Exception as exc:  # pragma: no cover - data errors
+                logger.error("Error building report data: %s. Using default template", exc)
+                loaded = [(t, o, None, n) for t, o, _, n in loaded]
+            if self.section_cache is not None:
+                try:
+                    self.section_cache.save()
+                except OSError as exc:
+                    logger.warning("Could not write the section cache: %s", exc)
+
+        footer = llm_usage_tracker.html_footer() if llm_usage_footer else None
+
+        def render(target):
+            template_file, output_file, template, names = target
+            html_content = None
+            if template is not None:
+                try:
+                    if template_file in self.REPORT_TEMPLATES:
+                        self._validate_report_data(context, template_file, keys=names)
+                    with self.profiler.phase('render_write'):
+                        html_content = template.render(**context)
+                except Exception as exc:  # pragma: no cover - rendering errors
+                    logger.error("Error rendering template '%s': %s. Using default template", template_file, exc)
+            if html_content is None:
+                html_content = self._generate_report_default(hosts_data, vm_data, context.get('chart'))
+
+            with self.profiler.phase('render_write'):
+                for insert in (
+                    f"<h2>Informe Detallado</h2><pre>{detailed_report}</pre>" if detailed_report else None,
+                    footer,
+                ):
+                    if not insert:
+                        continue
+                    if '</body>' in html_content:
+                        html_content = html_content.replace('</body>', insert + '</body>')
+                    else:
+                        html_content += insert
+
+                write_html(output_file, html_content, minify=minify, precompress=precompress)
+            if on_written:
+                on_written(output_file)
+            return output_file
+
+        if len(loaded) == 1:
+            render(loaded[0])
+            return
+        with ThreadPoolExecutor(max_workers=workers or len(loaded),
+                                thread_name_prefix='report-render') as pool:
+            list(pool.map(render, loaded))
+
+
+def print_host_summary(host_data):
+    """Muestra por pantalla el resumen de un host recopilado."""
+    print('--- Host: {} ---'.format(host_data['name']))
+    print('Security:')
+    for k, v in host_data['security'].items():
+        print('  {}: {}'.format(k, v))
+    print('Performance:')
+    for k, v in host_data['performance'].items():
+        print('  {}: {}'.format(k, v))
+    print('Best Practices:')
+    for k, v in host_data['best_practice'].items():
+        print('  {}: {}'.format(k, v))
+    print('VM Metrics:')
+    for vm in host_data['vms']:
+        print('  VM: {}'.format(vm['name']))
+        for mk, mv in vm['metrics'].items():
+            if mk in ('cpu_usage_pct', 'mem_usage_pct'):
+                mv = round(mv * 100, 2)
+            print('    {}: {}'.format(mk, mv))
+    print()
+
+
+def record_history(store, checker, hosts_data, vm_data, args, data=None):
+    """Guarda la ejecución en el histórico y devuelve las tendencias para el informe."""
+    with checker.profiler.phase('history'):
+        if data is None:
+            data = checker._build_report_data(hosts_data, vm_data, chart=None)
+        store.record_run(hosts_data, vm_data, data, vcenter=checker.host)
+        store.apply_retention(args.history_retention_days, args.history_downsample_days)
+        return store.trends(args.history_runs, vcenter=checker.host)
+
+
+def compare_runs(checker, args, hosts_data, vm_data, history=None):
+    """Guarda la instantánea de la ejecución y la compara con ``--diff``."""
+    from run_diff import Snapshot, diff_snapshots, format_text, load_snapshot, render_html
+
+    with checker.profiler.phase('diff'):
+        snapshot = Snapshot.from_collection(hosts_data, vm_data)
+        if args.save_snapshot:
+            snapshot.save(args.save_snapshot)
+            logger.info("Snapshot written to %s", args.save_snapshot)
+        if not args.diff:
+            return None
+        result = diff_snapshots(load_snapshot(args.diff, history), snapshot)
+        if args.diff_output:
+            with open(args.diff_output, 'w', encoding='utf-8') as f:
+                f.write(render_html(result))
+            logger.info("Change report written to %s", args.diff_output)
+        else:
+            print(format_text(result))
+        return result
+
+
+def parse_outputs(values, default_template):
+    """Convierte opciones ``--output [PLANTILLA:]ARCHIVO`` en pares ``(plantilla, archivo)``.
+
+    El prefijo solo se reconoce si termina en ``.html``/``.htm``, de modo que
+    rutas como ``C:\\informes\\a.html`` se interpretan como archivo.
+    """
+    outputs = []
+    for value in values or []:
+        match = re.match(r'^(.+?\.html?):(.+)$', value, re.IGNORECASE)
+        if match:
+            outputs.append((match.group(1), match.group(2)))
+        else:
+            outputs.append((default_template, value))
+    return outputs
+
+
+def collection_plan_for_args(args):
+    """Plan de recopilación para los informes que se generarán con ``args``.
+
+    Se recopila todo si se pide ``--full-collection``, si no se genera ningún
+    informe (el resumen por consola muestra todos los campos) o si se compara
+    o guarda una instantánea, ya que ``run_diff`` usa firmware, memoria e IPv6.
+    El informe detallado (``--detailed-report``) añade los campos de sus
+    indicadores.
+    """
+    if args.full_collection or args.diff or args.save_snapshot:
+        return CollectionPlan()
+    if not args.outputs and not args.output_dir:
+        return CollectionPlan()
+    default_dir = args.template or os.path.dirname(os.path.abspath(__file__))
+    paths = [t if os.path.isabs(t) else os.path.join(default_dir, t) for t, _ in args.outputs]
+    if args.output_dir:
+        from sharded_report import CLUSTER_TEMPLATE, HOST_TEMPLATE, INDEX_TEMPLATE, asset_path
+        paths += [asset_path(args.template, t)
+                  for t in (INDEX_TEMPLATE, CLUSTER_TEMPLATE, HOST_TEMPLATE)]
+    extra = DETAILED_REPORT_FIELDS if args.detailed_report else ()
+    return plan_for_templates(paths, extra)
+
+
+def run_scheduled(checker, args):
+    """Ejecuta el modo planificado hasta que se interrumpe con Ctrl+C.
+
+    Cada familia de comprobaciones se refresca según su intervalo y, si se
+    indicó ``--output``, el informe se regenera desde el estado vivo cada
+    ``--report-every`` segundos. Con ``--history`` cada informe se añade
+    también al histórico.
+    """
+    from scheduler import CollectionScheduler, parse_intervals
+
+    scheduler = CollectionScheduler(checker, parse_intervals(args.interval))
+    history = HistoryStore(args.history) if args.history else None
+    if checker.section_cache is None:
+        # Sections whose data did not change between refreshes are reused
+        checker.section_cache = SectionCache()
+    families = list(scheduler.intervals)
+    last_report = None
+
+    def report(now):
+        nonlocal last_report
+        if not args.output:
+            return None
+        report_due = last_report is None or now - last_report >= args.report_every
+        if report_due and scheduler.state.is_complete(families):
+            trends = None
+            if history:
+                hosts_data, all_vms, data = scheduler.state.report_data(checker)
+                trends = record_history(history, checker, hosts_data, all_vms, args, data)
+            scheduler.state.generate_reports(
+                checker, args.outputs, template_dir=args.template, trends=trends,
+                minify=args.minify, precompress=COMPRESSIONS if args.precompress else (),
+            )
+            for _, path in args.outputs:
+                logger.info("HTML report written to %s", path)
+            last_report = now
+        return None if last_report is None else last_report + args.report_every
+
+    try:
+        scheduler.run_forever(after_refresh=report)
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped")
+    finally:
+        if history:
+            history.close()
+
+
+def run_exporter(checker, args):
+    """Publica métricas de Prometheus hasta que se interrumpe con Ctrl+C."""
+    from scheduler import CollectionScheduler, parse_intervals
+    from prometheus_exporter import MetricsExporter
+
+    scheduler = CollectionScheduler(checker, parse_intervals(args.interval))
+    exporter = MetricsExporter(scheduler, args.exporter_address, args.exporter_port).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logger.info("Exporter stopped")
+    finally:
+        exporter.stop()
 
 
 def main():
     """Punto de entrada del script."""
     parser = argparse.ArgumentParser(description='VMware ESXi/vCenter Health Check')
-    parser.add_argument('--host', required=True, help='vCenter or ESXi hostname/IP')
-    parser.add_argument('--user', required=True, help='username')
-    parser.add_argument('--password', required=True, help='password')
-    parser.add_argument('--output', help='HTML report file')
+    parser.add_argument('--host', help='vCenter or ESXi hostname/IP')
+    parser.add_argument('--user', help='username')
+    parser.add_argument('--password', help='password')
+    parser.add_argument('--output', action='append', metavar='[TEMPLATE:]FILE',
+                        help='HTML report file, optionally prefixed with its template '
+                             '(e.g. template_full_es.html:informe.html); may be repeated to '
+                             'render several reports from one collection')
     parser.add_argument('--template', help='directory containing the template')
     parser.add_argument('--template-file', default='template.html',
                         help='name of the HTML template file')
@@ -1244,11 +1644,114 @@ def main():
                         help='use template_full.html and enable detailed report generation (produces the structured 12-section report)')
     parser.add_argument('--full-html-es', action='store_true',
                         help='use template_full_es.html (versi\xc3\xb3n en espa\xc3\xb1ol) and enable detailed report generation')
+    parser.add_argument('--compact-html', action='store_true',
+                        help='single-file report with compressed embedded data and virtualized tables')
     parser.add_argument('--api-type', choices=['openai', 'azure'],
                         help='select OpenAI backend (openai or azure)')
     parser.add_argument('--openai-config',
                         help='path to JSON file with OpenAI/Azure settings')
+    parser.add_argument('--run-summary', metavar='FILE',
+                        help='write a JSON run summary (LLM tokens, latency and cost) to FILE')
+    parser.add_argument('--llm-usage-footer', action='store_true',
+                        help='append the LLM usage table to the HTML report footer')
+    parser.add_argument('--soap-stats', action='store_true',
+                        help='count SOAP calls, bytes and latency per check and report them at the end')
+    parser.add_argument('--record-cassette', metavar='FILE',
+                        help='record the SOAP traffic of this run to FILE (credentials scrubbed)')
+    parser.add_argument('--replay-cassette', metavar='FILE',
+                        help='serve vCenter responses from FILE instead of connecting')
+    parser.add_argument('--replay-latency-ms', type=float, default=0.0,
+                        help='latency added to every replayed response')
+    parser.add_argument('--replay-loose-matching', action='store_true',
+                        help='answer requests missing from the cassette with another recorded '
+                             'call of the same operation and object instead of failing')
+    parser.add_argument('--schedule', action='store_true',
+                        help='collect continuously, refreshing each check family on its own interval')
+    parser.add_argument('--interval', action='append', metavar='FAMILY=SECONDS',
+                        help='refresh interval for a check family in --schedule mode '
+                             '(inventory, security, best_practice, licensing, performance, '
+                             'vm_performance); may be repeated')
+    parser.add_argument('--report-every', type=float, default=300, metavar='SECONDS',
+                        help='in --schedule mode, rewrite --output from the live state this often')
+    parser.add_argument('--exporter-port', type=int, metavar='PORT',
+                        help='serve Prometheus metrics on PORT, refreshed in the background '
+                             'with the --interval settings')
+    parser.add_argument('--exporter-address', default='127.0.0.1',
+                        help='address for the metrics endpoint (default: 127.0.0.1)')
+    parser.add_argument('--history', metavar='DB',
+                        help='SQLite file where every run is appended; enables trends in the report')
+    parser.add_argument('--history-runs', type=int, default=30, metavar='N',
+                        help='number of past runs shown in the report trends')
+    parser.add_argument('--history-retention-days', type=float, default=365, metavar='DAYS',
+                        help='delete history older than DAYS')
+    parser.add_argument('--history-downsample-days', type=float, default=30, metavar='DAYS',
+                        help='reduce history older than DAYS to one daily average per entity')
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='write a multi-page report (index plus one page per cluster and host)')
+    parser.add_argument('--render-workers', type=int, metavar='N',
+                        help='processes used to render --output-dir pages (default: CPU count)')
+    parser.add_argument('--section-cache', metavar='FILE',
+                        help='reuse AI sections and charts whose data did not change since '
+                             'the run that wrote this file')
+    parser.add_argument('--pdf', nargs='?', const='', metavar='FILE',
+                        help='convert the HTML report to PDF in a background process '
+                             '(default: --output with a .pdf extension)')
+    parser.add_argument('--save-snapshot', metavar='FILE',
+                        help='save a compact snapshot of this run for later --diff (.gz compresses)')
+    parser.add_argument('--diff', metavar='SNAPSHOT',
+                        help='compare this run with a snapshot file or history:N '
+                             '(run id, or -1 for the last run in --history)')
+    parser.add_argument('--diff-output', metavar='FILE',
+                        help='write the --diff change report as HTML instead of printing it')
+    parser.add_argument('--full-collection', action='store_true',
+                        help='collect every host property even if the selected templates '
+                             'do not show it')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='collect up to N hosts in parallel; the actual concurrency adapts '
+                             'to vCenter latency and faults (default: %(default)s)')
+    parser.add_argument('--max-calls-per-second', action='append', metavar='[VCENTER=]N',
+                        help='never exceed N SOAP calls per second, for every vCenter or only '
+                             'VCENTER; may be repeated')
+    parser.add_argument('--no-report-streaming', dest='report_streaming', action='store_false',
+                        help='aggregate and start the AI sections only after every host '
+                             'is collected')
+    parser.add_argument('--vm-page-size', type=int, default=DEFAULT_VM_PAGE_SIZE, metavar='N',
+                        help='VMs read per RetrievePropertiesEx page and per QueryStats call; '
+                             '0 reads each VM property separately (default: %(default)s)')
+    parser.add_argument('--events-hours', type=float, default=DEFAULT_WINDOW_HOURS, metavar='HOURS',
+                        help='hours of vCenter events read for alerts and SLA, 0 to skip '
+                             '(default: %(default)s)')
+    parser.add_argument('--connect-timeout', type=float, metavar='SECONDS',
+                        help='timeout for opening each connection to vCenter (default: none)')
+    parser.add_argument('--read-timeout', type=float, metavar='SECONDS',
+                        help='timeout waiting for each SOAP response (default: --connect-timeout)')
+    parser.add_argument('--no-soap-compression', dest='soap_compression', action='store_false',
+                        help='do not ask vCenter for gzip-compressed SOAP responses')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, metavar='N',
+                        help='keep-alive connections kept by the SOAP stub (default: %(default)s)')
+    parser.add_argument('--pool-idle-timeout', type=float, default=DEFAULT_POOL_IDLE_TIMEOUT,
+                        metavar='SECONDS',
+                        help='close pooled connections idle for this long (default: %(default)s)')
+    parser.add_argument('--ca-bundle', metavar='PEM',
+                        help='verify the vCenter certificate against these CAs')
+    parser.add_argument('--verify-ssl', action='store_true',
+                        help='verify the vCenter certificate against the system CAs')
+    parser.add_argument('--no-minify', dest='minify', action='store_false',
+                        help='write the HTML reports as rendered, without minifying them')
+    parser.add_argument('--precompress', action='store_true',
+                        help='also write .gz and .br (if brotli is installed) copies of every '
+                             'HTML report for static serving')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write a JSON profile with wall time, CPU time and peak memory per phase')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='also capture cProfile stats (top functions in the JSON, full stats in FILE.pstats)')
     args = parser.parse_args()
+    if not args.replay_cassette and not (args.host and args.user and args.password):
+        parser.error('--host, --user and --password are required unless --replay-cassette is used')
+    if args.pdf is not None and not args.output:
+        parser.error('--pdf requires --output')
+    output_values = args.output or []
+    args.output = parse_outputs(output_values, None)[0][1] if output_values else None
     if args.extended_html:
         args.template_file = 'template_a_detailed.html'
         if not args.detailed_report:
@@ -1262,95 +1765,83 @@ def main():
         if not args.detailed_report:
             args.detailed_report = args.output
 
+    if args.compact_html:
+        args.template_file = 'template_compact.html'
+    args.outputs = parse_outputs(output_values, args.template_file)
+
     if args.api_type == 'azure':
         apply_azure_env_vars(force=True)
         if not args.openai_config and os.path.isfile('openai_config_azure.json'):
             args.openai_config = 'openai_config_azure.json'
 
-    checker = VMwareHealthCheck(args.host, args.user, args.password)
+    checker = VMwareHealthCheck(args.host or 'replay', args.user, args.password)
+    checker.transport = TransportConfig.from_args(args)
+    checker.workers = max(1, args.workers)
     try:
-        checker.connect()
-
-        hosts = checker.get_hosts()
-        hosts_data = []
-        all_vms = []
-        summary = {
-            'hosts': 0,
-            'vms': 0,
-            'datastores': 0,
-            'networks': 0,
-        }
-        for host in hosts:
-            logger.info("Processing host %s", host.name)
-            security = checker.security_check(host)
-            performance = checker.performance_check(host)
-            best_practice = checker.best_practice_check(host)
-            resource_pools = checker.resource_pool_check(host)
-            zombie_vmdks = checker.zombie_vmdk_check(host)
-            ntp_ok = checker.ntp_config_check(host)
-            update_ok = checker.update_compliance_check(host)
-            dns_ok = checker.dns_consistency_check(host)
-            storage_warn = checker.storage_overusage(host)
-            iscsi_rr = checker.iscsi_roundrobin_check(host)
-            runtime = checker.host_runtime_info(host)
-            cluster = checker.cluster_features(host)
-            vm_info = []
-            counters = checker._build_perf_counter_map()
-            for vm in getattr(host, 'vm', []):
-                metrics = checker.vm_performance_check(vm, counters)
-                extra = checker.vm_extra_info(vm)
-                metrics.update(extra)
-                vm_info.append({'name': vm.name, 'metrics': metrics})
-                all_vms.append({'name': vm.name, 'metrics': metrics})
-                summary['vms'] += 1
-
-            if vm_info:
-                avg_ready = sum(
-                    v['metrics'].get('cpu_ready_ms') or 0 for v in vm_info
-                ) / len(vm_info)
-            else:
-                avg_ready = 0
-            performance['avg_cpu_ready_ms'] = avg_ready
-
-            summary['hosts'] += 1
-            summary['datastores'] += len(getattr(host, 'datastore', []))
-            summary['networks'] += len(getattr(host, 'network', []))
+        max_rate = parse_rate_limits(args.max_calls_per_second, args.host)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if checker.workers > 1 or max_rate:
+        checker.limiter = AdaptiveLimiter(checker.workers, max_calls_per_second=max_rate)
+        # One keep-alive connection per worker
+        checker.transport.pool_size = max(checker.transport.pool_size, checker.workers)
+    checker.events_window_hours = args.events_hours
+    checker.vm_page_size = max(0, args.vm_page_size)
+    checker.plan = collection_plan_for_args(args)
+    if not checker.plan.full:
+        logger.info("Not collecting %s (unused by %s)",
+                    ', '.join(sorted(checker.plan.skipped)), ', '.join(checker.plan.templates))
+    if args.section_cache:
+        checker.section_cache = SectionCache(args.section_cache)
+    pdf_processes = []
+    if args.profile:
+        from profiling import PhaseProfiler
+        checker.profiler = PhaseProfiler(cprofile=args.profile_cprofile).start()
+    try:
+        if args.replay_cassette:
+            checker.connect_replay(args.replay_cassette, args.replay_latency_ms / 1000,
+                                   args.replay_loose_matching)
+        else:
+            checker.connect()
+        if args.record_cassette:
+            checker.start_recording(args.record_cassette)
+        if args.soap_stats:
+            checker.instrument_soap()
+        if checker.limiter:
+            # Latency feedback and the calls-per-second gate come from the
+            # SOAP counters, private ones unless --soap-stats was requested
+            stats = checker.soap_stats
+            if stats is None:
+                stats = SoapCallStats()
+                stats.instrument(checker.si._stub)
+            checker.limiter.attach(stats)
+        if args.exporter_port is not None:
+            run_exporter(checker, args)
+            return
+        if args.schedule:
+            run_scheduled(checker, args)
+            return
+
+        stream = None
+        if args.outputs and args.report_streaming:
+            # Aggregate while collecting and start the report producers (AI
+            # sections included) as soon as the collection ends
+            stream = StreamingReport(checker, checker.report_variables(args.outputs, args.template))
+            stream.start()
+
+        def on_host(host_data):
+            print_host_summary(host_data)
+            if stream:
+                stream.on_host(host_data)
 
-            print('--- Host: {} ---'.format(host.name))
-            print('Security:')
-            for k, v in security.items():
-                print('  {}: {}'.format(k, v))
-            print('Performance:')
-            for k, v in performance.items():
-                print('  {}: {}'.format(k, v))
-            print('Best Practices:')
-            for k, v in best_practice.items():
-                print('  {}: {}'.format(k, v))
-            print('VM Metrics:')
-            for vm in vm_info:
-                print('  VM: {}'.format(vm['name']))
-                for mk, mv in vm['metrics'].items():
-                    if mk in ('cpu_usage_pct', 'mem_usage_pct'):
-                        mv = round(mv * 100, 2)
-                    print('    {}: {}'.format(mk, mv))
-            print()
-
-            hosts_data.append({
-                'name': host.name,
-                'security': security,
-                'performance': performance,
-                'best_practice': best_practice,
-                'runtime': runtime,
-                'cluster': cluster,
-                'resource_pools': resource_pools,
-                'zombie_vmdks': zombie_vmdks,
-                'ntp_ok': ntp_ok,
-                'update_ok': update_ok,
-                'dns_ok': dns_ok,
-                'storage_warn': storage_warn,
-                'iscsi_rr': iscsi_rr,
-                'vms': vm_info,
-            })
+        try:
+            hosts_data, all_vms, summary = checker.collect(on_host=on_host)
+        except BaseException:
+            if stream:
+                stream.abort()
+            raise
+        if stream:
+            stream.finish(hosts_data, all_vms)
 
         # Basic health scoring
         scores = {
@@ -1362,7 +1853,24 @@ def main():
         overall_score = sum(scores.values()) / 4
 
         print('Environment summary:', summary)
+        if not checker.plan.full:
+            plan_summary = checker.plan.summary()
+            logger.info("Collection plan skipped %s: %d round trip(s) saved",
+                        ', '.join(plan_summary['skipped_properties']),
+                        plan_summary['round_trips_saved'])
         print('Health scores:', scores, 'overall:', overall_score)
+        trends = None
+        diff_result = None
+        history = HistoryStore(args.history) if args.history else None
+        try:
+            if args.diff or args.save_snapshot:
+                diff_result = compare_runs(checker, args, hosts_data, all_vms, history)
+            if history:
+                trends = record_history(history, checker, hosts_data, all_vms, args)
+                logger.info("Run appended to history %s", args.history)
+        finally:
+            if history:
+                history.close()
         detailed_text = None
         if args.detailed_report:
             apply_azure_env_vars()
@@ -1381,30 +1889,101 @@ def main():
                 logger.error('OpenAI API key not configured; skipping detailed report')
             else:
                 try:
-                    summary_text = checker.build_text_summary(hosts_data, summary)
-                    detailed_text = generate_detailed_report(
-                        summary_text,
-                        api_key,
-                        model,
-                        api_type=args.api_type,
-                        config_file=args.openai_config,
-                    )
-                    if not args.output or args.detailed_report != args.output:
+                    summary_text = checker.build_text_summary(hosts_data, summary, all_vms)
+                    with checker.profiler.phase('llm'):
+                        detailed_text = generate_detailed_report(
+                            summary_text,
+                            api_key,
+                            model,
+                            api_type=args.api_type,
+                            config_file=args.openai_config,
+                        )
+                    if args.detailed_report not in [path for _, path in args.outputs]:
                         with open(args.detailed_report, 'w', encoding='utf-8') as f:
                             f.write(detailed_text)
                 except Exception as exc:  # pragma: no cover - external API
                     logger.error('Failed to generate detailed report: %s', exc)
 
-        if args.output:
-            checker.generate_report(
-                hosts_data, all_vms, args.output, args.template, args.template_file,
-                detailed_report=detailed_text
+        if args.outputs:
+            # An explicit --pdf FILE applies to the first report
+            pdf_targets = {path: (args.pdf or None) if i == 0 else None
+                           for i, (_, path) in enumerate(args.outputs)}
+
+            def report_written(path):
+                logger.info("HTML report written to %s", path)
+                if args.pdf is None:
+                    return
+                from html_to_pdf import start_background_conversion
+                # Each conversion starts as soon as its own report is on disk
+                process = start_background_conversion(path, pdf_targets[path])
+                pdf_processes.append(process)
+                logger.info("PDF conversion started in background (pid %s)", process.pid)
+
+            checker.generate_reports(
+                hosts_data, all_vms, args.outputs, args.template,
+                detailed_report=detailed_text,
+                llm_usage_footer=args.llm_usage_footer,
+                trends=trends,
+                minify=args.minify,
+                precompress=COMPRESSIONS if args.precompress else (),
+                prepared=stream,
+                on_written=report_written,
             )
-            logger.info("HTML report written to %s", args.output)
         elif detailed_text and args.detailed_report:
             logger.info("Detailed report written to %s", args.detailed_report)
+        if args.output_dir:
+            from sharded_report import write_sharded_report
+            index = write_sharded_report(checker, hosts_data, all_vms, args.output_dir,
+                                         template_dir=args.template,
+                                         workers=args.render_workers, trends=trends,
+                                         minify=args.minify,
+                                         precompress=COMPRESSIONS if args.precompress else ())
+            logger.info("Multi-page report written to %s", index)
+
+        llm_totals = llm_usage_tracker.summary()['totals']
+        if llm_totals['calls']:
+            logger.info(
+                "LLM usage: %d call(s), %d tokens, %.2fs, cost %.4f",
+                llm_totals['calls'], llm_totals['total_tokens'],
+                llm_totals['latency_s'], llm_totals['cost'],
+            )
+        if checker.soap_stats:
+            logger.info("SOAP calls per check:\n%s", checker.soap_stats.format_table())
+        if args.run_summary:
+            import json
+            run_summary = {
+                'environment': summary,
+                'llm': llm_usage_tracker.summary(),
+            }
+            if checker.soap_stats:
+                run_summary['soap'] = checker.soap_stats.summary()
+            if diff_result:
+                run_summary['diff'] = diff_result['counts']
+            run_summary['report_cache'] = {
+                'hits': checker.cache.hits, 'misses': checker.cache.misses,
+            }
+            if checker.section_cache is not None:
+                run_summary['section_cache'] = checker.section_cache.summary()
+            run_summary['collection_plan'] = checker.plan.summary()
+            if checker.limiter:
+                run_summary['concurrency'] = checker.limiter.summary()
+            if stream:
+                run_summary['streaming'] = stream.summary()
+            with open(args.run_summary, 'w', encoding='utf-8') as f:
+                json.dump(run_summary, f, indent=2, default=str)
+            logger.info("Run summary written to %s", args.run_summary)
     finally:
         checker.disconnect()
+        for pdf_process in pdf_processes:
+            pdf_process.join()
+            if pdf_process.exitcode == 0:
+                logger.info("PDF report written to %s", pdf_process.pdf_path)
+            else:
+                logger.error("PDF conversion failed (exit code %s)", pdf_process.exitcode)
+        if args.profile:
+            checker.profiler.stop()
+            checker.profiler.write_json(args.profile)
+            logger.info("Profile written to %s", args.profile)
 
 if __name__ == '__main__':
     main()